@@ -1,25 +1,55 @@
 from __future__ import annotations
 
+import configparser
+import hashlib
 import importlib.resources
+import json
 import os
 import subprocess
 import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from pathlib import Path
 
 import structlog
 
+from airflow_extension import dag_files, tuning
 from meltano_sdk.config import ExtensionConfig
 from meltano_sdk.extension_base import Description, ExtensionBase
 from meltano_sdk.process_utils import Invoker, log_subprocess_error
 
 log = structlog.get_logger()
 
+# Files shipped in files_airflow_ext/orchestrate, mapped to their name in the dags folder.
+DAG_GENERATOR_FILES = {
+    "meltano.py": "meltano_dag_generator.py",
+    "meltano_schedules.py": "meltano_schedules.py",
+    "meltano_operators.py": "meltano_operators.py",
+    "meltano_forkserver.py": "meltano_forkserver.py",
+    "README.md": "README.md",
+}
+
+# Records which pre_invoke steps are already satisfied, see Airflow.pre_invoke.
+STATE_FILE_NAME = ".airflow_extension_state.json"
+
 
 class Airflow(ExtensionBase):
     def __init__(self):
 
         self.app_name = "airflow_extension"
         self.airflow_bin = "airflow"
+        self._env_loaded = False
+
+    def _load_env(self):
+        """Read and validate the environment airflow runs in.
+
+        Not done on construction, so commands like describe work without it.
+        """
+        if self._env_loaded:
+            return
+        self._env_loaded = True
         self.airflow_invoker = Invoker(self.airflow_bin, env=os.environ.copy())
 
         self.airflow_home = os.environ.get("AIRFLOW_HOME") or os.environ.get(
@@ -56,16 +86,61 @@ class Airflow(ExtensionBase):
 
         self.env_config = ExtensionConfig("airflow", "AIRFLOW_").load()
 
-    def pre_invoke(self):
-        self._create_config()
-        self._deploy_dag_generator()
-        self._initdb()
+    def initialize(self, force: bool = False):
+        """Prepare the airflow home, dags folder and metadata database."""
+        self._load_env()
+        self.pre_invoke(force_init=force)
+
+    def pre_invoke(self, force_init: bool = False):
+        """Prepare airflow before a command is invoked.
+
+        Every step is recorded in a state file under AIRFLOW_HOME, keyed by the
+        installed airflow version, the airflow.cfg hash, the database connection and
+        the database's migration revision, and skipped on later invokes while those
+        are unchanged. Deploying the DAG
+        files does not need airflow, so it runs alongside the airflow steps. With the
+        `auto_tune` setting, airflow.cfg is sized for the host before the database step,
+        on every invoke, which reverts hand edits to the tuned settings, see
+        `tuning.tune_config`.
+
+        Args:
+            force_init: Run every step, even those the state file marks as done.
+        """
+        self._load_env()
+        state = {} if force_init else self._read_state()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            dags_deployed = executor.submit(self._deploy_dags)
+            self._create_config(force_init)
+            if self.env_config.get_bool("AUTO_TUNE"):
+                tuning.tune_config(self.airflow_cfg_path)
+            db_state = self._db_state()
+            db_revision = self._db_revision() if db_state is not None else None
+            db_current = (
+                db_revision is not None
+                and state.get("db") == db_state
+                and state.get("db_revision") == db_revision
+            )
+            if db_current:
+                log.debug("airflow db already initialized, skipping db init")
+            else:
+                self._initdb()
+                db_revision = self._db_revision()
+            dags_deployed.result()
+
+        pools = self._sync_pools(
+            synced_pools=state.get("pools") if db_current else None
+        )
+        if db_state is not None:
+            self._write_state(
+                {"db": db_state, "db_revision": db_revision, "pools": pools}
+            )
 
     @staticmethod
     def post_invoke():
         log.debug("post_invoke")
 
     def invoke(self, command_name: str | None, *command_args):
+        self._load_env()
         try:
             self.airflow_invoker.run_and_log(command_name, *command_args)
         except subprocess.CalledProcessError as err:
@@ -74,12 +149,307 @@ class Airflow(ExtensionBase):
             )
             sys.exit(1)
 
+    def serve(self, socket_path: str, max_concurrency: int, idle_timeout: float):
+        """Run airflow commands for `invoke` calls forwarded over a unix socket.
+
+        pre_invoke runs at startup and again before every command, one request at a
+        time. Its state file checks make that cheap, while a database that was
+        removed or an airflow.cfg that was edited is still caught as on a direct
+        invoke. The Meltano schedules that pools and materialized DAGs come from are
+        read again whenever the project changes, see `_schedule_export`.
+
+        Commands run in the client's environment and working directory. A client whose
+        airflow settings or working directory differ from the server's, which pre_invoke
+        prepared airflow for, is refused and runs the command itself.
+        """
+        from meltano_sdk.server import RequestRefused, invoker_command, serve
+
+        self.pre_invoke()
+        run_airflow = invoker_command(self.airflow_invoker)
+        prepare_lock = threading.Lock()
+        server_settings = self._airflow_settings(os.environ)
+        server_cwd = os.getcwd()
+
+        def run_command(
+            argv: list[str], env: dict, cwd: str, out_fd: int, err_fd: int
+        ) -> int:
+            if self._airflow_settings(env) != server_settings or cwd != server_cwd:
+                raise RequestRefused(
+                    "airflow settings or working directory differ from the server's"
+                )
+            with prepare_lock:
+                try:
+                    self.pre_invoke()
+                except SystemExit as err:
+                    return err.code if isinstance(err.code, int) else 1
+            return run_airflow(argv, env, cwd, out_fd, err_fd)
+
+        serve(
+            socket_path,
+            run_command,
+            max_concurrency=max_concurrency,
+            idle_timeout=idle_timeout,
+        )
+
+    def _airflow_settings(self, env) -> dict:
+        """The variables of an environment that pre_invoke depends on."""
+        from files_airflow_ext.orchestrate.meltano_schedules import POOL_BY_ENV
+
+        names = ("MELTANO_PROJECT_ROOT", POOL_BY_ENV, f"{self.app_name}_AIRFLOW_HOME")
+        return {
+            name: value
+            for name, value in env.items()
+            if name.startswith("AIRFLOW") or name in names
+        }
+
     def describe(self) -> Description:
         # TODO: could we build this from typer instead?
         return Description(commands=[":splat", "webserver", "scheduler", "version"])
 
-    def _create_config(self):
-        # create an initial airflow config file
+    def tune_config(self, dry_run: bool = False) -> str:
+        """Size the airflow.cfg concurrency and pool settings for this host, see airflow_extension.tuning.
+
+        Args:
+            dry_run: Only return the changes, leave airflow.cfg untouched.
+
+        Returns:
+            A unified diff of the changes.
+        """
+        self._load_env()
+        self._create_config()
+        return tuning.tune_config(self.airflow_cfg_path, dry_run=dry_run)
+
+    def materialize_dags(self, clean: bool = False):
+        """Render one static DAG file per Meltano schedule into the dags folder.
+
+        Args:
+            clean: Remove the materialized DAG files instead, handing control back to the DAG generator.
+        """
+        self._load_env()
+        if clean:
+            dag_files.remove_materialized_dags(self.airflow_core_dags_path)
+            return
+
+        self._deploy_dag_generator()
+        dag_files.materialize_dags(self._schedule_export(), self.airflow_core_dags_path)
+
+    @staticmethod
+    def _meltano_project_root() -> Path:
+        return Path(os.environ.get("MELTANO_PROJECT_ROOT", os.getcwd()))
+
+    def _schedule_export(self):
+        """Load the Meltano project's schedules, the same way the DAG generator does.
+
+        The export is kept until the project fingerprint changes, so a long-lived
+        `serve` process picks up edits to meltano.yml on its next request.
+        """
+        from files_airflow_ext.orchestrate.meltano_schedules import (
+            load_schedules,
+            project_fingerprint,
+        )
+
+        project_root = self._meltano_project_root()
+        try:
+            fingerprint = project_fingerprint(project_root)
+        except OSError:
+            fingerprint = None
+        cached = getattr(self, "_cached_schedule_export", None)
+        if fingerprint is not None and cached and cached[0] == fingerprint:
+            return cached[1]
+
+        meltano_bin = project_root / ".meltano/run/bin"
+        try:
+            schedule_export = load_schedules(
+                project_root,
+                str(meltano_bin) if meltano_bin.exists() else "meltano",
+            )
+        except subprocess.CalledProcessError as err:
+            log_subprocess_error(
+                "meltano schedule list", err, "unable to list meltano schedules"
+            )
+            sys.exit(1)
+        except (subprocess.TimeoutExpired, OSError, ValueError) as err:
+            log.error("unable to list meltano schedules", error=str(err))
+            sys.exit(1)
+        self._cached_schedule_export = (fingerprint, schedule_export)
+        return schedule_export
+
+    def _pool_slots(self, plugin: str) -> int:
+        """Slots for a plugin's pool, from POOL_SLOTS__<PLUGIN> or else POOL_SLOTS."""
+        plugin_key = plugin.upper().replace("-", "_")
+        return self.env_config.get_int(
+            f"POOL_SLOTS__{plugin_key}", self.env_config.get_int("POOL_SLOTS", 1)
+        )
+
+    def _sync_pools(self, synced_pools: dict | None = None) -> dict | None:
+        """Create or update an Airflow pool per extractor or loader used by the Meltano schedules.
+
+        Args:
+            synced_pools: Pools known to be in the database already, import is skipped if they are unchanged.
+
+        Returns:
+            The pools that are now in the database.
+        """
+        from files_airflow_ext.orchestrate.meltano_schedules import (
+            POOL_BY_ENV,
+            pool_name,
+            project_plugin_types,
+            schedule_pool_plugins,
+        )
+
+        pool_by = os.environ.get(POOL_BY_ENV)
+        if pool_by not in ("extractor", "loader"):
+            return None
+        plugins = schedule_pool_plugins(
+            self._schedule_export(),
+            pool_by,
+            project_plugin_types(self._meltano_project_root()),
+        )
+        if not plugins:
+            return None
+
+        pools = {
+            pool_name(plugin): {
+                "slots": self._pool_slots(plugin),
+                "description": f"Meltano {pool_by} {plugin}",
+            }
+            for plugin in plugins
+        }
+        if pools == synced_pools:
+            log.debug("meltano pools unchanged, skipping pools import")
+            return pools
+
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as pools_file:
+            json.dump(pools, pools_file)
+            pools_file.flush()
+            try:
+                self.airflow_invoker.run(
+                    "pools", "import", pools_file.name, stdout=subprocess.DEVNULL
+                )
+            except subprocess.CalledProcessError as err:
+                log_subprocess_error(
+                    "airflow pools import", err, "airflow pools import failed"
+                )
+                sys.exit(1)
+        log.debug("synced meltano pools", pools=pools)
+        return pools
+
+    def _deploy_dags(self):
+        self._deploy_dag_generator()
+        if self.env_config.get_bool("MATERIALIZE_DAGS"):
+            self.materialize_dags()
+
+    @property
+    def _state_path(self) -> Path:
+        return Path(self.airflow_home) / STATE_FILE_NAME
+
+    def _read_state(self) -> dict:
+        try:
+            return json.loads(self._state_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _write_state(self, state: dict):
+        self._state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._state_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state, sort_keys=True))
+        os.replace(tmp_path, self._state_path)
+
+    def _db_state(self) -> dict | None:
+        """Describe what the metadata database was initialized for.
+
+        The migration head is fully determined by the installed airflow version,
+        so a database still at the revision recorded after its last init, see
+        `_db_revision`, is up to date. Returns None, meaning the database must
+        always be initialized, when the version cannot be determined.
+        """
+        import importlib.metadata
+
+        if not self.airflow_cfg_path.exists():
+            return None
+        try:
+            airflow_version = importlib.metadata.version("apache-airflow")
+        except importlib.metadata.PackageNotFoundError:
+            return None
+        sql_alchemy_conn = self._sql_alchemy_conn() or ""
+        return {
+            "airflow_version": airflow_version,
+            "cfg_sha256": hashlib.sha256(
+                self.airflow_cfg_path.read_bytes()
+            ).hexdigest(),
+            "sql_alchemy_conn_sha256": hashlib.sha256(
+                sql_alchemy_conn.encode()
+            ).hexdigest(),
+        }
+
+    def _sql_alchemy_conn(self) -> str | None:
+        """Return the metadata database connection, from the environment or airflow.cfg.
+
+        Returns None when it is only known to airflow, e.g. set with `sql_alchemy_conn_cmd`.
+        """
+        for section in ("DATABASE", "CORE"):
+            conn = os.environ.get(f"AIRFLOW__{section}__SQL_ALCHEMY_CONN")
+            if conn:
+                return conn
+        cfg = configparser.ConfigParser(interpolation=None)
+        try:
+            cfg.read(self.airflow_cfg_path)
+        except configparser.Error:
+            return None
+        for section in ("database", "core"):
+            if cfg.has_option(section, "sql_alchemy_conn"):
+                return cfg.get(section, "sql_alchemy_conn")
+            if cfg.has_option(section, "sql_alchemy_conn_cmd") or cfg.has_option(
+                section, "sql_alchemy_conn_secret"
+            ):
+                return None
+        return f"sqlite:///{self.airflow_home}/airflow.db"
+
+    def _db_revision(self) -> str | None:
+        """Return the alembic revision the metadata database is migrated to.
+
+        Returns None if the database does not exist, is not initialized or cannot be
+        reached, so that it gets initialized.
+        """
+        conn = self._sql_alchemy_conn()
+        if not conn:
+            return None
+        query = "SELECT version_num FROM alembic_version"
+        if conn.startswith("sqlite"):
+            # Checked with sqlite3 directly, connecting with sqlalchemy would create the file.
+            import sqlite3
+
+            db_path = conn.split(":///", 1)[-1].split("?", 1)[0]
+            if not db_path or db_path == ":memory:" or not Path(db_path).is_file():
+                return None
+            try:
+                with closing(
+                    sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+                ) as db:
+                    row = db.execute(query).fetchone()
+            except sqlite3.Error:
+                return None
+            return row[0] if row else None
+
+        try:
+            import sqlalchemy
+        except ImportError:
+            return None
+        try:
+            engine = sqlalchemy.create_engine(conn)
+            try:
+                with engine.connect() as db:
+                    return db.execute(sqlalchemy.text(query)).scalar()
+            finally:
+                engine.dispose()
+        except sqlalchemy.exc.SQLAlchemyError as err:
+            log.debug("unable to read the airflow db revision", error=str(err))
+            return None
+
+    def _create_config(self, force: bool = False):
+        # create an initial airflow config file, unless it already exists
+        if self.airflow_cfg_path.exists() and not force:
+            return
         try:
             self.airflow_invoker.run("--help", stdout=subprocess.DEVNULL)
         except subprocess.CalledProcessError as err:
@@ -89,29 +459,37 @@ class Airflow(ExtensionBase):
             sys.exit(1)
 
     def _deploy_dag_generator(self):
-        """Write out the meltano dag generator to the airflow home if it does not exist."""
-        self.airflow_core_dags_path.mkdir(parents=True, exist_ok=True)
+        """Write out the meltano dag generator and its support files to the dags folder.
 
-        dag_generator_path = self.airflow_core_dags_path / "meltano_dag_generator.py"
-        if not dag_generator_path.exists():
-            dag_generator_path.write_text(
-                importlib.resources.read_text(
-                    "files_airflow_ext.orchestrator", "meltano.py"
-                )
-            )
+        These files are managed by the extension, so copies left by another version
+        of it are replaced. Files already up to date are not rewritten, which would
+        make the scheduler parse them again.
+        """
+        self.airflow_core_dags_path.mkdir(parents=True, exist_ok=True)
 
-        readme_path = self.airflow_core_dags_path / "README.md"
-        if not readme_path.exists():
-            readme_path.write_text(
-                importlib.resources.read_text(
-                    "files_airflow_ext.orchestrator", "README.md"
-                )
+        for source_name, target_name in DAG_GENERATOR_FILES.items():
+            target_path = self.airflow_core_dags_path / target_name
+            content = importlib.resources.read_text(
+                "files_airflow_ext.orchestrate", source_name
             )
+            try:
+                if target_path.read_text() == content:
+                    continue
+            except (OSError, UnicodeDecodeError):
+                pass
+            log.debug("deploying dag folder file", path=str(target_path))
+            tmp_path = target_path.with_name(f".{target_name}.tmp")
+            tmp_path.write_text(content)
+            os.replace(tmp_path, target_path)
 
     def _initdb(self):
         """Initialize the airflow metadata database."""
+        timeout = self.env_config.get_float("INIT_TIMEOUT")
         try:
-            self.airflow_invoker.run("db", "init")
+            self.airflow_invoker.run("db", "init", timeout=timeout)
         except subprocess.CalledProcessError as err:
             log_subprocess_error("airflow db init", err, "airflow db init failed")
             sys.exit(1)
+        except subprocess.TimeoutExpired:
+            log.error("airflow db init timed out", timeout=timeout)
+            sys.exit(1)
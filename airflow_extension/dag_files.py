@@ -0,0 +1,141 @@
+"""Materialize one static DAG file per Meltano schedule."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import pprint
+import re
+import shutil
+import tempfile
+from pathlib import Path
+
+import structlog
+
+log = structlog.get_logger()
+
+# Must match STATIC_DAGS_DIR in files_airflow_ext/orchestrate/meltano.py.
+STATIC_DAGS_DIR = "meltano_dags"
+
+DAG_FILE_TEMPLATE = """\
+# Generated by airflow_extension from the Meltano schedule {name!r}.
+# Do not edit, this file is rewritten whenever the schedule changes.
+from meltano_dag_generator import {builder}
+
+SCHEDULE = {schedule}
+
+dag = {builder}(SCHEDULE)
+"""
+
+
+def iter_schedules(schedule_export) -> list[tuple[str, dict]]:
+    """Flatten a v1 or v2 schedule export into (builder name, schedule) pairs.
+
+    Schedules without a cron interval never get a DAG and are left out.
+
+    Args:
+        schedule_export: The output of `meltano schedule list --format=json`.
+
+    Returns:
+        The builder function name and schedule for every schedule needing a DAG.
+    """
+    if isinstance(schedule_export, dict) and schedule_export.get("schedules"):
+        pairs = [
+            ("build_elt_dag", schedule)
+            for schedule in schedule_export["schedules"].get("elt") or []
+        ]
+        pairs.extend(
+            ("build_job_dag", schedule)
+            for schedule in schedule_export["schedules"].get("job") or []
+            if schedule.get("job")
+        )
+    else:
+        pairs = [("build_elt_dag", schedule) for schedule in schedule_export or []]
+    return [
+        (builder, schedule) for builder, schedule in pairs if schedule["cron_interval"]
+    ]
+
+
+def dag_file_name(builder: str, schedule: dict) -> str:
+    """Return the file name for a schedule's DAG, derived from its DAG id."""
+    dag_id = f"meltano_{schedule['name']}"
+    if builder == "build_job_dag":
+        dag_id = f"{dag_id}_{schedule['job']['name']}"
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", dag_id) + ".py"
+
+
+def render_dag_file(builder: str, schedule: dict) -> str:
+    """Render the source of a static DAG file for a single schedule."""
+    return DAG_FILE_TEMPLATE.format(
+        name=schedule["name"],
+        builder=builder,
+        schedule=pprint.pformat(schedule, indent=4),
+    )
+
+
+def _write_atomic(path: Path, content: str) -> None:
+    # The temp file does not end in .py, so Airflow never tries to parse it.
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as fp:
+            fp.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def materialize_dags(schedule_export, dags_path: Path) -> dict[str, list[str]]:
+    """Write one DAG file per schedule into the static DAGs folder under dags_path.
+
+    Files whose content is unchanged are left untouched, so Airflow only
+    re-parses the DAGs of schedules that actually changed. Files belonging to
+    schedules that no longer exist are removed.
+
+    Args:
+        schedule_export: The output of `meltano schedule list --format=json`.
+        dags_path: The Airflow dags folder.
+
+    Returns:
+        The file names that were written, unchanged, and removed.
+    """
+    target_dir = Path(dags_path) / STATIC_DAGS_DIR
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    changes = {"written": [], "unchanged": [], "removed": []}
+    wanted = set()
+    for builder, schedule in iter_schedules(schedule_export):
+        file_name = dag_file_name(builder, schedule)
+        wanted.add(file_name)
+        content = render_dag_file(builder, schedule)
+        path = target_dir / file_name
+        if path.exists() and (
+            hashlib.sha256(path.read_bytes()).digest()
+            == hashlib.sha256(content.encode()).digest()
+        ):
+            changes["unchanged"].append(file_name)
+            continue
+        _write_atomic(path, content)
+        changes["written"].append(file_name)
+
+    for path in target_dir.glob("*.py"):
+        if path.name not in wanted:
+            path.unlink()
+            changes["removed"].append(path.name)
+
+    log.info(
+        "materialized meltano dags",
+        dags_path=str(target_dir),
+        written=len(changes["written"]),
+        unchanged=len(changes["unchanged"]),
+        removed=len(changes["removed"]),
+    )
+    return changes
+
+
+def remove_materialized_dags(dags_path: Path) -> None:
+    """Remove the static DAGs folder so the DAG generator takes over again."""
+    target_dir = Path(dags_path) / STATIC_DAGS_DIR
+    if target_dir.is_dir():
+        shutil.rmtree(target_dir)
+        log.info("removed materialized meltano dags", dags_path=str(target_dir))
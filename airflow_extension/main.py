@@ -1,26 +1,41 @@
 import os
 import sys
-from typing import List
+from functools import lru_cache
+from typing import List, Optional
 
 import structlog
 import typer
 
-from airflow_extension.airflow_ext import Airflow
 from meltano_sdk.extension_base import DescribeFormat
-from meltano_sdk.logging import default_logging_config, parse_log_level
+from meltano_sdk.logging import (
+    DEFAULT_QUEUE_SIZE,
+    default_logging_config,
+    parse_log_level,
+)
+from meltano_sdk.manifest import format_manifest, read_manifest
+from meltano_sdk.profiling import PROFILE_ENV, enable_profiling, span
+from meltano_sdk.server import DEFAULT_IDLE_TIMEOUT, DEFAULT_MAX_CONCURRENCY, forward
 
 log = structlog.get_logger()
 
 APP_NAME: str = "airflow_extension"
 
-plugin = Airflow()
 app = typer.Typer(pretty_exceptions_enable=False)
 
 
+@lru_cache(maxsize=None)
+def get_plugin():
+    """Create the plugin on first use, so commands that do not need it start faster."""
+    from airflow_extension.airflow_ext import Airflow
+
+    return Airflow()
+
+
 @app.command()
 def initialize(ctx: typer.Context, force: bool = False):
     try:
-        plugin.initialize(force)
+        with span("initialize"):
+            get_plugin().initialize(force)
     except Exception:
         log.exception(
             "initialize failed with uncaught exception, please report exception to maintainer"
@@ -31,7 +46,25 @@ def initialize(ctx: typer.Context, force: bool = False):
 @app.command(
     context_settings={"allow_extra_args": True, "ignore_unknown_options": True}
 )
-def invoke(ctx: typer.Context, command_args: List[str]):
+def invoke(
+    ctx: typer.Context,
+    command_args: List[str],
+    force_init: bool = typer.Option(
+        False,
+        "--force-init",
+        envvar="AIRFLOW_EXT_FORCE_INIT",
+        help="Re-run all initialization steps, even those already done",
+    ),
+    server_socket: Optional[str] = typer.Option(
+        None,
+        "--server-socket",
+        envvar="AIRFLOW_EXT_SOCKET",
+        help=(
+            "Forward the command to the extension server on this socket, if one is "
+            "running, unless --force-init is given"
+        ),
+    ),
+):
     """Invoke the plugin.
 
     Note: that if a command argument is a list, such as command_args, then
@@ -40,14 +73,37 @@ def invoke(ctx: typer.Context, command_args: List[str]):
     Args:
         ctx: The typer.Context for this invocation
         command_args: The command args to invoke
+        force_init: Re-run all pre_invoke steps, ignoring the initialization state file
+        server_socket: Socket of an extension server started with `serve`, not used with force_init
     """
     command_name, command_args = command_args[0], command_args[1:]
     log.debug(
         "called", command_name=command_name, command_args=command_args, env=os.environ
     )
 
+    if server_socket and force_init:
+        log.debug("--force-init given, invoking directly", socket_path=server_socket)
+    elif server_socket:
+        try:
+            returncode = forward(server_socket, [command_name, *command_args])
+        except ConnectionError as err:
+            # The command may have run in part, so it is not run again here.
+            log.error(
+                "lost the connection to the extension server",
+                socket_path=server_socket,
+                error=str(err),
+            )
+            sys.exit(1)
+        if returncode is not None:
+            sys.exit(returncode)
+        log.debug(
+            "no extension server available for the command, invoking directly",
+            socket_path=server_socket,
+        )
+
     try:
-        plugin.pre_invoke()
+        with span("pre_invoke"):
+            get_plugin().pre_invoke(force_init=force_init)
     except Exception:
         log.exception(
             "pre_invoke failed with uncaught exception, please report exception to maintainer"
@@ -55,7 +111,8 @@ def invoke(ctx: typer.Context, command_args: List[str]):
         sys.exit(1)
 
     try:
-        plugin.invoke(command_name, command_args)
+        with span("invoke"):
+            get_plugin().invoke(command_name, command_args)
     except Exception:
         log.exception(
             "invoke failed with uncaught exception, please report exception to maintainer"
@@ -63,7 +120,8 @@ def invoke(ctx: typer.Context, command_args: List[str]):
         sys.exit(1)
 
     try:
-        plugin.post_invoke()
+        with span("post_invoke"):
+            get_plugin().post_invoke()
     except Exception:
         log.exception(
             "ppost_invoke failed with uncaught exception, please report exception to maintainer"
@@ -71,6 +129,71 @@ def invoke(ctx: typer.Context, command_args: List[str]):
         sys.exit(1)
 
 
+@app.command()
+def materialize_dags(
+    clean: bool = typer.Option(
+        False,
+        "--clean",
+        help="Remove materialized DAG files and use the DAG generator again",
+    )
+):
+    """Write one static DAG file per Meltano schedule into the Airflow dags folder."""
+    try:
+        get_plugin().materialize_dags(clean)
+    except Exception:
+        log.exception(
+            "materialize_dags failed with uncaught exception, please report exception to maintainer"
+        )
+        sys.exit(1)
+
+
+@app.command("serve")
+def serve_command(
+    socket_path: str = typer.Option(
+        ..., "--socket", envvar="AIRFLOW_EXT_SOCKET", help="Unix socket to listen on"
+    ),
+    max_concurrency: int = typer.Option(
+        DEFAULT_MAX_CONCURRENCY, help="Commands run at once, later ones wait"
+    ),
+    idle_timeout: float = typer.Option(
+        DEFAULT_IDLE_TIMEOUT,
+        help="Seconds without requests before the server stops, 0 for never",
+    ),
+):
+    """Serve `invoke --server-socket` calls from a long-lived process."""
+    try:
+        get_plugin().serve(socket_path, max_concurrency, idle_timeout)
+    except Exception:
+        log.exception(
+            "serve failed with uncaught exception, please report exception to maintainer"
+        )
+        sys.exit(1)
+
+
+@app.command()
+def tune_config(
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Print the changes without writing airflow.cfg"
+    )
+):
+    """Size airflow.cfg concurrency and pool settings for this host's CPUs and memory.
+
+    Values set by hand in airflow.cfg for these settings are overwritten, including on
+    every invoke with `auto_tune`. Set AIRFLOW__<SECTION>__<KEY> to keep a value.
+    """
+    try:
+        diff = get_plugin().tune_config(dry_run)
+    except Exception:
+        log.exception(
+            "tune_config failed with uncaught exception, please report exception to maintainer"
+        )
+        sys.exit(1)
+    if diff:
+        typer.echo(diff, nl=False)
+    else:
+        log.info("airflow.cfg is already tuned")
+
+
 @app.command()
 def describe(
     output_format: DescribeFormat = typer.Option(
@@ -79,7 +202,12 @@ def describe(
 ):
     """Describe the available commands of this extension."""
     try:
-        typer.echo(plugin.describe_formatted(output_format))
+        # Answer from the shipped manifest when there is one, without creating the plugin.
+        manifest = read_manifest("airflow_extension")
+        if manifest is not None:
+            typer.echo(format_manifest(manifest, output_format))
+        else:
+            typer.echo(get_plugin().describe_formatted(output_format))
     except Exception:
         log.exception(
             "describe failed with uncaught exception, please report exception to maintainer"
@@ -97,10 +225,64 @@ def main(
     log_levels: bool = typer.Option(
         False, "--log-levels", envvar="LOG_LEVELS", help="Show log levels"
     ),
+    log_async: bool = typer.Option(
+        False,
+        "--log-async",
+        envvar="LOG_ASYNC",
+        help="Write logs from a background thread so slow log consumers do not stall airflow",
+    ),
+    log_queue_size: int = typer.Option(
+        DEFAULT_QUEUE_SIZE,
+        envvar="LOG_QUEUE_SIZE",
+        help="Log lines held by the background log writer",
+    ),
+    log_overflow: str = typer.Option(
+        "block",
+        envvar="LOG_OVERFLOW",
+        help="What to do when the background log writer is full: block, drop_oldest or count",
+    ),
+    log_rate_limit: float = typer.Option(
+        0,
+        envvar="LOG_RATE_LIMIT",
+        help="Maximum airflow output lines logged per second, 0 for no limit",
+    ),
+    log_json_passthrough: bool = typer.Option(
+        False,
+        "--log-json-passthrough",
+        envvar="LOG_JSON_PASSTHROUGH",
+        help="Log JSON lines written by airflow as structured events with their own fields and level",
+    ),
+    usage_summary: bool = typer.Option(
+        False,
+        "--usage-summary",
+        envvar="USAGE_SUMMARY",
+        help="Log the resources used by airflow subprocesses on exit",
+    ),
+    profile: Optional[str] = typer.Option(
+        None,
+        "--profile",
+        envvar=PROFILE_ENV,
+        help="Profile this invocation: comma separated spans, cprofile, memory, or all",
+    ),
 ):
     """
     Simple Meltano extension to wrap the airflow CLI.
     """
     default_logging_config(
-        level=parse_log_level(log_level), timestamps=log_timestamps, levels=log_levels
+        level=parse_log_level(log_level),
+        timestamps=log_timestamps,
+        levels=log_levels,
+        async_writer=log_async,
+        queue_size=log_queue_size,
+        overflow=log_overflow,
+        rate_limit=log_rate_limit,
     )
+    enable_profiling(profile, APP_NAME)
+    if log_json_passthrough:
+        from meltano_sdk.process_utils import enable_json_passthrough
+
+        enable_json_passthrough()
+    if usage_summary:
+        from meltano_sdk.process_utils import enable_usage_summary
+
+        enable_usage_summary()
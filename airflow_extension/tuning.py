@@ -0,0 +1,282 @@
+"""Size airflow.cfg concurrency settings from the resources of the host."""
+
+from __future__ import annotations
+
+import difflib
+import os
+import re
+from pathlib import Path
+
+import structlog
+
+log = structlog.get_logger()
+
+# Memory set aside per concurrently running task, a meltano run and its plugins.
+TASK_MEMORY_BYTES = 512 * 1024 * 1024
+# Cap on tasks per CPU, most Meltano task time is spent waiting on sources and targets.
+TASKS_PER_CPU = 4
+
+# Older airflow versions know some settings under another name or section. Settings are
+# written where the existing airflow.cfg has them, or else under the first name listed
+# whose section it has.
+SETTING_LOCATIONS = {
+    "parallelism": [("core", "parallelism")],
+    "max_active_tasks_per_dag": [
+        ("core", "max_active_tasks_per_dag"),
+        ("core", "dag_concurrency"),
+    ],
+    "parsing_processes": [
+        ("scheduler", "parsing_processes"),
+        ("scheduler", "max_threads"),
+    ],
+    "min_file_process_interval": [("scheduler", "min_file_process_interval")],
+    "sql_alchemy_pool_size": [
+        ("database", "sql_alchemy_pool_size"),
+        ("core", "sql_alchemy_pool_size"),
+    ],
+    "sql_alchemy_max_overflow": [
+        ("database", "sql_alchemy_max_overflow"),
+        ("core", "sql_alchemy_max_overflow"),
+    ],
+}
+
+_SECTION_RE = re.compile(r"^\[(?P<section>[^\]]+)\]\s*$")
+_OPTION_RE = re.compile(r"^(?P<key>[A-Za-z0-9_]+)\s*=")
+
+
+def _read_int(path: str) -> int | None:
+    try:
+        return int(Path(path).read_text().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def cpu_count() -> int:
+    """Return the CPUs this process may use, honouring affinity and cgroup quotas."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = period = None
+    try:
+        # cgroup v2: "<quota> <period>", or "max <period>" without a limit.
+        quota_text, period_text = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota_text != "max":
+            quota, period = int(quota_text), int(period_text)
+    except (OSError, ValueError):
+        quota = _read_int("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+        period = _read_int("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota and period and quota > 0:
+        cpus = min(cpus, max(1, quota // period))
+    return cpus
+
+
+def memory_bytes() -> int | None:
+    """Return the memory this process may use, honouring cgroup limits."""
+    try:
+        memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        memory = None
+    for limit_path in (
+        "/sys/fs/cgroup/memory.max",
+        "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+    ):
+        limit = _read_int(limit_path)
+        # cgroup v1 reports "no limit" as a huge number.
+        if limit and (memory is None or limit < memory):
+            memory = limit
+            break
+    return memory
+
+
+def _in_effect(overrides: dict[str, str], name: str, recommended: int) -> int:
+    try:
+        return int(overrides[name])
+    except (KeyError, ValueError):
+        return recommended
+
+
+def recommended_settings(
+    cpus: int, memory: int | None, overrides: dict[str, str] | None = None
+) -> dict[str, str]:
+    """Compute consistent concurrency settings for a host.
+
+    Args:
+        cpus: The usable CPUs.
+        memory: The usable memory in bytes, if known.
+        overrides: Settings whose value is fixed, see `env_overrides`. Settings
+            derived from them, such as the pool overflow from the pool size, follow
+            the fixed value.
+
+    Returns:
+        The value of every setting in SETTING_LOCATIONS, overrides included.
+    """
+    overrides = overrides or {}
+    parallelism = cpus * TASKS_PER_CPU
+    if memory:
+        parallelism = min(parallelism, memory // TASK_MEMORY_BYTES)
+    parallelism = _in_effect(overrides, "parallelism", max(2, parallelism))
+    # Every task and scheduler process holds its own connection pool.
+    pool_size = _in_effect(
+        overrides, "sql_alchemy_pool_size", min(32, max(5, cpus * 2))
+    )
+    settings = {
+        "parallelism": str(parallelism),
+        "max_active_tasks_per_dag": str(min(parallelism, 16)),
+        "parsing_processes": str(max(1, cpus // 2)),
+        "min_file_process_interval": "60" if cpus < 4 else "30",
+        "sql_alchemy_pool_size": str(pool_size),
+        "sql_alchemy_max_overflow": str(pool_size * 2),
+    }
+    settings.update(overrides)
+    return settings
+
+
+def _existing_options(cfg_text: str) -> set[tuple[str, str]]:
+    options = set()
+    section = None
+    for line in cfg_text.splitlines():
+        section_match = _SECTION_RE.match(line)
+        if section_match:
+            section = section_match.group("section")
+            continue
+        option_match = _OPTION_RE.match(line)
+        if section and option_match:
+            options.add((section, option_match.group("key")))
+    return options
+
+
+def _env_override(section: str, key: str) -> bool:
+    return f"AIRFLOW__{section.upper()}__{key.upper()}" in os.environ
+
+
+def env_overrides() -> dict[str, str]:
+    """Return the settings set by an AIRFLOW__<SECTION>__<KEY> environment variable, under any of their names."""
+    overrides = {}
+    for name, locations in SETTING_LOCATIONS.items():
+        for section, key in locations:
+            value = os.environ.get(f"AIRFLOW__{section.upper()}__{key.upper()}")
+            if value is not None:
+                overrides[name] = value
+                break
+    return overrides
+
+
+def resolve_locations(
+    cfg_text: str, settings: dict[str, str]
+) -> dict[tuple[str, str], str]:
+    """Map settings to the (section, key) they go to in this airflow.cfg.
+
+    Settings overridden by an AIRFLOW__<SECTION>__<KEY> environment variable, under
+    any of their names, are left out, since airflow uses the environment anyway.
+    """
+    existing = _existing_options(cfg_text)
+    sections = {section for section, _ in existing}
+    located = {}
+    for name, value in settings.items():
+        locations = SETTING_LOCATIONS[name]
+        if any(_env_override(section, key) for section, key in locations):
+            log.debug(
+                "airflow setting overridden by environment, not tuning it", setting=name
+            )
+            continue
+        location = next(
+            (loc for loc in locations if loc in existing),
+            next((loc for loc in locations if loc[0] in sections), locations[0]),
+        )
+        located[location] = value
+    return located
+
+
+def apply_settings(cfg_text: str, settings: dict[tuple[str, str], str]) -> str:
+    """Set options in airflow.cfg text, keeping everything else, comments included.
+
+    Existing options are changed in place. Missing options are added at the end of
+    their section, and missing sections at the end of the file.
+    """
+    lines = cfg_text.splitlines()
+    pending = dict(settings)
+    output = []
+    section = None
+
+    def _flush_section():
+        missing = [
+            (key, value) for (sec, key), value in pending.items() if sec == section
+        ]
+        if not missing:
+            return
+        # Insert before the blank lines separating this section from the next.
+        trailing = []
+        while output and not output[-1].strip():
+            trailing.append(output.pop())
+        for key, value in missing:
+            output.append(f"{key} = {value}")
+            del pending[(section, key)]
+        output.extend(trailing)
+
+    for line in lines:
+        section_match = _SECTION_RE.match(line)
+        if section_match:
+            _flush_section()
+            section = section_match.group("section")
+            output.append(line)
+            continue
+        option_match = _OPTION_RE.match(line)
+        if section and option_match and (section, option_match.group("key")) in pending:
+            key = option_match.group("key")
+            output.append(f"{key} = {pending.pop((section, key))}")
+            continue
+        output.append(line)
+    _flush_section()
+
+    for sec in dict.fromkeys(sec for sec, _ in pending):
+        output.extend(["", f"[{sec}]"])
+        output.extend(
+            f"{key} = {value}" for (s, key), value in pending.items() if s == sec
+        )
+    return "\n".join(output) + "\n"
+
+
+def tune_config(cfg_path: Path, dry_run: bool = False) -> str:
+    """Write recommended concurrency settings for this host into airflow.cfg.
+
+    Every setting in SETTING_LOCATIONS is overwritten, so values edited by hand in
+    airflow.cfg are reverted. A value meant to stay is set with its
+    AIRFLOW__<SECTION>__<KEY> environment variable instead, which is never written
+    and which the settings derived from it follow.
+
+    Args:
+        cfg_path: The airflow.cfg to tune.
+        dry_run: Only compute the changes, leave the file untouched.
+
+    Returns:
+        A unified diff of the changes, empty if there are none.
+    """
+    cpus, memory = cpu_count(), memory_bytes()
+    cfg_text = cfg_path.read_text()
+    settings = resolve_locations(
+        cfg_text, recommended_settings(cpus, memory, env_overrides())
+    )
+    tuned_text = apply_settings(cfg_text, settings)
+    diff = "".join(
+        difflib.unified_diff(
+            cfg_text.splitlines(keepends=True),
+            tuned_text.splitlines(keepends=True),
+            fromfile=str(cfg_path),
+            tofile=f"{cfg_path} (tuned)",
+        )
+    )
+    if diff and not dry_run:
+        tmp_path = cfg_path.with_suffix(".tmp")
+        tmp_path.write_text(tuned_text)
+        os.replace(tmp_path, cfg_path)
+        log.info(
+            "tuned airflow.cfg",
+            cpus=cpus,
+            memory_bytes=memory,
+            settings={
+                f"{section}.{key}": value for (section, key), value in settings.items()
+            },
+        )
+    return diff
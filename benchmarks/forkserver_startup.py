@@ -0,0 +1,105 @@
+"""Start-up cost of a CLI run exec'd cold versus forked from a warm fork-server.
+
+A stub CLI stands in for meltano: importing it pulls in a set of standard library
+modules and sleeps `--import-delay` seconds, the start-up work the fork-server pays
+once instead of per run. Each mode starts `--runs` runs one after another and waits
+for each, so the times are per run latencies.
+
+    python benchmarks/forkserver_startup.py [--runs N] [--import-delay S]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "files_airflow_ext" / "orchestrate"))
+
+import meltano_forkserver  # noqa: E402
+
+STUB_CLI = """
+import asyncio, decimal, email.parser, http.client, json, logging.handlers, sqlite3
+import time
+import xml.etree.ElementTree
+
+time.sleep({import_delay})
+
+
+def main():
+    pass
+"""
+
+
+def cold_run(workdir):
+    subprocess.run(
+        [sys.executable, "-c", "import stub_cli; stub_cli.main()"],
+        cwd=workdir,
+        check=True,
+    )
+
+
+def warm_run(socket_path, workdir):
+    run = meltano_forkserver.start_run(
+        socket_path, ["meltano"], workdir, dict(os.environ), 1, 2
+    )
+    assert run.wait() == 0
+
+
+def timed(runs, func, *args):
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--import-delay", type=float, default=0.5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        Path(workdir, "stub_cli.py").write_text(
+            STUB_CLI.format(import_delay=args.import_delay)
+        )
+        os.environ["PYTHONPATH"] = workdir
+        socket_path = os.path.join(workdir, "forkserver.sock")
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                meltano_forkserver.__file__,
+                socket_path,
+                "stub_cli:main",
+                "1",
+                "1000",
+                "0",
+            ]
+        )
+        try:
+            while not meltano_forkserver._can_connect(socket_path):
+                time.sleep(0.01)
+            print(f"fork-server start: {time.perf_counter() - started:.3f}s")
+
+            for name, times in (
+                ("cold exec", timed(args.runs, cold_run, workdir)),
+                ("warm fork", timed(args.runs, warm_run, socket_path, workdir)),
+            ):
+                print(
+                    f"{name}: median {statistics.median(times) * 1000:7.1f}ms  "
+                    f"max {max(times) * 1000:7.1f}ms over {args.runs} runs"
+                )
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
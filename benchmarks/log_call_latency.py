@@ -0,0 +1,81 @@
+"""Latency of log calls with the synchronous and the background (`--log-async`) writer.
+
+Logs go to a stream that stalls for `--stall-ms` every `--stall-every` writes, like
+a log consumer that cannot keep up now and then. With the synchronous handler the
+stalls land on the logging call; the queue handler absorbs them up to its size.
+
+    python benchmarks/log_call_latency.py [--calls N] [--stall-every N] [--stall-ms MS]
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import structlog  # noqa: E402
+
+from meltano_sdk.logging import DEFAULT_QUEUE_SIZE, default_logging_config  # noqa: E402
+
+
+class StallingStream:
+    """Writes to /dev/null, sleeping every `every` writes."""
+
+    def __init__(self, every: int, stall: float):
+        self.devnull = open(os.devnull, "w")
+        self.every = every
+        self.stall = stall
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        if self.writes % self.every == 0:
+            time.sleep(self.stall)
+        return self.devnull.write(text)
+
+    def flush(self):
+        self.devnull.flush()
+
+
+def measure(async_writer: bool, args) -> list:
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    sys.stderr = StallingStream(args.stall_every, args.stall_ms / 1000)
+    default_logging_config(async_writer=async_writer, queue_size=args.queue_size)
+    log = structlog.get_logger()
+
+    latencies = []
+    for i in range(args.calls):
+        started = time.perf_counter_ns()
+        log.info("benchmark line", i=i, payload="x" * 100)
+        latencies.append(time.perf_counter_ns() - started)
+    for handler in root.handlers:
+        handler.flush()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20_000)
+    parser.add_argument("--stall-every", type=int, default=50)
+    parser.add_argument("--stall-ms", type=float, default=5)
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE)
+    args = parser.parse_args()
+
+    for name, async_writer in (("sync", False), ("queue", True)):
+        latencies = sorted(measure(async_writer, args))
+        p50 = statistics.median(latencies) / 1000
+        p99 = latencies[int(len(latencies) * 0.99)] / 1000
+        print(
+            f"{name:>5}: p50 {p50:8.1f}µs  p99 {p99:8.1f}µs  max {latencies[-1] / 1000:10.1f}µs"
+        )
+
+
+if __name__ == "__main__":
+    main()
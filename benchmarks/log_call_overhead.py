@@ -0,0 +1,53 @@
+"""Cost per call of disabled log levels, Lazy values and the log rate limiter.
+
+Each case is a single log call, timed with timeit. Logs go to /dev/null.
+
+    python benchmarks/log_call_overhead.py [--number N]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import structlog  # noqa: E402
+
+from meltano_sdk.logging import (  # noqa: E402
+    SUBPROCESS_LOGGER,
+    Lazy,
+    RateLimiter,
+    default_logging_config,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100_000)
+    args = parser.parse_args()
+
+    sys.stderr = open(os.devnull, "w")
+    # A limit of one line per second, so nearly every limited call is dropped.
+    default_logging_config(level=logging.INFO, rate_limit=1)
+    log = structlog.get_logger()
+    subprocess_log = structlog.get_logger(SUBPROCESS_LOGGER)
+    limiter = RateLimiter(rate=1e9, logger_names=[SUBPROCESS_LOGGER])
+
+    cases = {
+        "disabled debug": lambda: log.debug("env", env=dict(os.environ)),
+        "disabled debug, Lazy": lambda: log.debug("env", env=Lazy(dict, os.environ)),
+        "enabled info": lambda: log.info("line", n=1),
+        "enabled info, Lazy": lambda: log.info("line", n=Lazy(int, "1")),
+        "rate limited, dropped": lambda: subprocess_log.info("line", n=1),
+        "RateLimiter.acquire": lambda: limiter.acquire(SUBPROCESS_LOGGER),
+    }
+    for name, call in cases.items():
+        seconds = min(timeit.repeat(call, number=args.number, repeat=3))
+        print(f"{name:>22}: {seconds / args.number * 1e9:8.0f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
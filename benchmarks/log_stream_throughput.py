@@ -0,0 +1,54 @@
+"""Throughput of Invoker.run_and_log against a synthetic noisy child.
+
+The child writes `--lines` lines of `--line-length` characters to stdout and a tenth
+as many to stderr, as fast as it can. Logs go to /dev/null, so what is measured is
+reading, splitting and rendering the lines rather than the speed of a terminal.
+
+    python benchmarks/log_stream_throughput.py [--lines N] [--line-length N] [--json]
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from meltano_sdk.logging import default_logging_config  # noqa: E402
+from meltano_sdk.process_utils import Invoker  # noqa: E402
+
+NOISY_CHILD = """
+import sys
+lines, length = int(sys.argv[1]), int(sys.argv[2])
+line = "x" * length + "\\n"
+sys.stdout.write(line * lines)
+sys.stderr.write(line * (lines // 10))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=200_000)
+    parser.add_argument("--line-length", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="render logs as JSON")
+    args = parser.parse_args()
+
+    sys.stderr = open(os.devnull, "w")
+    default_logging_config(json_format=args.json)
+
+    invoker = Invoker(sys.executable)
+    started = time.perf_counter()
+    invoker.run_and_log("-c", [NOISY_CHILD, str(args.lines), str(args.line_length)])
+    elapsed = time.perf_counter() - started
+
+    lines = args.lines + args.lines // 10
+    megabytes = lines * (args.line_length + 1) / 1e6
+    print(
+        f"{lines} lines, {megabytes:.1f} MB in {elapsed:.2f}s: "
+        f"{lines / elapsed:,.0f} lines/s, {megabytes / elapsed:.1f} MB/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
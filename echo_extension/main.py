@@ -3,6 +3,7 @@ from __future__ import annotations
 import json
 import os
 import sys
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Optional
 
@@ -11,7 +12,16 @@ import typer
 
 from meltano_sdk.extension_base import DescribeFormat, Description, ExtensionBase
 from meltano_sdk.logging import default_logging_config, parse_log_level
-from meltano_sdk.process_utils import Invoker
+from meltano_sdk.manifest import format_manifest, read_manifest
+from meltano_sdk.process_utils import Invoker, enable_json_passthrough
+from meltano_sdk.profiling import PROFILE_ENV, enable_profiling, span
+from meltano_sdk.server import (
+    DEFAULT_IDLE_TIMEOUT,
+    DEFAULT_MAX_CONCURRENCY,
+    forward,
+    invoker_command,
+    serve,
+)
 
 log = structlog.get_logger()
 
@@ -39,13 +49,25 @@ class EchoPlugin(ExtensionBase):
         return Description(commands=["trigger_error", "trigger_exception", ":splat"])
 
 
-plugin = EchoPlugin()
+@lru_cache(maxsize=None)
+def get_plugin() -> EchoPlugin:
+    """Create the plugin on first use, so commands that do not need it start faster."""
+    return EchoPlugin()
 
 
 @app.command(
     context_settings={"allow_extra_args": True, "ignore_unknown_options": True}
 )
-def invoke(ctx: typer.Context, command_args: List[str]):
+def invoke(
+    ctx: typer.Context,
+    command_args: List[str],
+    server_socket: Optional[str] = typer.Option(
+        None,
+        "--server-socket",
+        envvar="ECHO_EXT_SOCKET",
+        help="Forward the command to the extension server on this socket, if one is running",
+    ),
+):
     """Invoke the plugin.
 
     Note: that if a command argument is a list, such as command_args, then
@@ -54,14 +76,34 @@ def invoke(ctx: typer.Context, command_args: List[str]):
     Args:
         ctx: The typer.Context for this invocation
         command_args: The command args to invoke
+        server_socket: Socket of an extension server started with `serve`
     """
     command_name, command_args = command_args[0], command_args[1:]
     log.debug(
         "called", command_name=command_name, command_args=command_args, env=os.environ
     )
 
+    if server_socket:
+        try:
+            returncode = forward(server_socket, [command_name, *command_args])
+        except ConnectionError as err:
+            # The command may have run in part, so it is not run again here.
+            log.error(
+                "lost the connection to the extension server",
+                socket_path=server_socket,
+                error=str(err),
+            )
+            sys.exit(1)
+        if returncode is not None:
+            sys.exit(returncode)
+        log.debug(
+            "no extension server available for the command, invoking directly",
+            socket_path=server_socket,
+        )
+
     try:
-        plugin.invoke(command_name, command_args)
+        with span("invoke"):
+            get_plugin().invoke(command_name, command_args)
     except Exception as err:
         log.exception(
             "invoke failed with uncaught exception, please report exception to maintainer"
@@ -69,6 +111,34 @@ def invoke(ctx: typer.Context, command_args: List[str]):
         sys.exit(1)
 
 
+@app.command("serve")
+def serve_command(
+    socket_path: str = typer.Option(
+        ..., "--socket", envvar="ECHO_EXT_SOCKET", help="Unix socket to listen on"
+    ),
+    max_concurrency: int = typer.Option(
+        DEFAULT_MAX_CONCURRENCY, help="Commands run at once, later ones wait"
+    ),
+    idle_timeout: float = typer.Option(
+        DEFAULT_IDLE_TIMEOUT,
+        help="Seconds without requests before the server stops, 0 for never",
+    ),
+):
+    """Serve `invoke --server-socket` calls from a long-lived process."""
+    try:
+        serve(
+            socket_path,
+            invoker_command(get_plugin().echo_invoker),
+            max_concurrency=max_concurrency,
+            idle_timeout=idle_timeout,
+        )
+    except Exception:
+        log.exception(
+            "serve failed with uncaught exception, please report exception to maintainer"
+        )
+        sys.exit(1)
+
+
 @app.command()
 def describe(
     output_format: DescribeFormat = typer.Option(
@@ -77,7 +147,12 @@ def describe(
 ):
     """Describe the available commands of this extension."""
     try:
-        typer.echo(plugin.describe_formatted(output_format))
+        # Answer from the shipped manifest when there is one, without creating the plugin.
+        manifest = read_manifest("echo_extension")
+        if manifest is not None:
+            typer.echo(format_manifest(manifest, output_format))
+        else:
+            typer.echo(get_plugin().describe_formatted(output_format))
     except Exception as err:
         log.exception(
             "describe failed with uncaught exception, please report exception to maintainer"
@@ -86,10 +161,28 @@ def describe(
 
 
 @app.callback(invoke_without_command=True)
-def main(ctx: typer.Context, log_level: str = typer.Option("INFO", envvar="LOG_LEVEL")):
+def main(
+    ctx: typer.Context,
+    log_level: str = typer.Option("INFO", envvar="LOG_LEVEL"),
+    log_json_passthrough: bool = typer.Option(
+        False,
+        "--log-json-passthrough",
+        envvar="LOG_JSON_PASSTHROUGH",
+        help="Log JSON lines written by echo as structured events with their own fields and level",
+    ),
+    profile: Optional[str] = typer.Option(
+        None,
+        "--profile",
+        envvar=PROFILE_ENV,
+        help="Profile this invocation: comma separated spans, cprofile, memory, or all",
+    ),
+):
     """
     Manage users in the awesome CLI app.
     """
     default_logging_config(parse_log_level(log_level))
+    enable_profiling(profile, APP_NAME)
+    if log_json_passthrough:
+        enable_json_passthrough()
     if ctx.invoked_subcommand is None:
         log.info("echo bare invocation", env=os.environ, args=sys.argv)
@@ -2,13 +2,21 @@
 # a new file under orchestrate/dags/ and Airflow
 # will pick it up automatically.
 
-import json
 import logging
 import os
-import subprocess
-from collections.abc import Iterable
 
 from airflow import DAG
+from meltano_operators import MeltanoOperator
+from meltano_schedules import (
+    POOL_BY_ENV,
+    group_run_args,
+    job_task_groups,
+    load_schedules,
+    pool_name,
+    project_plugin_types,
+    schedule_setting,
+    task_pool_plugin,
+)
 
 try:
     from airflow.operators.bash_operator import BashOperator
@@ -32,8 +40,14 @@ DEFAULT_ARGS = {
 }
 
 DEFAULT_TAGS = ["meltano"]
+# Used when a schedule has no start_date of its own. It must never change between
+# parses, otherwise Airflow re-serializes the DAG every time the file is processed.
+DEFAULT_START_DATE = datetime(2022, 1, 1)
 PROJECT_ROOT = os.getenv("MELTANO_PROJECT_ROOT", os.getcwd())
 MELTANO_BIN = ".meltano/run/bin"
+# Sub-folder of the dags folder holding one materialized DAG file per schedule.
+STATIC_DAGS_DIR = "meltano_dags"
+_PLUGIN_TYPES = None
 
 if not Path(PROJECT_ROOT).joinpath(MELTANO_BIN).exists():
     logger.warning(
@@ -43,138 +57,241 @@ if not Path(PROJECT_ROOT).joinpath(MELTANO_BIN).exists():
     MELTANO_BIN = "meltano"
 
 
-def _meltano_elt_generator(schedules):
-    """Generate singular dag's for each legacy Meltano elt task.
+def _start_date(schedule):
+    """Return a start date for the schedule that is stable across parses.
 
     Args:
-        schedules (list): List of Meltano schedules.
+        schedule (dict): A Meltano schedule.
+
+    Returns:
+        datetime: The schedule's own start_date, or DEFAULT_START_DATE.
     """
-    for schedule in schedules:
-        logger.info(f"Considering schedule '{schedule['name']}': {schedule}")
-        if not schedule["cron_interval"]:
-            logger.info(
-                f"No DAG created for schedule '{schedule['name']}' because its interval is set to `@once`.",
-            )
-            continue
-
-        args = DEFAULT_ARGS.copy()
-        if schedule["start_date"]:
-            args["start_date"] = schedule["start_date"]
-
-        dag_id = f"meltano_{schedule['name']}"
-
-        tags = DEFAULT_TAGS.copy()
-        if schedule["extractor"]:
-            tags.append(schedule["extractor"])
-        if schedule["loader"]:
-            tags.append(schedule["loader"])
-        if schedule["transform"] == "run":
-            tags.append("transform")
-        elif schedule["transform"] == "only":
-            tags.append("transform-only")
-
-        # from https://airflow.apache.org/docs/stable/scheduler.html#backfill-and-catchup
-        #
-        # It is crucial to set `catchup` to False so that Airflow only create a single job
-        # at the tail end of date window we want to extract data.
-        #
-        # Because our extractors do not support date-window extraction, it serves no
-        # purpose to enqueue date-chunked jobs for complete extraction window.
-        dag = DAG(
-            dag_id,
-            tags=tags,
-            catchup=False,
-            default_args=args,
-            schedule_interval=schedule["interval"],
-            max_active_runs=1,
-        )
+    start_date = schedule.get("start_date")
+    if not start_date:
+        return DEFAULT_START_DATE
+    if isinstance(start_date, datetime):
+        return start_date
+    return datetime.fromisoformat(str(start_date).replace("Z", "+00:00"))
+
+
+def _dag_tags(tags):
+    """Deduplicate and sort tags so their order never depends on the schedule definition."""
+    return sorted(set(tags))
+
 
-        elt = BashOperator(
-            task_id="extract_load",
-            bash_command=f"cd {PROJECT_ROOT}; {MELTANO_BIN} schedule run {schedule['name']}",
+def _plugin_types():
+    """Return the project's extractors and loaders by name, read once per parse."""
+    global _PLUGIN_TYPES
+    if _PLUGIN_TYPES is None:
+        _PLUGIN_TYPES = project_plugin_types(PROJECT_ROOT)
+    return _PLUGIN_TYPES
+
+
+def _meltano_task(schedule, task_id, command, dag, pool_plugin=None):
+    """Create the Airflow task running a meltano command for a schedule.
+
+    Tasks use MeltanoOperator unless `MELTANO_DAG_OPERATOR=bash` selects the
+    previous BashOperator behaviour. `MELTANO_DAG_DEFERRABLE=true` makes them
+    release their worker slot while meltano runs, for at most
+    `MELTANO_DAG_DEFERRAL_TIMEOUT` seconds, and `MELTANO_DAG_EXECUTOR=forkserver`
+    forks them from a warm fork-server.
+
+    Args:
+        schedule (dict): The Meltano schedule the task belongs to.
+        task_id (str): The Airflow task id.
+        command (list): The meltano arguments.
+        dag (DAG): The DAG to add the task to.
+        pool_plugin (str): The plugin whose Airflow pool the task runs in, if any.
+
+    Returns:
+        BaseOperator: The created task.
+    """
+    pool_args = {"pool": pool_name(pool_plugin)} if pool_plugin else {}
+    if schedule_setting(schedule, "MELTANO_DAG_OPERATOR", "meltano") == "bash":
+        return BashOperator(
+            task_id=task_id,
+            bash_command=f"cd {PROJECT_ROOT}; {MELTANO_BIN} {' '.join(command)}",
             dag=dag,
+            **pool_args,
+        )
+    deferrable = schedule_setting(schedule, "MELTANO_DAG_DEFERRABLE", "false")
+    deferral_timeout = schedule_setting(schedule, "MELTANO_DAG_DEFERRAL_TIMEOUT", "")
+    return MeltanoOperator(
+        task_id=task_id,
+        command=command,
+        project_root=PROJECT_ROOT,
+        meltano_bin=MELTANO_BIN,
+        deferrable=deferrable.lower() in ("true", "1", "yes"),
+        executor=schedule_setting(schedule, "MELTANO_DAG_EXECUTOR", "exec"),
+        deferral_timeout=float(deferral_timeout) if deferral_timeout else None,
+        dag=dag,
+        **pool_args,
+    )
+
+
+def build_elt_dag(schedule):
+    """Build the DAG for a single legacy Meltano elt schedule.
+
+    Args:
+        schedule (dict): A Meltano elt schedule.
+
+    Returns:
+        DAG: The DAG, or None if the schedule should not get one.
+    """
+    logger.info(f"Considering schedule '{schedule['name']}': {schedule}")
+    if not schedule["cron_interval"]:
+        logger.info(
+            f"No DAG created for schedule '{schedule['name']}' because its interval is set to `@once`.",
         )
+        return None
 
-        # register the dag
-        globals()[dag_id] = dag
-        logger.info(f"DAG created for schedule '{schedule['name']}'")
+    args = DEFAULT_ARGS.copy()
+    args["start_date"] = _start_date(schedule)
 
+    dag_id = f"meltano_{schedule['name']}"
 
-def _meltano_job_generator(schedules):
-    """Generate dag's for each task within a Meltano scheduled job.
+    tags = DEFAULT_TAGS.copy()
+    if schedule["extractor"]:
+        tags.append(schedule["extractor"])
+    if schedule["loader"]:
+        tags.append(schedule["loader"])
+    if schedule["transform"] == "run":
+        tags.append("transform")
+    elif schedule["transform"] == "only":
+        tags.append("transform-only")
+
+    # from https://airflow.apache.org/docs/stable/scheduler.html#backfill-and-catchup
+    #
+    # It is crucial to set `catchup` to False so that Airflow only create a single job
+    # at the tail end of date window we want to extract data.
+    #
+    # Because our extractors do not support date-window extraction, it serves no
+    # purpose to enqueue date-chunked jobs for complete extraction window.
+    dag = DAG(
+        dag_id,
+        tags=_dag_tags(tags),
+        catchup=False,
+        default_args=args,
+        schedule_interval=schedule["interval"],
+        max_active_runs=1,
+    )
+
+    pool_by = os.getenv(POOL_BY_ENV)
+    elt = _meltano_task(
+        schedule,
+        "extract_load",
+        ["schedule", "run", schedule["name"]],
+        dag,
+        pool_plugin=schedule.get(pool_by)
+        if pool_by in ("extractor", "loader")
+        else None,
+    )
+
+    logger.info(f"DAG created for schedule '{schedule['name']}'")
+    return dag
+
+
+def build_job_dag(schedule):
+    """Build the DAG for a single Meltano scheduled job, with a task per job task.
 
     Args:
-        schedules (list): List of Meltano scheduled jobs.
+        schedule (dict): A Meltano scheduled job.
+
+    Returns:
+        DAG: The DAG, or None if the schedule should not get one.
     """
-    for schedule in schedules:
-        if not schedule.get("job"):
-            logger.info(
-                f"No DAG's created for schedule '{schedule['name']}'. It was passed to job generator but has no job."
-            )
-            continue
-        if not schedule["cron_interval"]:
-            logger.info(
-                f"No DAG created for schedule '{schedule['name']}' because its interval is set to `@once`."
-            )
-            continue
-
-        base_id = f"meltano_{schedule['name']}_{schedule['job']['name']}"
-        common_tags = DEFAULT_TAGS.copy()
-        common_tags.append(f"schedule:{schedule['name']}")
-        common_tags.append(f"job:{schedule['job']['name']}")
-        interval = schedule["cron_interval"]
-        args = DEFAULT_ARGS.copy()
-        args["start_date"] = datetime.utcnow()
-
-        with DAG(
-                base_id,
-                tags=common_tags,
-                catchup=False,
-                default_args=args,
-                schedule_interval=interval,
-                max_active_runs=1,
-        ) as dag:
-            previous_task = None
-            for idx, task in enumerate(schedule["job"]["tasks"]):
+    if not schedule.get("job"):
+        logger.info(
+            f"No DAG's created for schedule '{schedule['name']}'. It was passed to job generator but has no job."
+        )
+        return None
+    if not schedule["cron_interval"]:
+        logger.info(
+            f"No DAG created for schedule '{schedule['name']}' because its interval is set to `@once`."
+        )
+        return None
+
+    base_id = f"meltano_{schedule['name']}_{schedule['job']['name']}"
+    common_tags = DEFAULT_TAGS.copy()
+    common_tags.append(f"schedule:{schedule['name']}")
+    common_tags.append(f"job:{schedule['job']['name']}")
+    interval = schedule["cron_interval"]
+    args = DEFAULT_ARGS.copy()
+    args["start_date"] = _start_date(schedule)
+
+    with DAG(
+        base_id,
+        tags=_dag_tags(common_tags),
+        catchup=False,
+        default_args=args,
+        schedule_interval=interval,
+        max_active_runs=1,
+    ) as dag:
+        stages = job_task_groups(schedule)
+        pool_by = os.getenv(POOL_BY_ENV)
+        # Only pooling needs the plugin types, which means reading meltano.yml.
+        plugin_types = _plugin_types() if pool_by in ("extractor", "loader") else None
+
+        upstream_tasks = []
+        for stage in stages:
+            stage_tasks = []
+            for group in stage:
                 logger.info(
-                    f"Considering task '{task}' of schedule '{schedule['name']}': {schedule}"
+                    f"Considering tasks {[task for _, task in group]} of schedule '{schedule['name']}': {schedule}"
                 )
 
-                task_id = f"{base_id}_task{idx}"
-
-                if isinstance(task, Iterable) and not isinstance(task, str):
-                    run_args = " ".join(task)
-                else:
-                    run_args = task
+                first_idx, last_idx = group[0][0], group[-1][0]
+                task_id = f"{base_id}_task{first_idx}"
+                if last_idx != first_idx:
+                    task_id = f"{task_id}_to_{last_idx}"
+                run_args = group_run_args(group)
 
-                task = BashOperator(
-                    task_id=task_id,
-                    bash_command=f"cd {PROJECT_ROOT}; {MELTANO_BIN} run {run_args}",
-                    dag=dag,
+                task = _meltano_task(
+                    schedule,
+                    task_id,
+                    ["run", *run_args],
+                    dag,
+                    pool_plugin=task_pool_plugin(run_args, pool_by, plugin_types),
                 )
-                if previous_task:
-                    task.set_upstream(previous_task)
-                previous_task = task
+                task.set_upstream(upstream_tasks)
+                stage_tasks.append(task)
                 logger.info(
                     f"Spun off task '{task}' of schedule '{schedule['name']}': {schedule}"
                 )
+            upstream_tasks = stage_tasks
 
-        globals()[base_id] = dag
-        logger.info(
-            f"DAG created for schedule '{schedule['name']}', task='{run_args}'"
-        )
+    logger.info(f"DAG created for schedule '{schedule['name']}'")
+    return dag
+
+
+def _meltano_elt_generator(schedules):
+    """Generate singular dag's for each legacy Meltano elt task.
+
+    Args:
+        schedules (list): List of Meltano schedules.
+    """
+    for schedule in schedules:
+        dag = build_elt_dag(schedule)
+        if dag:
+            # register the dag
+            globals()[dag.dag_id] = dag
+
+
+def _meltano_job_generator(schedules):
+    """Generate dag's for each task within a Meltano scheduled job.
+
+    Args:
+        schedules (list): List of Meltano scheduled jobs.
+    """
+    for schedule in schedules:
+        dag = build_job_dag(schedule)
+        if dag:
+            globals()[dag.dag_id] = dag
 
 
 def create_dags():
     """Create DAGs for Meltano schedules."""
-    list_result = subprocess.run(
-        [MELTANO_BIN, "schedule", "list", "--format=json"],
-        cwd=PROJECT_ROOT,
-        stdout=subprocess.PIPE,
-        universal_newlines=True,
-        check=True,
-    )
-    schedule_export = json.loads(list_result.stdout)
+    schedule_export = load_schedules(PROJECT_ROOT, MELTANO_BIN)
 
     if schedule_export.get("schedules"):
         logger.info(f"Received meltano v2 style schedule export: {schedule_export}")
@@ -185,4 +302,11 @@ def create_dags():
         _meltano_elt_generator(schedule_export)
 
 
-create_dags()
\ No newline at end of file
+# When `airflow_extension materialize-dags` has written one DAG file per schedule, those
+# files import the builders above and this module must not register the DAGs a second time.
+if Path(__file__).with_name(STATIC_DAGS_DIR).is_dir():
+    logger.info(
+        f"Meltano DAGs are materialized in '{STATIC_DAGS_DIR}', skipping generation."
+    )
+else:
+    create_dags()
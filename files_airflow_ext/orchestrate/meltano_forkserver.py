@@ -0,0 +1,528 @@
+# Fork-server running meltano commands from a warm, pre-imported meltano CLI.
+#
+# This module is deployed next to meltano_dag_generator.py. MeltanoOperator imports it
+# from there as a client, and starts it as a script with meltano's own interpreter as the
+# server, so it may only depend on the standard library.
+#
+# The server imports the CLI once, then forks `pool_size` workers that accept runs on a
+# unix socket. A worker forks a fresh child per run, which gets the caller's argv, cwd,
+# environment and stdio file descriptors, so runs share nothing but the imported modules.
+# Workers do not wait for their runs, so the pool size does not cap concurrent runs.
+# A worker stops accepting after `max_runs` runs, tells the server over a pipe, and the
+# server forks a new one from its pristine state right away, capping the memory a
+# long-lived worker can accumulate while the old worker waits for its last runs.
+# The server stops once no run went on for `idle_timeout` seconds.
+
+import fcntl
+import hashlib
+import importlib
+import json
+import os
+import select
+import shutil
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+DEFAULT_ENTRYPOINT = "meltano.cli:main"
+DEFAULT_POOL_SIZE = 4
+DEFAULT_MAX_RUNS = 100
+DEFAULT_IDLE_TIMEOUT = 3600.0
+START_TIMEOUT = 60.0
+# Seconds a run whose client went away gets to exit after SIGTERM, before SIGKILL.
+KILL_GRACE_PERIOD = 10.0
+
+_LENGTH = struct.Struct(">I")
+# Messages workers send the server, with the worker's pid: `s` when a run started,
+# `e` when one ended and `m` once the worker reached max_runs.
+_EVENT = struct.Struct(">ci")
+_STDIO_FDS = 3
+_INT_SIZE = struct.calcsize("i")
+
+
+def _meltano_script(meltano_bin, project_root):
+    """Return the path of the meltano executable, or None if it cannot be found."""
+    if os.sep in meltano_bin:
+        meltano_bin = os.path.join(project_root, meltano_bin)
+    return shutil.which(meltano_bin)
+
+
+def socket_path_for(project_root, meltano_bin="meltano"):
+    """Return the fork-server socket for a project, short enough for AF_UNIX paths.
+
+    The socket is also keyed on the meltano script's path and mtime, which installing
+    or upgrading meltano rewrites, so a server started with another meltano is not used.
+    """
+    key = [os.path.abspath(project_root)]
+    path = _meltano_script(meltano_bin, project_root)
+    if path:
+        key.extend([os.path.realpath(path), str(os.stat(path).st_mtime_ns)])
+    digest = hashlib.sha1("\0".join(key).encode()).hexdigest()[:12]
+    return os.path.join(
+        tempfile.gettempdir(), f"meltano-forkserver-{os.getuid()}-{digest}.sock"
+    )
+
+
+def meltano_python(meltano_bin, project_root="."):
+    """Return the interpreter meltano is installed in, from its script's shebang.
+
+    Args:
+        meltano_bin (str): The meltano executable, relative paths are taken from project_root.
+        project_root (str): The Meltano project root.
+
+    Returns:
+        str: The interpreter path, or None if meltano_bin is not a Python script.
+    """
+    path = _meltano_script(meltano_bin, project_root)
+    if not path:
+        return None
+    with open(path, "rb") as script:
+        first_line = script.readline().decode(errors="replace").strip()
+    if not first_line.startswith("#!") or "python" not in first_line:
+        return None
+    interpreter = first_line[2:].split()[0]
+    return interpreter if os.path.basename(interpreter) != "env" else None
+
+
+def _exit_code(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _drain(fd, size=4096):
+    """Read everything a non-blocking pipe holds."""
+    data = b""
+    while True:
+        try:
+            chunk = os.read(fd, size)
+        except BlockingIOError:
+            return data
+        if not chunk:
+            return data
+        data += chunk
+
+
+def _recv_exactly(conn, size):
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed mid-message")
+        data += chunk
+    return data
+
+
+def _run_child(entrypoint, request, fds):
+    """Become the run: take over the caller's stdio, cwd and env, then call the CLI."""
+    os.setsid()
+    for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    code = 1
+    try:
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        sys.argv = list(request["argv"])
+        entrypoint()
+        code = 0
+    except SystemExit as err:
+        if err.code is None or isinstance(err.code, int):
+            code = err.code or 0
+        else:
+            print(err.code, file=sys.stderr)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def _start_run(conn, listener, entrypoint, inherited_fds):
+    """Read a run request from conn and fork its child, which never returns.
+
+    Args:
+        conn (socket.socket): The accepted connection.
+        listener (socket.socket): The server's listening socket, closed in the child.
+        entrypoint (callable): The meltano CLI entrypoint.
+        inherited_fds (list): Other descriptors of the worker to close in the child.
+
+    Returns:
+        int: The child's pid, or None if conn held no valid request.
+    """
+    header, ancdata, _, _ = conn.recvmsg(
+        _LENGTH.size, socket.CMSG_SPACE(_STDIO_FDS * _INT_SIZE)
+    )
+    fds = []
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            count = len(data) // _INT_SIZE
+            fds.extend(struct.unpack(f"{count}i", data[: count * _INT_SIZE]))
+    try:
+        request = json.loads(_recv_exactly(conn, _LENGTH.unpack(header)[0]))
+        if len(fds) != _STDIO_FDS:
+            raise ValueError(f"expected {_STDIO_FDS} stdio fds, got {len(fds)}")
+    except (ValueError, ConnectionError, struct.error):
+        # Includes the connection probes of ensure_server, which send nothing.
+        for fd in fds:
+            os.close(fd)
+        return None
+
+    pid = os.fork()
+    if pid == 0:
+        signal.set_wakeup_fd(-1)
+        for fd in inherited_fds:
+            os.close(fd)
+        listener.close()
+        conn.close()
+        _run_child(entrypoint, request, fds)
+    for fd in fds:
+        os.close(fd)
+    try:
+        conn.sendall(json.dumps({"pid": pid}).encode() + b"\n")
+    except OSError:
+        pass
+    return pid
+
+
+def _reap(running, events_fd):
+    """Send the exit code of every finished run to its client."""
+    while running:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            return
+        conn = running.pop(pid, None)
+        if conn is None:
+            continue
+        os.write(events_fd, _EVENT.pack(b"e", os.getpid()))
+        with conn:
+            try:
+                conn.sendall(
+                    json.dumps({"returncode": _exit_code(status)}).encode() + b"\n"
+                )
+            except OSError:
+                pass
+
+
+def _stop_abandoned(running, abandoned, readable):
+    """Stop runs whose client went away, e.g. because its task process was killed.
+
+    Runs lead their own session, so nothing else would stop them. The client never
+    sends anything after its request, so a readable connection means it closed.
+    The run's process group gets SIGTERM, and SIGKILL if it is still going after
+    KILL_GRACE_PERIOD.
+
+    Args:
+        running (dict): The connections of the runs going on, by pid.
+        abandoned (dict): When abandoned runs get SIGKILL, by pid, None once they did.
+        readable (list): The connections select() found readable.
+    """
+    now = time.monotonic()
+    for pid, conn in running.items():
+        if pid in abandoned:
+            if abandoned[pid] is not None and now >= abandoned[pid]:
+                abandoned[pid] = None
+                _killpg(pid, signal.SIGKILL)
+            continue
+        if conn not in readable:
+            continue
+        try:
+            if conn.recv(4096):
+                continue
+        except OSError:
+            pass
+        abandoned[pid] = now + KILL_GRACE_PERIOD
+        _killpg(pid, signal.SIGTERM)
+
+
+def _killpg(pid, sig):
+    """Signal the process group a run leads, or the run alone if it has no group yet."""
+    try:
+        os.killpg(pid, sig)
+    except ProcessLookupError:
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+
+def _worker(listener, entrypoint, max_runs, events_fd, server_fds):
+    """Accept runs until max_runs is reached, forking a fresh child for each.
+
+    The worker goes back to accepting as soon as a run is forked, so the number of
+    workers does not limit how many runs go on at once. Finished runs are reaped
+    when SIGCHLD wakes the worker up. Once max_runs runs were started, the worker
+    stops accepting, tells the server so it can start a replacement, and exits
+    after its last run finished. Runs whose client went away are stopped, see
+    `_stop_abandoned`.
+
+    Args:
+        listener (socket.socket): The server's listening socket.
+        entrypoint (callable): The meltano CLI entrypoint.
+        max_runs (int): The number of runs to accept.
+        events_fd (int): The pipe to send the server `_EVENT` messages on.
+        server_fds (list): Descriptors only the server uses, closed here.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.set_wakeup_fd(-1)
+    for fd in server_fds:
+        os.close(fd)
+    wakeup_read, wakeup_write = os.pipe()
+    os.set_blocking(wakeup_read, False)
+    os.set_blocking(wakeup_write, False)
+    signal.set_wakeup_fd(wakeup_write)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    # Workers share the listener, and another one may take a connection first.
+    listener.setblocking(False)
+
+    running = {}
+    abandoned = {}
+    runs = 0
+    while runs < max_runs or running:
+        watched = [wakeup_read, listener] if runs < max_runs else [wakeup_read]
+        watched.extend(conn for pid, conn in running.items() if pid not in abandoned)
+        kill_deadlines = [
+            deadline for deadline in abandoned.values() if deadline is not None
+        ]
+        timeout = (
+            max(0, min(kill_deadlines) - time.monotonic()) if kill_deadlines else None
+        )
+        readable, _, _ = select.select(watched, [], [], timeout)
+        if wakeup_read in readable:
+            _drain(wakeup_read)
+        _reap(running, events_fd)
+        for pid in [pid for pid in abandoned if pid not in running]:
+            del abandoned[pid]
+        _stop_abandoned(running, abandoned, readable)
+        if listener not in readable:
+            continue
+        try:
+            conn, _ = listener.accept()
+        except BlockingIOError:
+            continue
+        conn.setblocking(True)
+        inherited_fds = [
+            wakeup_read,
+            wakeup_write,
+            events_fd,
+            *(c.fileno() for c in running.values()),
+        ]
+        pid = _start_run(conn, listener, entrypoint, inherited_fds)
+        if pid is None:
+            conn.close()
+            continue
+        runs += 1
+        running[pid] = conn
+        os.write(events_fd, _EVENT.pack(b"s", os.getpid()))
+        if runs == max_runs:
+            os.write(events_fd, _EVENT.pack(b"m", os.getpid()))
+    os._exit(0)
+
+
+def serve(
+    socket_path, entrypoint_path, pool_size, max_runs, idle_timeout=DEFAULT_IDLE_TIMEOUT
+):
+    """Import the CLI, then keep `pool_size` workers accepting runs on socket_path.
+
+    The server stops once no run went on for `idle_timeout` seconds, 0 for never.
+    """
+    module_name, _, attr = entrypoint_path.partition(":")
+    entrypoint = getattr(importlib.import_module(module_name), attr)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Created owner-only, rather than chmod-ed after, when others could already connect.
+    umask = os.umask(0o177)
+    try:
+        listener.bind(socket_path)
+    finally:
+        os.umask(umask)
+    listener.listen(pool_size * 4)
+
+    # Every worker, with the number of its runs going on.
+    workers = {}
+    # Workers still accepting runs, the others only wait for their last runs to finish.
+    accepting = set()
+    events_read, events_write = os.pipe()
+    wakeup_read, wakeup_write = os.pipe()
+    for fd in (events_read, wakeup_read, wakeup_write):
+        os.set_blocking(fd, False)
+
+    def _stop(signum, frame):
+        # Clients that come now start a new server instead.
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    signal.set_wakeup_fd(wakeup_write)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    # Nothing may be left in the buffers, or every child would write it out again.
+    sys.stdout.flush()
+    sys.stderr.flush()
+    last_run = time.monotonic()
+    while True:
+        while len(accepting) < pool_size:
+            pid = os.fork()
+            if pid == 0:
+                server_fds = [events_read, wakeup_read, wakeup_write]
+                _worker(listener, entrypoint, max_runs, events_write, server_fds)
+            workers[pid] = 0
+            accepting.add(pid)
+
+        timeout = None
+        if idle_timeout and not any(workers.values()):
+            timeout = last_run + idle_timeout - time.monotonic()
+            if timeout <= 0:
+                _stop(None, None)
+        readable, _, _ = select.select([wakeup_read, events_read], [], [], timeout)
+        if wakeup_read in readable:
+            _drain(wakeup_read)
+        if events_read in readable:
+            # Messages are written at once and are smaller than PIPE_BUF, so the
+            # pipe only ever holds whole ones.
+            for kind, pid in _EVENT.iter_unpack(_drain(events_read)):
+                if kind == b"m":
+                    accepting.discard(pid)
+                elif pid in workers:
+                    workers[pid] += 1 if kind == b"s" else -1
+                    last_run = time.monotonic()
+        while workers:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            workers.pop(pid, None)
+            accepting.discard(pid)
+
+
+def _can_connect(socket_path):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(socket_path)
+    except OSError:
+        return False
+    return True
+
+
+def ensure_server(
+    socket_path,
+    python,
+    entrypoint=DEFAULT_ENTRYPOINT,
+    pool_size=DEFAULT_POOL_SIZE,
+    max_runs=DEFAULT_MAX_RUNS,
+    idle_timeout=DEFAULT_IDLE_TIMEOUT,
+):
+    """Start a fork-server on socket_path unless one is already listening there.
+
+    Raises:
+        TimeoutError: If the server did not come up within START_TIMEOUT seconds.
+    """
+    if _can_connect(socket_path):
+        return
+    # Tasks starting at the same time must not each start a server.
+    with open(f"{socket_path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if _can_connect(socket_path):
+            return
+        subprocess.Popen(
+            [
+                python,
+                os.path.abspath(__file__),
+                socket_path,
+                entrypoint,
+                str(pool_size),
+                str(max_runs),
+                str(idle_timeout),
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        deadline = time.monotonic() + START_TIMEOUT
+        while not _can_connect(socket_path):
+            if time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"meltano fork-server did not start on {socket_path}"
+                )
+            time.sleep(0.1)
+
+
+class ForkedRun:
+    """A run started on the fork-server, see `start_run`."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._replies = conn.makefile("rb")
+        self.pid = json.loads(self._replies.readline())["pid"]
+
+    def wait(self):
+        """Wait for the run to exit and return its exit code."""
+        try:
+            line = self._replies.readline()
+            return json.loads(line)["returncode"] if line else None
+        finally:
+            self._replies.close()
+            self._conn.close()
+
+
+def start_run(socket_path, argv, cwd, env, stdout_fd, stderr_fd, stdin_fd=None):
+    """Start a run on the fork-server, handing it our file descriptors for its stdio.
+
+    Args:
+        socket_path (str): The fork-server's socket.
+        argv (list): The full argv of the run, starting with the program name.
+        cwd (str): The run's working directory.
+        env (dict): The run's complete environment.
+        stdout_fd (int): File descriptor the run's stdout goes to.
+        stderr_fd (int): File descriptor the run's stderr goes to.
+        stdin_fd (int): File descriptor of the run's stdin, /dev/null if None.
+
+    Returns:
+        ForkedRun: The started run.
+    """
+    payload = json.dumps({"argv": list(argv), "cwd": cwd, "env": dict(env)}).encode()
+    devnull = os.open(os.devnull, os.O_RDONLY) if stdin_fd is None else None
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+        fds = [stdin_fd if devnull is None else devnull, stdout_fd, stderr_fd]
+        conn.sendmsg(
+            [_LENGTH.pack(len(payload))],
+            [(socket.SOL_SOCKET, socket.SCM_RIGHTS, struct.pack(f"{len(fds)}i", *fds))],
+        )
+        conn.sendall(payload)
+        return ForkedRun(conn)
+    except BaseException:
+        conn.close()
+        raise
+    finally:
+        if devnull is not None:
+            os.close(devnull)
+
+
+if __name__ == "__main__":
+    # Started by ensure_server. Drop this folder from the path, so that files
+    # next to this one cannot shadow modules meltano imports.
+    sys.path.pop(0)
+    socket_path, entrypoint, pool_size, max_runs, idle_timeout = sys.argv[1:6]
+    serve(socket_path, entrypoint, int(pool_size), int(max_runs), float(idle_timeout))
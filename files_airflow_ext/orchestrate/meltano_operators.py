@@ -0,0 +1,489 @@
+# Airflow operators used by the Meltano DAG generator.
+#
+# This module is deployed next to meltano_dag_generator.py, which imports it from
+# the dags folder, so it may only depend on the standard library and Airflow.
+
+import asyncio
+import json
+import os
+import re
+import signal
+import socket
+import subprocess
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from airflow.exceptions import AirflowException
+from airflow.models import BaseOperator
+
+try:
+    from airflow.triggers.base import BaseTrigger, TriggerEvent
+except ImportError:  # Airflow < 2.2 has no deferrable operators.
+    BaseTrigger = None
+
+# Runs meltano and records its exit code in a status file once it is done. The
+# status file is written to a temp name first, so pollers never read a partial file.
+DETACHED_WRAPPER = 'status="$1"; shift; "$@"; code=$?; echo "$code" > "$status.tmp" && mv "$status.tmp" "$status"'
+RUNS_DIR = ".meltano/run/airflow/runs"
+# Written next to the status file, records where the detached run lives.
+RUN_INFO_FILE = "run.json"
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _is_detached_run(pid, status_path):
+    """Check that pid still is the detached run writing to status_path, not a reused pid."""
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as cmdline:
+            return str(status_path).encode() in cmdline.read().split(b"\0")
+    except FileNotFoundError:
+        if os.path.isdir("/proc"):
+            return False
+    except OSError:
+        pass
+    return _is_alive(pid)
+
+
+def stop_detached_run(pid, status_path):
+    """Terminate a detached meltano run started on this host, unless it already exited.
+
+    The run leads its own session, so its whole process group is signalled.
+
+    Args:
+        pid (int): The pid of the detached run.
+        status_path (str): The status file the run writes its exit code to.
+
+    Returns:
+        bool: True if the run was still going and got signalled.
+    """
+    if Path(status_path).exists() or not _is_detached_run(pid, status_path):
+        return False
+    try:
+        os.killpg(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+async def wait_for_meltano_run(
+    status_path, pid=None, hostname=None, poll_interval=10.0
+):
+    """Wait for a detached meltano run to write its status file.
+
+    This is the polling logic of MeltanoRunTrigger, kept free of Airflow so it can be
+    exercised with a fake meltano script.
+
+    Args:
+        status_path (str): The status file the detached run writes its exit code to.
+        pid (int): The pid of the detached run, used to detect runs that died without a status.
+        hostname (str): The host the run was started on. The pid is only checked on that host.
+        poll_interval (float): Seconds between checks.
+
+    Returns:
+        dict: `{"returncode": <int or None>}`, None meaning the run was lost.
+    """
+    status_path = Path(status_path)
+    check_pid = pid is not None and hostname == socket.gethostname()
+    while True:
+        if status_path.exists():
+            return {"returncode": int(status_path.read_text().strip())}
+        if check_pid and not _is_alive(pid):
+            # The run may have exited between the two checks.
+            if status_path.exists():
+                continue
+            return {"returncode": None}
+        await asyncio.sleep(poll_interval)
+
+
+if BaseTrigger is not None:
+
+    class MeltanoRunTrigger(BaseTrigger):
+        """Fires once a detached meltano run, started by a deferred MeltanoOperator, has exited.
+
+        The status file must be readable from the triggerer, so the project root has to
+        live on storage shared between workers and triggerers.
+        """
+
+        def __init__(
+            self,
+            status_path,
+            log_path,
+            started_at,
+            pid=None,
+            hostname=None,
+            poll_interval=10.0,
+        ):
+            super().__init__()
+            self.status_path = status_path
+            self.log_path = log_path
+            self.started_at = started_at
+            self.pid = pid
+            self.hostname = hostname
+            self.poll_interval = poll_interval
+
+        def serialize(self):
+            return (
+                "meltano_operators.MeltanoRunTrigger",
+                {
+                    "status_path": self.status_path,
+                    "log_path": self.log_path,
+                    "started_at": self.started_at,
+                    "pid": self.pid,
+                    "hostname": self.hostname,
+                    "poll_interval": self.poll_interval,
+                },
+            )
+
+        async def run(self):
+            event = await wait_for_meltano_run(
+                self.status_path, self.pid, self.hostname, self.poll_interval
+            )
+            event.update(log_path=self.log_path, started_at=self.started_at)
+            yield TriggerEvent(event)
+
+        def _task_abandoned(self):
+            # Set by the triggerer on Airflow 2.6+. Without it, a cancelled trigger
+            # cannot be told apart from a triggerer shutting down.
+            task_instance = getattr(self, "task_instance", None)
+            if task_instance is None:
+                return False
+            task_instance.refresh_from_db()
+            return task_instance.state != "deferred"
+
+        async def cleanup(self):
+            """Stop the run when the task stopped waiting for it, e.g. it was marked failed or cleared.
+
+            Cleanup also runs when the trigger fired or the triggerer shuts down, in
+            which cases the run has finished or the task still waits for it.
+            """
+            if self.pid is None or self.hostname != socket.gethostname():
+                return
+            if Path(self.status_path).exists():
+                return
+            loop = asyncio.get_running_loop()
+            if await loop.run_in_executor(None, self._task_abandoned):
+                if stop_detached_run(self.pid, self.status_path):
+                    self.log.info("Stopped abandoned meltano run %s", self.pid)
+
+
+class MeltanoOperator(BaseOperator):
+    """Run a meltano command, streaming its output into the task log.
+
+    The meltano binary is exec'd directly with an argv list, without a shell in
+    between. Timing and exit metadata of the run is pushed to XCom under the
+    `meltano_run` key, whether the command succeeded or not.
+
+    With the `forkserver` executor, meltano is forked from a warm fork-server with
+    the CLI already imported, see meltano_forkserver.py, falling back to a plain
+    exec if the fork-server cannot be used.
+
+    When deferrable, meltano is started detached with its output going to a log
+    file under the project's `.meltano/run/airflow/runs`, and the worker slot is
+    released until MeltanoRunTrigger sees the run finish. The log is then replayed
+    into the task log. A retry stops the detached run of an earlier try if it is
+    still going, rather than running next to it. The task fails if the run does not
+    finish within `deferral_timeout`, or else `execution_timeout`. A run on another
+    host that dies without recording its exit code is only caught that way.
+    """
+
+    template_fields = ("command",)
+
+    def __init__(
+        self,
+        *,
+        command,
+        project_root=None,
+        meltano_bin="meltano",
+        env=None,
+        deferrable=False,
+        poll_interval=10.0,
+        executor="exec",
+        deferral_timeout=None,
+        **kwargs,
+    ):
+        """Create the operator.
+
+        Args:
+            command (list): The meltano arguments, e.g. `["run", "tap-foo", "target-bar"]`.
+            project_root (str): The Meltano project root to run from.
+            meltano_bin (str): The meltano executable.
+            env (dict): Extra environment variables for the meltano process.
+            deferrable (bool): Release the worker slot while meltano runs.
+            poll_interval (float): Seconds between status checks when deferred.
+            executor (str): How meltano is started when not deferred, `exec` or `forkserver`.
+            deferral_timeout (timedelta or float): How long a deferred run may take, in
+                seconds if a number. Defaults to `execution_timeout`.
+            **kwargs: Passed on to BaseOperator.
+        """
+        super().__init__(**kwargs)
+        self.command = list(command)
+        self.project_root = project_root or os.getcwd()
+        self.meltano_bin = meltano_bin
+        self.env = env
+        self.deferrable = deferrable
+        self.poll_interval = poll_interval
+        self.executor = executor
+        if deferral_timeout is not None and not isinstance(deferral_timeout, timedelta):
+            deferral_timeout = timedelta(seconds=float(deferral_timeout))
+        self.deferral_timeout = deferral_timeout
+        self._process = None
+        self._forked_run = None
+        if deferrable and BaseTrigger is None:
+            raise AirflowException("deferrable Meltano tasks need Airflow 2.2 or later")
+
+    def _popen_env(self):
+        if not self.env:
+            return None
+        return {**os.environ, **self.env}
+
+    def _start_forked(self):
+        """Start meltano on the project's fork-server, starting the server if needed.
+
+        Settings are read from the worker's environment: MELTANO_FORKSERVER_PYTHON (the
+        interpreter meltano is installed in, read from its shebang by default),
+        MELTANO_FORKSERVER_ENTRYPOINT, MELTANO_FORKSERVER_POOL_SIZE,
+        MELTANO_FORKSERVER_MAX_RUNS and MELTANO_FORKSERVER_IDLE_TIMEOUT.
+
+        Returns:
+            tuple: The ForkedRun and the read end of its output pipe, or None if the
+            fork-server is unavailable.
+        """
+        import meltano_forkserver
+
+        python = os.environ.get(
+            "MELTANO_FORKSERVER_PYTHON"
+        ) or meltano_forkserver.meltano_python(self.meltano_bin, self.project_root)
+        if not python:
+            self.log.warning(
+                "Cannot tell which Python runs %s, not using the fork-server",
+                self.meltano_bin,
+            )
+            return None
+
+        socket_path = meltano_forkserver.socket_path_for(
+            self.project_root, self.meltano_bin
+        )
+        try:
+            meltano_forkserver.ensure_server(
+                socket_path,
+                python,
+                entrypoint=os.environ.get(
+                    "MELTANO_FORKSERVER_ENTRYPOINT",
+                    meltano_forkserver.DEFAULT_ENTRYPOINT,
+                ),
+                pool_size=int(
+                    os.environ.get(
+                        "MELTANO_FORKSERVER_POOL_SIZE",
+                        meltano_forkserver.DEFAULT_POOL_SIZE,
+                    )
+                ),
+                max_runs=int(
+                    os.environ.get(
+                        "MELTANO_FORKSERVER_MAX_RUNS",
+                        meltano_forkserver.DEFAULT_MAX_RUNS,
+                    )
+                ),
+                idle_timeout=float(
+                    os.environ.get(
+                        "MELTANO_FORKSERVER_IDLE_TIMEOUT",
+                        meltano_forkserver.DEFAULT_IDLE_TIMEOUT,
+                    )
+                ),
+            )
+            read_fd, write_fd = os.pipe()
+            try:
+                run = meltano_forkserver.start_run(
+                    socket_path,
+                    [self.meltano_bin, *self.command],
+                    self.project_root,
+                    {**os.environ, **(self.env or {})},
+                    stdout_fd=write_fd,
+                    stderr_fd=write_fd,
+                )
+            except BaseException:
+                os.close(read_fd)
+                raise
+            finally:
+                os.close(write_fd)
+        except (OSError, TimeoutError) as err:
+            self.log.warning(
+                "Meltano fork-server unavailable, running meltano directly: %s", err
+            )
+            return None
+        return run, read_fd
+
+    def _log_output(self, output):
+        for line in output:
+            self.log.info("%s", line.decode("utf-8", errors="replace").rstrip())
+
+    def _run_metadata(self, started_at, returncode):
+        ended_at = datetime.now(timezone.utc)
+        return {
+            "command": [self.meltano_bin, *self.command],
+            "returncode": returncode,
+            "started_at": started_at.isoformat(),
+            "ended_at": ended_at.isoformat(),
+            "duration_seconds": round((ended_at - started_at).total_seconds(), 3),
+        }
+
+    def _finish(self, context, metadata):
+        context["ti"].xcom_push(key="meltano_run", value=metadata)
+        self.log.info(
+            "meltano exited with code %s after %ss",
+            metadata["returncode"],
+            metadata["duration_seconds"],
+        )
+        if metadata["returncode"] is None:
+            raise AirflowException(
+                f"meltano {' '.join(self.command)} exited without recording its exit code"
+            )
+        if metadata["returncode"]:
+            raise AirflowException(
+                f"meltano {' '.join(self.command)} failed with exit code {metadata['returncode']}"
+            )
+
+    def execute(self, context):
+        if self.deferrable:
+            self._execute_deferred(context)
+            return
+
+        started_at = datetime.now(timezone.utc)
+        self.log.info(
+            "Running %s in %s", [self.meltano_bin, *self.command], self.project_root
+        )
+
+        forked = self._start_forked() if self.executor == "forkserver" else None
+        if forked:
+            self._forked_run, read_fd = forked
+            self.log.info(
+                "Forked meltano from the fork-server as pid %s", self._forked_run.pid
+            )
+            with os.fdopen(read_fd, "rb") as output:
+                self._log_output(output)
+            returncode = self._forked_run.wait()
+        else:
+            # stderr is merged into stdout so lines keep their relative order in the task log.
+            with subprocess.Popen(
+                [self.meltano_bin, *self.command],
+                cwd=self.project_root,
+                env=self._popen_env(),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+            ) as process:
+                self._process = process
+                self._log_output(process.stdout)
+                returncode = process.wait()
+
+        self._finish(context, self._run_metadata(started_at, returncode))
+
+    def _run_dir(self, context, try_number=None):
+        ti = context["ti"]
+        try_number = ti.try_number if try_number is None else try_number
+        run_key = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{ti.run_id}_{try_number}")
+        return Path(self.project_root, RUNS_DIR, ti.dag_id, ti.task_id, run_key)
+
+    def _stop_earlier_tries(self, context):
+        """Stop detached runs of earlier tries, so a retry never runs next to its predecessor."""
+        hostname = socket.gethostname()
+        for try_number in range(1, context["ti"].try_number):
+            run_dir = self._run_dir(context, try_number)
+            try:
+                run_info = json.loads((run_dir / RUN_INFO_FILE).read_text())
+            except (OSError, ValueError):
+                continue
+            status_path = run_dir / "status"
+            if status_path.exists():
+                continue
+            if run_info.get("hostname") != hostname:
+                self.log.warning(
+                    "meltano run of try %s may still be going on %s as pid %s",
+                    try_number,
+                    run_info.get("hostname"),
+                    run_info.get("pid"),
+                )
+            elif stop_detached_run(run_info["pid"], status_path):
+                self.log.warning(
+                    "Stopped meltano run of try %s, pid %s, which was still going",
+                    try_number,
+                    run_info["pid"],
+                )
+
+    def _execute_deferred(self, context):
+        self._stop_earlier_tries(context)
+        run_dir = self._run_dir(context)
+        run_dir.mkdir(parents=True, exist_ok=True)
+        status_path = run_dir / "status"
+        log_path = run_dir / "meltano.log"
+        if status_path.exists():
+            status_path.unlink()
+
+        started_at = datetime.now(timezone.utc)
+        self.log.info(
+            "Starting %s in %s, detached with logs in %s",
+            [self.meltano_bin, *self.command],
+            self.project_root,
+            log_path,
+        )
+        with log_path.open("wb") as log_file:
+            process = subprocess.Popen(
+                [
+                    "/bin/sh",
+                    "-c",
+                    DETACHED_WRAPPER,
+                    "meltano-run",
+                    str(status_path),
+                    self.meltano_bin,
+                    *self.command,
+                ],
+                cwd=self.project_root,
+                env=self._popen_env(),
+                stdin=subprocess.DEVNULL,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+        (run_dir / RUN_INFO_FILE).write_text(
+            json.dumps({"pid": process.pid, "hostname": socket.gethostname()})
+        )
+
+        self.defer(
+            trigger=MeltanoRunTrigger(
+                status_path=str(status_path),
+                log_path=str(log_path),
+                started_at=started_at.isoformat(),
+                pid=process.pid,
+                hostname=socket.gethostname(),
+                poll_interval=self.poll_interval,
+            ),
+            method_name="execute_complete",
+            timeout=self.deferral_timeout or self.execution_timeout,
+        )
+
+    def execute_complete(self, context, event=None):
+        """Replay the detached run's log and record its outcome once the trigger fires."""
+        log_path = Path(event["log_path"])
+        if log_path.exists():
+            with log_path.open("rb") as log_file:
+                self._log_output(log_file)
+        started_at = datetime.fromisoformat(event["started_at"])
+        self._finish(context, self._run_metadata(started_at, event["returncode"]))
+
+    def on_kill(self):
+        if self._process and self._process.poll() is None:
+            self.log.info("Sending SIGTERM to meltano")
+            self._process.terminate()
+        if self._forked_run:
+            # Forked runs lead their own session, so the whole group is signalled.
+            self.log.info("Sending SIGTERM to forked meltano")
+            try:
+                os.killpg(self._forked_run.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
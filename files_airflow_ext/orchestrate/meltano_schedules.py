@@ -0,0 +1,490 @@
+# Helpers used by the Meltano DAG generator to load the project's schedules and lay
+# out their tasks.
+#
+# This module is deployed next to meltano_dag_generator.py and must only
+# depend on the standard library and PyYAML (which Airflow already requires),
+# since it runs inside the scheduler's DAG file processor.
+
+import hashlib
+import json
+import logging
+import os
+import re
+import subprocess
+import tempfile
+from collections.abc import Iterable
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MELTANO_YML = "meltano.yml"
+SCHEDULE_SOURCE_ENV = "MELTANO_SCHEDULE_SOURCE"
+CACHE_PATH_ENV = "MELTANO_SCHEDULE_CACHE"
+CACHE_TIMEOUT_ENV = "MELTANO_SCHEDULE_LIST_TIMEOUT"
+DEFAULT_CACHE_PATH = ".meltano/run/airflow/schedules.json"
+DEFAULT_TIMEOUT = 20
+POOL_BY_ENV = "MELTANO_DAG_POOL_BY"
+POOL_PREFIX = "meltano_"
+
+# Mirrors meltano's own mapping of named intervals to cron expressions.
+CRON_INTERVALS = {
+    "@once": None,
+    "@manual": None,
+    "@none": None,
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+    "@yearly": "0 0 1 1 *",
+}
+
+
+def _load_yaml(path: Path) -> dict:
+    import yaml
+
+    with path.open() as fp:
+        return yaml.safe_load(fp) or {}
+
+
+def _include_paths(project_root: Path, meltano_yml: dict = None) -> list:
+    """Return the files referenced by the `include_paths` of meltano.yml.
+
+    Args:
+        project_root: The Meltano project root.
+        meltano_yml: The already parsed meltano.yml, if available.
+
+    Returns:
+        list: Sorted list of included file paths.
+    """
+    if meltano_yml is None:
+        meltano_yml = _load_yaml(project_root / MELTANO_YML)
+
+    included = set()
+    for pattern in meltano_yml.get("include_paths") or []:
+        included.update(p for p in project_root.glob(pattern) if p.is_file())
+    return sorted(included)
+
+
+def project_fingerprint(project_root) -> str:
+    """Fingerprint meltano.yml and its included files.
+
+    The fingerprint covers the path, size, mtime and content hash of every file,
+    so that any edit to the project's configuration invalidates the cache.
+
+    Args:
+        project_root: The Meltano project root.
+
+    Returns:
+        str: A hex digest identifying the current project configuration.
+    """
+    project_root = Path(project_root)
+    digest = hashlib.sha256()
+    for path in [project_root / MELTANO_YML, *_include_paths(project_root)]:
+        stat = path.stat()
+        digest.update(str(path.relative_to(project_root)).encode())
+        digest.update(f":{stat.st_size}:{stat.st_mtime_ns}:".encode())
+        digest.update(hashlib.sha256(path.read_bytes()).digest())
+    return digest.hexdigest()
+
+
+def _elt_schedule(schedule: dict) -> dict:
+    interval = schedule.get("interval")
+    start_date = schedule.get("start_date")
+    if isinstance(start_date, datetime):
+        # meltano only exports the date part of a schedule's start_date.
+        start_date = start_date.date()
+    if hasattr(start_date, "isoformat"):
+        # PyYAML parses unquoted timestamps, keep the export JSON serializable.
+        start_date = start_date.isoformat()
+    return {
+        "name": schedule["name"],
+        "extractor": schedule.get("extractor"),
+        "loader": schedule.get("loader"),
+        "transform": schedule.get("transform", "skip"),
+        "interval": interval,
+        "start_date": start_date,
+        "env": schedule.get("env") or {},
+        "cron_interval": CRON_INTERVALS.get(interval, interval),
+    }
+
+
+def _job_schedule(schedule: dict, tasks: list) -> dict:
+    interval = schedule.get("interval")
+    return {
+        "name": schedule["name"],
+        "interval": interval,
+        "cron_interval": CRON_INTERVALS.get(interval, interval),
+        "env": schedule.get("env") or {},
+        "job": {"name": schedule["job"], "tasks": tasks},
+    }
+
+
+def resolve_schedules(project_root) -> dict:
+    """Build the schedule export by reading meltano.yml directly, without running meltano.
+
+    The result has the same shape as the v2 `meltano schedule list --format=json`
+    export, limited to the fields the DAG generator uses. Schedules and jobs are
+    collected from meltano.yml and every file matched by its `include_paths`.
+
+    Args:
+        project_root: The Meltano project root.
+
+    Returns:
+        dict: The schedule export, `{"schedules": {"elt": [...], "job": [...]}}`.
+    """
+    project_root = Path(project_root)
+    meltano_yml = _load_yaml(project_root / MELTANO_YML)
+
+    schedules = list(meltano_yml.get("schedules") or [])
+    jobs = list(meltano_yml.get("jobs") or [])
+    for path in _include_paths(project_root, meltano_yml):
+        included = _load_yaml(path)
+        schedules.extend(included.get("schedules") or [])
+        jobs.extend(included.get("jobs") or [])
+
+    # Like meltano, a job's single string task is exported as is, see job_tasks.
+    job_tasks = {job["name"]: job.get("tasks") or [] for job in jobs}
+
+    elt_schedules = []
+    job_schedules = []
+    for schedule in schedules:
+        if not schedule.get("job"):
+            elt_schedules.append(_elt_schedule(schedule))
+        elif schedule["job"] in job_tasks:
+            job_schedules.append(_job_schedule(schedule, job_tasks[schedule["job"]]))
+        else:
+            logger.warning(
+                f"Schedule '{schedule['name']}' references unknown job '{schedule['job']}', skipping it."
+            )
+
+    return {"schedules": {"job": job_schedules, "elt": elt_schedules}}
+
+
+def _cache_path(project_root: Path) -> Path:
+    return Path(os.getenv(CACHE_PATH_ENV) or project_root / DEFAULT_CACHE_PATH)
+
+
+def _read_cache(cache_path: Path):
+    try:
+        return json.loads(cache_path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(cache_path: Path, fingerprint: str, schedule_export) -> None:
+    """Atomically replace the cache file so readers never see a partial write."""
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, prefix=".schedules.")
+    try:
+        with os.fdopen(fd, "w") as fp:
+            json.dump({"fingerprint": fingerprint, "schedules": schedule_export}, fp)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def list_schedules(project_root, meltano_bin: str, timeout: float = None):
+    """Run `meltano schedule list --format=json` and return the parsed export.
+
+    Args:
+        project_root: The Meltano project root.
+        meltano_bin: The meltano executable to run.
+        timeout: Seconds to wait for meltano before giving up.
+
+    Returns:
+        The schedule export, in either the v1 or v2 format.
+    """
+    list_result = subprocess.run(
+        [meltano_bin, "schedule", "list", "--format=json"],
+        cwd=project_root,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+        timeout=timeout,
+    )
+    return json.loads(list_result.stdout)
+
+
+def load_schedules(project_root, meltano_bin: str):
+    """Load the project's schedules, using the on-disk cache where possible.
+
+    `meltano schedule list` is only run when the project fingerprint no longer
+    matches the cached one. If meltano fails or times out, the last known good
+    export is returned instead.
+
+    Setting `MELTANO_SCHEDULE_SOURCE=yaml` skips meltano and the cache entirely
+    and resolves the schedules from meltano.yml in-process.
+
+    Args:
+        project_root: The Meltano project root.
+        meltano_bin: The meltano executable to run on a cache miss.
+
+    Returns:
+        The schedule export, in either the v1 or v2 format.
+
+    Raises:
+        subprocess.SubprocessError: If meltano failed and there is no cache to fall back on.
+    """
+    if os.getenv(SCHEDULE_SOURCE_ENV, "cli").lower() == "yaml":
+        return resolve_schedules(project_root)
+
+    project_root = Path(project_root)
+    cache_path = _cache_path(project_root)
+    cached = _read_cache(cache_path)
+
+    try:
+        fingerprint = project_fingerprint(project_root)
+    except OSError as err:
+        logger.warning(f"Unable to fingerprint Meltano project: {err}")
+        fingerprint = None
+
+    if cached and fingerprint and cached.get("fingerprint") == fingerprint:
+        logger.debug(f"Using cached schedules from '{cache_path}'")
+        return cached["schedules"]
+
+    timeout = float(os.getenv(CACHE_TIMEOUT_ENV, DEFAULT_TIMEOUT))
+    try:
+        schedule_export = list_schedules(project_root, meltano_bin, timeout=timeout)
+    except (subprocess.SubprocessError, OSError, ValueError) as err:
+        if not cached:
+            raise
+        logger.warning(
+            f"Listing Meltano schedules failed ({err}), falling back on cached schedules from '{cache_path}'"
+        )
+        return cached["schedules"]
+
+    if fingerprint:
+        try:
+            _write_cache(cache_path, fingerprint, schedule_export)
+        except OSError as err:
+            logger.warning(f"Unable to write schedule cache '{cache_path}': {err}")
+    return schedule_export
+
+
+def job_tasks(schedule: dict) -> list:
+    """Return the tasks of a scheduled job as a list.
+
+    meltano exports the `tasks` of a job defined with a single string task as that string.
+    """
+    tasks = (schedule.get("job") or {}).get("tasks") or []
+    return [tasks] if isinstance(tasks, str) else list(tasks)
+
+
+def task_blocks(task) -> list:
+    """Return the blocks of a job task, which is either a string or a list of strings."""
+    if isinstance(task, Iterable) and not isinstance(task, str):
+        return [block for part in task for block in part.split()]
+    return task.split()
+
+
+def schedule_setting(schedule: dict, name: str, default):
+    """Read a generator setting, letting the schedule's env override the global environment."""
+    return (schedule.get("env") or {}).get(name) or os.getenv(name, default)
+
+
+def task_stages(tasks: list, layout: str = "serial") -> list:
+    """Group job tasks into stages. Tasks within a stage run in parallel, stages run in order.
+
+    With the default `serial` layout every task is its own stage. With the `parallel`
+    layout, consecutive tasks made up only of plugins (extract/load pairs, optionally
+    with mappers) are independent and share a stage. Tasks invoking a plugin command,
+    such as `dbt:run`, get a stage of their own, so they wait for everything before them.
+
+    Args:
+        tasks: The tasks of a Meltano job.
+        layout: Either `serial` or `parallel`.
+
+    Returns:
+        list: Stages as lists of (task index, task) pairs.
+    """
+    if layout != "parallel":
+        return [[(idx, task)] for idx, task in enumerate(tasks)]
+
+    stages = []
+    independent = []
+    for idx, task in enumerate(tasks):
+        if not any(":" in block for block in task_blocks(task)):
+            independent.append((idx, task))
+            continue
+        if independent:
+            stages.append(independent)
+            independent = []
+        stages.append([(idx, task)])
+    if independent:
+        stages.append(independent)
+    return stages
+
+
+def coalesce_stages(stages: list, max_tasks: int) -> list:
+    """Pack consecutive sequential job tasks into groups run by a single `meltano run`.
+
+    Every stage is a list of groups, and every group a list of (task index, task)
+    pairs that becomes one Airflow task. Only stages holding a single group are
+    sequential, so only those are merged, up to `max_tasks` job tasks per group.
+
+    Args:
+        stages: Stages of groups, as built from `task_stages`.
+        max_tasks: The maximum number of job tasks packed into one group.
+
+    Returns:
+        list: The coalesced stages.
+    """
+    coalesced = []
+    for stage in stages:
+        previous = coalesced[-1] if coalesced else None
+        if (
+            len(stage) == 1
+            and previous
+            and len(previous) == 1
+            and len(previous[0]) + len(stage[0]) <= max_tasks
+        ):
+            previous[0].extend(stage[0])
+        else:
+            coalesced.append([list(group) for group in stage])
+    return coalesced
+
+
+def job_task_groups(schedule: dict) -> list:
+    """Lay out the tasks of a scheduled job as the DAG generator does.
+
+    The layout follows the schedule's `MELTANO_DAG_TASK_LAYOUT`,
+    `MELTANO_DAG_COALESCE_TASKS` and `MELTANO_DAG_COALESCE_MAX` settings.
+
+    Args:
+        schedule: A Meltano scheduled job.
+
+    Returns:
+        list: Stages of groups of (task index, task) pairs, each group becoming one Airflow task.
+    """
+    layout = schedule_setting(schedule, "MELTANO_DAG_TASK_LAYOUT", "serial")
+    stages = [
+        [[item] for item in stage] for stage in task_stages(job_tasks(schedule), layout)
+    ]
+    coalesce = schedule_setting(schedule, "MELTANO_DAG_COALESCE_TASKS", "false")
+    if coalesce.lower() in ("true", "1", "yes"):
+        stages = coalesce_stages(
+            stages, int(schedule_setting(schedule, "MELTANO_DAG_COALESCE_MAX", "5"))
+        )
+    return stages
+
+
+def group_run_args(group: list) -> list:
+    """Return the `meltano run` arguments of a group of job tasks."""
+    return [block for _, task in group for block in task_blocks(task)]
+
+
+def pool_name(plugin: str) -> str:
+    """Return the Airflow pool name used for a Meltano plugin."""
+    return POOL_PREFIX + re.sub(r"[^A-Za-z0-9_.-]", "_", plugin)
+
+
+def project_plugin_types(project_root) -> dict:
+    """Map the names of the project's extractors and loaders to `extractor` or `loader`.
+
+    Plugins are read from meltano.yml and its included files. An empty mapping is
+    returned if those cannot be read.
+
+    Args:
+        project_root: The Meltano project root.
+
+    Returns:
+        dict: Plugin names to their type.
+    """
+    import yaml
+
+    project_root = Path(project_root)
+    try:
+        meltano_yml = _load_yaml(project_root / MELTANO_YML)
+        configs = [meltano_yml]
+        configs.extend(
+            _load_yaml(path) for path in _include_paths(project_root, meltano_yml)
+        )
+    except (OSError, yaml.YAMLError) as err:
+        logger.warning(f"Unable to read the plugins of the Meltano project: {err}")
+        return {}
+
+    plugin_types = {}
+    for config in configs:
+        plugins = config.get("plugins") or {}
+        for section, plugin_type in (
+            ("extractors", "extractor"),
+            ("loaders", "loader"),
+        ):
+            for plugin in plugins.get(section) or []:
+                plugin_types[plugin["name"]] = plugin_type
+    return plugin_types
+
+
+def _plugin_type(plugin: str, plugin_types: dict = None):
+    if plugin_types and plugin in plugin_types:
+        return plugin_types[plugin]
+    # Plugins unknown to the project, fall back on the Singer naming convention.
+    if plugin.startswith(("tap-", "tap_")):
+        return "extractor"
+    if plugin.startswith(("target-", "target_")):
+        return "loader"
+    return None
+
+
+def task_pool_plugin(blocks: list, pool_by: str, plugin_types: dict = None):
+    """Return the plugin whose pool a job task, or a group of them run together, runs in.
+
+    That is the first extractor or loader among the blocks, skipping mappers and plugin
+    commands such as `dbt:run`. Tasks without one are not pooled.
+
+    Args:
+        blocks: The blocks of the task, e.g. `["tap-foo", "map-bar", "target-baz"]`.
+        pool_by: `extractor` or `loader`.
+        plugin_types: The project's plugin types, see `project_plugin_types`. Plugins
+            it does not list are typed by their `tap-`/`target-` name prefix.
+
+    Returns:
+        The plugin name, or None if the task should not be pooled.
+    """
+    if pool_by not in ("extractor", "loader"):
+        return None
+    return next(
+        (
+            block
+            for block in blocks
+            if ":" not in block and _plugin_type(block, plugin_types) == pool_by
+        ),
+        None,
+    )
+
+
+def schedule_pool_plugins(
+    schedule_export, pool_by: str, plugin_types: dict = None
+) -> list:
+    """Return every plugin a pool is needed for, given a schedule export.
+
+    Job tasks are grouped the way the DAG generator groups them, see `job_task_groups`,
+    so that every pool a generated task uses is listed.
+
+    Args:
+        schedule_export: The schedule export, in either the v1 or v2 format.
+        pool_by: `extractor` or `loader`; anything else disables pools.
+        plugin_types: The project's plugin types, see `project_plugin_types`.
+
+    Returns:
+        Sorted plugin names.
+    """
+    if pool_by not in ("extractor", "loader"):
+        return []
+
+    if isinstance(schedule_export, dict) and schedule_export.get("schedules"):
+        elt_schedules = schedule_export["schedules"].get("elt") or []
+        job_schedules = schedule_export["schedules"].get("job") or []
+    else:
+        elt_schedules, job_schedules = schedule_export or [], []
+
+    plugins = {schedule.get(pool_by) for schedule in elt_schedules}
+    for schedule in job_schedules:
+        for stage in job_task_groups(schedule):
+            for group in stage:
+                plugins.add(
+                    task_pool_plugin(group_run_args(group), pool_by, plugin_types)
+                )
+    return sorted(plugin for plugin in plugins if plugin)
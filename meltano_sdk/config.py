@@ -1,22 +1,164 @@
 from __future__ import annotations
 
 import os
-from copy import deepcopy
+from collections.abc import Mapping
+from pathlib import Path
+from types import MappingProxyType
+
+TRUE_VALUES = ("true", "1", "yes", "on")
+FALSE_VALUES = ("false", "0", "no", "off", "")
+
+_NOT_SET = object()
+
+
+class ConfigSnapshot(Mapping):
+    """Immutable view of an extension's settings at one point in time.
+
+    Keys are upper case, without the extension's prefix. Keys of the form
+    `SECTION__KEY` are also grouped by section, following airflow's
+    `AIRFLOW__CORE__PARALLELISM` convention, so `section("CORE")["PARALLELISM"]`
+    works. Lookups are dict lookups and never touch the environment.
+    """
+
+    __slots__ = ("_values", "_sections")
+
+    def __init__(self, values: dict[str, str]):
+        sections = {}
+        for key, value in values.items():
+            section, sep, option = key.partition("__")
+            if sep and option:
+                sections.setdefault(section, {})[option] = value
+        object.__setattr__(self, "_values", MappingProxyType(dict(values)))
+        object.__setattr__(
+            self,
+            "_sections",
+            {name: MappingProxyType(options) for name, options in sections.items()},
+        )
+
+    def __setattr__(self, name, value):
+        raise AttributeError(
+            "ConfigSnapshot is immutable, use ExtensionConfig.reload()"
+        )
+
+    def __getitem__(self, key: str) -> str:
+        return self._values[key.upper()]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and key.upper() in self._values
+
+    def __repr__(self) -> str:
+        return f"ConfigSnapshot({dict(self._values)!r})"
+
+    def get(self, key: str, default=None):
+        return self._values.get(key.upper(), default)
+
+    def section(self, name: str) -> Mapping[str, str]:
+        """Return the `<name>__<key>` settings as a read-only mapping of key to value."""
+        return self._sections.get(name.upper(), MappingProxyType({}))
+
+    def get_bool(self, key: str, default: bool = False) -> bool:
+        value = self.get(key)
+        if value is None:
+            return default
+        if value.lower() in TRUE_VALUES:
+            return True
+        if value.lower() in FALSE_VALUES:
+            return False
+        raise ValueError(f"setting {key} must be a boolean, got {value!r}")
+
+    def get_int(self, key: str, default=_NOT_SET):
+        return self._coerce(key, int, "an integer", default)
+
+    def get_float(self, key: str, default=_NOT_SET):
+        return self._coerce(key, float, "a number", default)
+
+    def _coerce(self, key, convert, description, default):
+        value = self.get(key)
+        if value is None or value == "":
+            return None if default is _NOT_SET else default
+        try:
+            return convert(value)
+        except ValueError:
+            raise ValueError(
+                f"setting {key} must be {description}, got {value!r}"
+            ) from None
+
+
+def _flatten(values: dict, prefix: str = "") -> dict[str, str]:
+    flat = {}
+    for key, value in values.items():
+        flat_key = f"{prefix}{str(key).upper().replace('-', '_')}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{flat_key}__"))
+        elif isinstance(value, bool):
+            flat[flat_key] = str(value).lower()
+        elif value is not None:
+            flat[flat_key] = str(value)
+    return flat
 
 
 class ExtensionConfig:
-    def __init__(self, extension_name: str, env_prefix: str | None = None):
-        self.env_prefix = env_prefix.upper() or extension_name.upper()
+    """Settings of an extension, from a YAML file overlaid with prefixed environment variables.
+
+    `load()` builds a ConfigSnapshot once and keeps returning it. Call `reload()` to
+    pick up changes, or `changed()` to check for them first.
+    """
+
+    def __init__(
+        self,
+        extension_name: str,
+        env_prefix: str | None = None,
+        config_file: str | Path | None = None,
+    ):
+        """Create the config.
+
+        Args:
+            extension_name: The extension's name, `<NAME>_` is the default prefix.
+            env_prefix: Prefix of the environment variables holding settings.
+            config_file: Optional YAML file of settings, nested mappings become
+                `SECTION__KEY` settings. Environment variables take precedence.
+        """
+        self.env_prefix = (env_prefix or f"{extension_name}_").upper()
+        self.config_file = Path(config_file) if config_file else None
+        self._snapshot = None
+        self._sources = None
 
     def cleaned_config_key(self, key: str) -> str:
         if key.startswith(self.env_prefix):
-            return key[len(self.env_prefix) :]
+            # Airflow's own AIRFLOW__SECTION__KEY variables keep their SECTION__KEY form.
+            return key[len(self.env_prefix) :].lstrip("_")
         return None
 
-    def load(self):
+    def _read_sources(self) -> dict[str, str]:
         config = {}
+        if self.config_file and self.config_file.exists():
+            import yaml
+
+            config.update(_flatten(yaml.safe_load(self.config_file.read_text()) or {}))
         for key, value in os.environ.items():
             cleaned_key = self.cleaned_config_key(key)
             if cleaned_key:
-                config[cleaned_key] = value
+                config[cleaned_key.upper()] = value
         return config
+
+    def load(self) -> ConfigSnapshot:
+        """Return the settings snapshot, building it on first use."""
+        if self._snapshot is None:
+            self.reload()
+        return self._snapshot
+
+    def reload(self) -> ConfigSnapshot:
+        """Read the sources again and return a fresh snapshot."""
+        self._sources = self._read_sources()
+        self._snapshot = ConfigSnapshot(self._sources)
+        return self._snapshot
+
+    def changed(self) -> bool:
+        """Return True if the sources differ from the last loaded snapshot."""
+        return self._sources is None or self._read_sources() != self._sources
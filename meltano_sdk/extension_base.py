@@ -1,10 +1,10 @@
-import json
 from abc import ABCMeta, abstractmethod
+from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Optional
+from functools import cached_property
+from typing import List
 
-import yaml
-from pydantic import BaseModel
+from meltano_sdk.manifest import build_manifest, format_manifest
 
 
 class DescribeFormat(str, Enum):
@@ -13,8 +13,9 @@ class DescribeFormat(str, Enum):
     yaml = "yaml"
 
 
-class Description(BaseModel):
-    commands: List[str] = [":splat"]
+@dataclass
+class Description:
+    commands: List[str] = field(default_factory=lambda: [":splat"])
 
 
 class ExtensionBase(metaclass=ABCMeta):
@@ -52,20 +53,25 @@ class ExtensionBase(metaclass=ABCMeta):
     ) -> str:
         """Return a formatted description of the extensions commands and capabilities.
 
+        The description is built once per extension instance and format.
+
         Args:
             output_format: The output format to use.
 
         Returns:
             str: The formatted description.
         """
-
-        meltano_config = {}
-        for x in self.describe().commands:
-            meltano_config[x] = f"invoke {x}"
-
-        if output_format == DescribeFormat.text:
-            return f"commands: {self.describe().commands}"
-        elif output_format == DescribeFormat.json:
-            return json.dumps({"commands": meltano_config}, indent=2)
-        elif output_format == DescribeFormat.yaml:
-            return yaml.dump({"commands": meltano_config})
+        formatted = self._formatted_descriptions
+        if output_format not in formatted:
+            formatted[output_format] = format_manifest(self._manifest, output_format)
+        return formatted[output_format]
+
+    @cached_property
+    def _manifest(self) -> dict:
+        """The manifest of the extension's description."""
+        return build_manifest(self.describe().commands)
+
+    @cached_property
+    def _formatted_descriptions(self) -> dict:
+        """The formatted descriptions built so far, by format."""
+        return {}
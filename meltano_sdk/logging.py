@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import logging
+import queue
 import sys
+import threading
+import time
 
 import structlog
 
@@ -14,6 +17,19 @@ LEVELS = {  # noqa: WPS407
 }
 DEFAULT_LEVEL = "info"
 
+# Whether the last default_logging_config call set up JSON rendering.
+_json_format = False
+
+# What QueueWriterHandler does with a line when its queue is full.
+OVERFLOW_POLICIES = ("block", "drop_oldest", "count")
+DEFAULT_QUEUE_SIZE = 10000
+_STOP = object()
+
+# The logger that lines read from subprocesses are logged to, see RateLimiter.
+SUBPROCESS_LOGGER = "meltano_sdk.subprocess"
+# The RateLimiter set up by the last default_logging_config call, if any.
+_rate_limiter = None
+
 
 def parse_log_level(log_level: dict[str, int]) -> int:
     """Parse a level descriptor into an logging level.
@@ -25,21 +41,286 @@ def parse_log_level(log_level: dict[str, int]) -> int:
     return LEVELS.get(log_level.lower(), LEVELS[DEFAULT_LEVEL])
 
 
+def json_output_enabled() -> bool:
+    """Return True if logs are rendered as JSON by `default_logging_config`."""
+    return _json_format
+
+
+class Lazy:
+    """A log value that is only computed if the event is actually logged.
+
+    Example:
+        log.debug("env dump", env=Lazy(dict, os.environ))
+    """
+
+    __slots__ = ("func", "args")
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __call__(self):
+        return self.func(*self.args)
+
+
+def resolve_lazy_values(logger, method_name, event_dict):
+    """structlog processor computing the Lazy values of an event."""
+    for key, value in event_dict.items():
+        if isinstance(value, Lazy):
+            event_dict[key] = value()
+    return event_dict
+
+
+class RateLimiter:
+    """structlog processor limiting the events of chatty loggers with a token bucket.
+
+    Each limited logger gets `burst` tokens, refilled at `rate` per second, and an
+    event is dropped when its logger has no token left. The next event that gets
+    through carries the number of events dropped before it in `suppressed`. Events
+    dropped at the end of a stream are reported by `report_suppressed`.
+    """
+
+    def __init__(self, rate: float, burst: int | None = None, logger_names=None):
+        """Create the limiter.
+
+        Args:
+            rate: Events per second let through in the long run.
+            burst: Events let through at once after a quiet period, `rate` if None.
+            logger_names: The stdlib logger names to limit, all loggers if None.
+        """
+        self.rate = rate
+        self.burst = max(burst or rate, 1)
+        self.logger_names = frozenset(logger_names) if logger_names else None
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, name: str | None) -> int | None:
+        """Take a token for an event of the logger `name`.
+
+        Returns:
+            None if the event is to be dropped, else the number of events dropped before it.
+        """
+        if self.logger_names is not None and name not in self.logger_names:
+            return 0
+
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, suppressed = self._buckets.get(name, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[name] = (tokens, now, suppressed + 1)
+                return None
+            self._buckets[name] = (tokens - 1, now, 0)
+        return suppressed
+
+    def flush(self, name: str | None) -> int:
+        """Return the number of events of `name` dropped since the last one let through, and reset it."""
+        with self._lock:
+            if name not in self._buckets:
+                return 0
+            tokens, last, suppressed = self._buckets[name]
+            self._buckets[name] = (tokens, last, 0)
+        return suppressed
+
+    def __call__(self, logger, method_name, event_dict):
+        # Reports of dropped events are let through regardless of the tokens left.
+        if event_dict.pop("_unlimited", False):
+            return event_dict
+        suppressed = self.acquire(getattr(logger, "name", None))
+        if suppressed is None:
+            raise structlog.DropEvent
+        if suppressed:
+            event_dict["suppressed"] = suppressed
+        return event_dict
+
+
+def rate_limit(name: str) -> int | None:
+    """Apply the configured RateLimiter to an event logged without structlog.
+
+    Returns:
+        None if the event is to be dropped, else the number of events dropped before it.
+    """
+    if _rate_limiter is None:
+        return 0
+    return _rate_limiter.acquire(name)
+
+
+def report_suppressed(logger, name: str = SUBPROCESS_LOGGER) -> None:
+    """Log the number of events of `name` the rate limit dropped after the last one it let through.
+
+    Call this when a stream of events ends, otherwise the events dropped at its
+    end are never accounted for.
+    """
+    if _rate_limiter is None:
+        return
+    suppressed = _rate_limiter.flush(name)
+    if suppressed:
+        logger.warning(
+            "output suppressed by the log rate limit",
+            suppressed=suppressed,
+            _unlimited=True,
+        )
+
+
+class QueueWriterHandler(logging.Handler):
+    """Logging handler that leaves writing to a background thread.
+
+    Records are formatted on the calling thread and put on a bounded queue. A
+    writer thread drains the queue in batches, so a slow log consumer no longer
+    blocks the code that logs, up to the queue size. What happens once the queue
+    is full depends on the overflow policy:
+
+    - block: wait for the writer, as a plain StreamHandler would.
+    - drop_oldest: make room by discarding the oldest queued line.
+    - count: discard the new line.
+
+    Dropped lines are counted and reported by the writer. The queue is drained
+    when the handler is closed, which `logging.shutdown` does on exit.
+    """
+
+    def __init__(
+        self,
+        stream=None,
+        max_queue: int = DEFAULT_QUEUE_SIZE,
+        overflow: str = "block",
+        batch_size: int = 256,
+    ):
+        """Start the handler's writer thread.
+
+        Args:
+            stream: The stream to write to, sys.stderr at write time if None.
+            max_queue: The number of lines the queue holds.
+            overflow: One of OVERFLOW_POLICIES.
+            batch_size: The maximum number of lines per write.
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}"
+            )
+        super().__init__()
+        self.stream = stream
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._reported_dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._writer = threading.Thread(
+            target=self._write_loop, name="log-writer", daemon=True
+        )
+        self._writer.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._put(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+    def _put(self, line) -> None:
+        if self.overflow == "block":
+            self._queue.put(line)
+            return
+        while True:
+            try:
+                self._queue.put_nowait(line)
+                return
+            except queue.Full:
+                self.dropped += 1
+                if self.overflow == "count":
+                    return
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+            except queue.Empty:
+                pass
+
+    def _write_loop(self) -> None:
+        stopped = False
+        while not stopped:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = [line for line in batch if line is not _STOP]
+            stopped = len(lines) < len(batch)
+            self._write(lines)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, lines: list[str]) -> None:
+        dropped = self.dropped
+        if dropped > self._reported_dropped:
+            lines.append(
+                f"{dropped - self._reported_dropped} log lines dropped, the log writer could not keep up"
+            )
+            self._reported_dropped = dropped
+        if not lines:
+            return
+        stream = self.stream or sys.stderr
+        try:
+            stream.write("\n".join(lines) + "\n")
+            stream.flush()
+        except Exception:
+            # Like StreamHandler, never let a broken stream take the process down.
+            pass
+
+    def flush(self) -> None:
+        """Wait until every queued line is written."""
+        if self._writer.is_alive():
+            self._queue.join()
+
+    def close(self) -> None:
+        """Write out the queue and stop the writer thread."""
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        self._write([])
+        super().close()
+
+
 def default_logging_config(
     level=logging.INFO,
     timestamps: bool = False,
     levels: bool = False,
     json_format: bool = False,
+    async_writer: bool = False,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    overflow: str = "block",
+    rate_limit: float | None = None,
 ):
     """default/demo structlog configuration.
 
+    Events below `level` are dropped by the bound logger itself, before any
+    processor runs, so disabled log calls cost little more than a function call.
+    Wrap expensive values in Lazy to only compute them for events that are logged.
+
     Args:
         level: logging level.
         timestamps: include timestamps in the log.
         levels: include levels in the log.
         json_format: if True, use JSON format, otherwise use human-readable format.
+        async_writer: write logs from a background thread, see QueueWriterHandler.
+        queue_size: the number of lines the background writer queues.
+        overflow: what the background writer does when its queue is full, one of OVERFLOW_POLICIES.
+        rate_limit: the maximum lines per second logged from subprocesses, see RateLimiter.
     """
-    processors = []
+    global _json_format, _rate_limiter
+    _json_format = json_format
+    _rate_limiter = (
+        RateLimiter(rate_limit, logger_names=[SUBPROCESS_LOGGER])
+        if rate_limit
+        else None
+    )
+
+    processors = [
+        # If log level is too low, abort pipeline and throw away log entry. This
+        # catches stdlib loggers whose level was raised after configuration.
+        structlog.stdlib.filter_by_level,
+    ]
+    if _rate_limiter:
+        processors.append(_rate_limiter)
+    # Only spend time on events that are going to be logged.
     if timestamps:
         processors.append(structlog.processors.TimeStamper(fmt="iso"))
     if levels:
@@ -47,8 +328,7 @@ def default_logging_config(
 
     processors.extend(
         [
-            # If log level is too low, abort pipeline and throw away log entry.
-            structlog.stdlib.filter_by_level,
+            resolve_lazy_values,
             # If the "stack_info" key in the event dict is true, remove it and
             # render the current stack trace in the "stack" key.
             structlog.processors.StackInfoRenderer(),
@@ -69,8 +349,8 @@ def default_logging_config(
     structlog.configure(
         processors=processors,
         # `wrapper_class` is the bound logger that you get back from
-        # get_logger(). This one imitates the API of `logging.Logger`.
-        wrapper_class=structlog.stdlib.BoundLogger,
+        # get_logger(). This one has no-op methods for levels below `level`.
+        wrapper_class=structlog.make_filtering_bound_logger(level),
         # `logger_factory` is used to create wrapped loggers that are used for
         # OUTPUT. This one returns a `logging.Logger`. The final value (a JSON
         # string) from the final processor (`JSONRenderer`) will be passed to
@@ -81,6 +361,12 @@ def default_logging_config(
         cache_logger_on_first_use=True,
     )
 
+    if async_writer:
+        handler = QueueWriterHandler(max_queue=queue_size, overflow=overflow)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logging.basicConfig(handlers=[handler], level=level)
+        return
+
     logging.basicConfig(
         format="%(message)s",
         stream=sys.stderr,
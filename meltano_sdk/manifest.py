@@ -0,0 +1,79 @@
+"""Static describe manifests, so hosts can learn an extension's commands without running it.
+
+A manifest is the JSON form of `describe --format json`, checked in as
+`describe.json` next to the extension's modules and shipped with its package.
+Regenerate it whenever `describe()` changes:
+
+    python -m meltano_sdk.manifest airflow_extension.airflow_ext:Airflow airflow_extension
+"""
+
+from __future__ import annotations
+
+import importlib
+import importlib.resources
+import json
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+MANIFEST_FILE_NAME = "describe.json"
+
+
+def build_manifest(commands: list[str]) -> dict:
+    """Build the manifest of an extension providing the given commands."""
+    return {"commands": {command: f"invoke {command}" for command in commands}}
+
+
+def format_manifest(manifest: dict, output_format: str = "text") -> str:
+    """Render a manifest the way `describe --format <output_format>` prints it.
+
+    Args:
+        manifest: The manifest to render.
+        output_format: One of the DescribeFormat values.
+
+    Returns:
+        str: The formatted description.
+    """
+    if output_format == "json":
+        return json.dumps(manifest, indent=2)
+    if output_format == "yaml":
+        import yaml
+
+        return yaml.dump(manifest)
+    return f"commands: {list(manifest['commands'])}"
+
+
+@lru_cache(maxsize=None)
+def read_manifest(package: str) -> dict | None:
+    """Read the manifest shipped with an extension package, without importing the extension.
+
+    Args:
+        package: The extension's package name, e.g. `airflow_extension`.
+
+    Returns:
+        The manifest, or None if the package ships none.
+    """
+    try:
+        return json.loads(importlib.resources.read_text(package, MANIFEST_FILE_NAME))
+    except (FileNotFoundError, ModuleNotFoundError):
+        return None
+
+
+def write_manifest(extension, package_dir: Path) -> Path:
+    """Write the manifest of an extension instance into its package directory.
+
+    Returns:
+        The path of the written manifest.
+    """
+    path = Path(package_dir) / MANIFEST_FILE_NAME
+    manifest = build_manifest(extension.describe().commands)
+    path.write_text(json.dumps(manifest, indent=2) + "\n")
+    return path
+
+
+if __name__ == "__main__":
+    extension_path, package = sys.argv[1:3]
+    module_name, class_name = extension_path.split(":")
+    extension_class = getattr(importlib.import_module(module_name), class_name)
+    package_dir = Path(importlib.import_module(package).__file__).parent
+    print(write_manifest(extension_class(), package_dir))
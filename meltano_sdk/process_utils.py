@@ -3,12 +3,45 @@
 from __future__ import annotations
 
 import asyncio
+import atexit
+import codecs
+import json
+import logging
+import os
+import signal
 import subprocess
-from asyncio.subprocess import PIPE
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 
 import structlog
 
+from meltano_sdk.logging import (
+    SUBPROCESS_LOGGER,
+    json_output_enabled,
+    rate_limit,
+    report_suppressed,
+)
+from meltano_sdk.profiling import span
+
 log = structlog.get_logger()
+# Lines read from subprocesses go to their own logger, so they can be rate limited.
+subprocess_log = structlog.get_logger(SUBPROCESS_LOGGER)
+
+# Child output is read in chunks of this size and split into lines by us, rather than
+# with StreamReader.readline(), which raises on lines over the stream limit (64 KiB).
+STREAM_CHUNK_SIZE = 64 * 1024
+# Lines longer than this are logged in pieces of at most this many characters.
+MAX_LINE_LENGTH = 1024 * 1024
+# Seconds a child gets to exit after SIGTERM, before it is sent SIGKILL.
+DEFAULT_KILL_GRACE_PERIOD = 10.0
+# Signals received while children run are forwarded to them and their descendants.
+# A Ctrl-C at a terminal reaches children, which share the extension's process group,
+# directly as well, so they may see SIGINT twice.
+FORWARDED_SIGNALS = (signal.SIGTERM, signal.SIGINT)
 
 
 def log_subprocess_error(
@@ -16,7 +49,7 @@ def log_subprocess_error(
 ):
     """Log a subprocess error, replaying stderr to the logger in the process"""
     if err.stderr:
-        for line in err.stderr.split("\n"):
+        for line in err.stderr.splitlines():
             log.warning(line, cmd=cmd, stdio_stream="stderr")
     log.error(
         f"error invoking {cmd}",
@@ -25,6 +58,423 @@ def log_subprocess_error(
     )
 
 
+@dataclass
+class ResourceUsage:
+    """Resources used by a single child process, as reported by wait4()."""
+
+    wall_time: float
+    user_time: float
+    sys_time: float
+    max_rss_bytes: int
+
+
+# Usage of every subprocess run so far, keyed by command, for `enable_usage_summary`.
+_usage_totals: dict[str, list] = {}
+_usage_lock = threading.Lock()
+
+
+def _record_usage(args: list[str], returncode: int, usage: ResourceUsage) -> None:
+    cmd = " ".join(args[:2])
+    log.debug(
+        "subprocess resource usage",
+        cmd=cmd,
+        returncode=returncode,
+        wall_time=round(usage.wall_time, 3),
+        user_time=round(usage.user_time, 3),
+        sys_time=round(usage.sys_time, 3),
+        max_rss_bytes=usage.max_rss_bytes,
+    )
+    with _usage_lock:
+        totals = _usage_totals.setdefault(cmd, [0, 0.0, 0.0, 0.0, 0])
+        totals[0] += 1
+        totals[1] += usage.wall_time
+        totals[2] += usage.user_time
+        totals[3] += usage.sys_time
+        totals[4] = max(totals[4], usage.max_rss_bytes)
+
+
+def _log_usage_summary() -> None:
+    with _usage_lock:
+        for cmd, (
+            calls,
+            wall_time,
+            user_time,
+            sys_time,
+            max_rss,
+        ) in _usage_totals.items():
+            log.info(
+                "subprocess usage summary",
+                cmd=cmd,
+                calls=calls,
+                wall_time=round(wall_time, 3),
+                user_time=round(user_time, 3),
+                sys_time=round(sys_time, 3),
+                max_rss_bytes=max_rss,
+            )
+
+
+def enable_usage_summary() -> None:
+    """Log the aggregated resource usage of all subprocesses, per command, when the process exits."""
+    atexit.unregister(_log_usage_summary)
+    atexit.register(_log_usage_summary)
+
+
+# Whether invokers created without json_passthrough re-emit JSON lines, see `enable_json_passthrough`.
+_json_passthrough_default = False
+
+
+def enable_json_passthrough() -> None:
+    """Re-emit JSON log lines of subprocesses as structured events, unless an invoker opts out."""
+    global _json_passthrough_default
+    _json_passthrough_default = True
+
+
+def json_passthrough_enabled() -> bool:
+    """Return True if `enable_json_passthrough` was called."""
+    return _json_passthrough_default
+
+
+def _wait4(process: subprocess.Popen, started: float) -> ResourceUsage:
+    """Reap a child with os.wait4, setting its returncode, and return its resource usage."""
+    _, status, rusage = os.wait4(process.pid, 0)
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS.
+    max_rss = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+    return ResourceUsage(
+        wall_time=time.monotonic() - started,
+        user_time=rusage.ru_utime,
+        sys_time=rusage.ru_stime,
+        max_rss_bytes=max_rss,
+    )
+
+
+def _reap_in_thread(process: subprocess.Popen, started: float):
+    """Reap a child with _wait4 in a thread of its own, returning a future for its ResourceUsage.
+
+    Each child gets a dedicated thread rather than one of the event loop's default
+    executor, which only has a few threads. Those would each stay blocked for the
+    lifetime of a child, holding back the reaping of every child started after them.
+    """
+    loop = asyncio.get_running_loop()
+    reaped = loop.create_future()
+
+    def _resolve(usage, error):
+        if reaped.done():
+            return
+        if error is not None:
+            reaped.set_exception(error)
+        else:
+            reaped.set_result(usage)
+
+    def _reap():
+        usage = error = None
+        try:
+            usage = _wait4(process, started)
+        except Exception as err:
+            error = err
+        try:
+            loop.call_soon_threadsafe(_resolve, usage, error)
+        except RuntimeError:
+            # The loop is closed, nobody is waiting for the result anymore.
+            pass
+
+    threading.Thread(target=_reap, name=f"reap-{process.pid}", daemon=True).start()
+    return reaped
+
+
+# Children currently running, and the signal handlers forwarding to them replaced.
+_children: set[int] = set()
+_previous_handlers: dict = {}
+_children_lock = threading.Lock()
+
+
+def _process_tree(pid: int) -> list[int]:
+    """Return pid and all of its descendants, parents first.
+
+    Descendants are found through /proc, elsewhere only pid itself is returned.
+    """
+    children = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return [pid]
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat:
+                # The command name may contain spaces, fields are counted after it.
+                ppid = int(stat.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree = [pid]
+    for parent in tree:
+        tree.extend(children.get(parent, ()))
+    return tree
+
+
+def _signal_tree(pid: int, signum: int) -> None:
+    """Send a signal to a child and everything it started."""
+    for member in _process_tree(pid):
+        try:
+            os.kill(member, signum)
+        except ProcessLookupError:
+            pass
+
+
+def _forward_signal(signum, frame) -> None:
+    for pid in list(_children):
+        _signal_tree(pid, signum)
+
+
+@contextmanager
+def _forwarding_signals(process: subprocess.Popen):
+    """Forward FORWARDED_SIGNALS to a child and its descendants while it runs.
+
+    Children stay in the extension's process group, so that killing the group,
+    e.g. with `kill -9 -<pgid>`, never leaves them behind. Signals sent to the
+    extension's pid alone are forwarded. Handlers can only be installed from the
+    main thread, children started from other threads are not forwarded to.
+    """
+    in_main_thread = threading.current_thread() is threading.main_thread()
+    with _children_lock:
+        if in_main_thread and not _previous_handlers:
+            for signum in FORWARDED_SIGNALS:
+                _previous_handlers[signum] = signal.signal(signum, _forward_signal)
+        _children.add(process.pid)
+    try:
+        yield
+    finally:
+        with _children_lock:
+            _children.discard(process.pid)
+            if in_main_thread and not _children:
+                for signum, handler in _previous_handlers.items():
+                    signal.signal(signum, handler)
+                _previous_handlers.clear()
+
+
+class TailBuffer:
+    """Byte-bounded ring buffer keeping the tail of a stream.
+
+    Chunks are stored as read, so there is no allocation per line, and old chunks
+    are dropped once they fall entirely outside of the last `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int):
+        """Create the buffer.
+
+        Args:
+            max_bytes: The number of trailing bytes to keep. 0 disables the buffer.
+        """
+        self.max_bytes = max_bytes
+        self._chunks: deque[bytes] = deque()
+        self._size = 0
+
+    def append(self, chunk: bytes) -> None:
+        """Add a chunk, dropping chunks no longer needed for the tail."""
+        if self.max_bytes <= 0:
+            return
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        while self._size - len(self._chunks[0]) >= self.max_bytes:
+            self._size -= len(self._chunks.popleft())
+
+    def getvalue(self) -> str:
+        """Return the last `max_bytes` bytes written, decoded as UTF-8.
+
+        When older output was dropped, the partial line at the start is left out.
+        """
+        data = b"".join(self._chunks)
+        if len(data) > self.max_bytes:
+            data = data[-self.max_bytes :]
+            data = data[data.find(b"\n") + 1 :]
+        return data.decode("utf-8", errors="replace")
+
+
+@dataclass
+class InvocationResult:
+    """Outcome of a subprocess run by `Invoker.run_and_log` or `Invoker.run_many`."""
+
+    args: list[str]
+    returncode: int | None
+    stdout_tail: str | None = None
+    stderr_tail: str | None = None
+    usage: ResourceUsage | None = field(default=None, repr=False)
+    timeout: float | None = None
+
+    def check_returncode(self) -> None:
+        """Raise a CalledProcessError or TimeoutExpired, carrying the output tails, if the subprocess failed."""
+        if self.returncode is None:
+            raise subprocess.TimeoutExpired(
+                self.args,
+                self.timeout,
+                output=self.stdout_tail,
+                stderr=self.stderr_tail,
+            )
+        if self.returncode:
+            raise subprocess.CalledProcessError(
+                self.returncode,
+                cmd=self.args[0],
+                output=self.stdout_tail,
+                stderr=self.stderr_tail,
+            )
+
+
+async def _stream_reader(pipe) -> tuple[asyncio.StreamReader, asyncio.ReadTransport]:
+    """Wrap the read end of a pipe in an asyncio StreamReader, taking ownership of it."""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(loop=loop)
+    transport, _ = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader, loop=loop), pipe
+    )
+    return reader, transport
+
+
+def _log_json_line(logger, line: str, raw: bool) -> bool:
+    """Log a JSON line emitted by a child as a native structured event.
+
+    The event's fields are kept as fields, and its `level` (or `levelname`) as the
+    log level. When logs are rendered as JSON anyway and `raw` is set, the line is
+    handed to the stdlib logger as is, saving a decode/encode round trip.
+
+    Returns:
+        False if the line is not a JSON object and still needs logging.
+    """
+    try:
+        fields = json.loads(line)
+    except ValueError:
+        return False
+    if not isinstance(fields, dict):
+        return False
+
+    level = str(
+        fields.pop("level", None) or fields.pop("levelname", None) or "info"
+    ).lower()
+    if level not in ("debug", "info", "warning", "error", "critical"):
+        level = "warning" if level == "warn" else "info"
+    if raw and json_output_enabled():
+        stdlib_logger = logging.getLogger(SUBPROCESS_LOGGER)
+        levelno = logging.getLevelName(level.upper())
+        if not stdlib_logger.isEnabledFor(levelno):
+            return True
+        # The line skips the structlog processors, so it is rate limited here.
+        suppressed = rate_limit(SUBPROCESS_LOGGER)
+        if suppressed is None:
+            return True
+        if suppressed:
+            line = json.dumps({**json.loads(line), "suppressed": suppressed})
+        stdlib_logger.log(levelno, line)
+        return True
+
+    event = (
+        fields.pop("event", None)
+        or fields.pop("message", None)
+        or fields.pop("msg", "")
+    )
+    getattr(logger, level)(event, **fields)
+    return True
+
+
+def _log_line(logger, line: str, json_passthrough: bool, raw_json: bool) -> None:
+    """Log a line read from a child, in pieces of at most MAX_LINE_LENGTH characters."""
+    line = line.rstrip()
+    if len(line) > MAX_LINE_LENGTH:
+        for start in range(0, len(line), MAX_LINE_LENGTH):
+            logger.info(line[start : start + MAX_LINE_LENGTH])
+        return
+    if not (
+        json_passthrough
+        and line.startswith("{")
+        and _log_json_line(logger, line, raw_json)
+    ):
+        logger.info(line)
+
+
+class LineLogger:
+    """Logs a child's output, fed in chunks of bytes, one line per event.
+
+    Chunks are decoded incrementally and split into lines here, and all complete
+    lines of a chunk are logged when it is fed. A line longer than MAX_LINE_LENGTH
+    is split, so memory use stays bounded whatever the child writes.
+    """
+
+    def __init__(
+        self,
+        logger=subprocess_log,
+        tail: TailBuffer | None = None,
+        json_passthrough: bool = False,
+        raw_json: bool = False,
+    ):
+        """Create the line logger.
+
+        Args:
+            logger: The logger to log lines to.
+            tail: Buffer to also keep the end of the raw output in.
+            json_passthrough: Log lines holding a JSON object as structured events, see `_log_json_line`.
+            raw_json: Allow JSON lines to skip structlog when its output is JSON already.
+        """
+        self.logger = logger
+        self.tail = tail
+        self.json_passthrough = json_passthrough
+        self.raw_json = raw_json
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending = ""
+
+    def feed(self, chunk: bytes) -> None:
+        """Log the lines a chunk of output completes."""
+        if self.tail:
+            self.tail.append(chunk)
+        lines = (self._pending + self._decoder.decode(chunk)).split("\n")
+        pending = lines.pop()
+        while len(pending) > MAX_LINE_LENGTH:
+            lines.append(pending[:MAX_LINE_LENGTH])
+            pending = pending[MAX_LINE_LENGTH:]
+        self._pending = pending
+        for line in lines:
+            _log_line(self.logger, line, self.json_passthrough, self.raw_json)
+
+    def close(self) -> None:
+        """Log an unterminated last line, then report the lines the log rate limit dropped."""
+        pending = self._pending + self._decoder.decode(b"", final=True)
+        self._pending = ""
+        if pending.rstrip():
+            _log_line(self.logger, pending, self.json_passthrough, self.raw_json)
+        report_suppressed(self.logger)
+
+
+async def _log_stream(
+    reader: asyncio.StreamReader,
+    tail: TailBuffer | None = None,
+    logger=subprocess_log,
+    json_passthrough: bool = False,
+    raw_json: bool = False,
+) -> None:
+    """Log every line read from a stream until it reaches EOF, see LineLogger.
+
+    Output is read in large chunks, so the pipe keeps draining whatever the child
+    writes. At EOF, the lines the log rate limit dropped since the last one it let
+    through are reported.
+
+    Args:
+        reader: The stream to read from.
+        tail: Buffer to also keep the end of the raw output in.
+        logger: The logger to log lines to.
+        json_passthrough: Log lines holding a JSON object as structured events, see `_log_json_line`.
+        raw_json: Allow JSON lines to skip structlog when its output is JSON already.
+    """
+    line_logger = LineLogger(logger, tail, json_passthrough, raw_json)
+    while True:
+        chunk = await reader.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            break
+        line_logger.feed(chunk)
+    line_logger.close()
+
+
 class Invoker:
     def __init__(
         self,
@@ -32,6 +482,11 @@ class Invoker:
         universal_newlines: bool = True,
         cwd: str = None,
         env: dict[str, any] | None = None,
+        stderr_tail_bytes: int = 64 * 1024,
+        stdout_tail_bytes: int = 0,
+        timeout: float | None = None,
+        kill_grace_period: float = DEFAULT_KILL_GRACE_PERIOD,
+        json_passthrough: bool | None = None,
     ):
         """Minimal invoker for running subprocesses.
 
@@ -40,14 +495,35 @@ class Invoker:
             universal_newlines: Whether to use universal newlines.
             cwd: The working directory to run from.
             env: Env to use when calling Popen.
+            stderr_tail_bytes: How much of the end of stderr run_and_log keeps to attach to errors.
+            stdout_tail_bytes: How much of the end of stdout run_and_log keeps to attach to errors.
+            timeout: Default number of seconds a subprocess may run, None to wait forever.
+            kill_grace_period: Seconds between SIGTERM and SIGKILL when a subprocess is stopped.
+            json_passthrough: Re-emit JSON log lines of subprocesses as structured events with their
+                own fields and level, rather than as the message of a new event. None follows
+                `enable_json_passthrough`.
+
+        Subprocesses stay in the caller's process group. When one times out or is cancelled,
+        it and all of its descendants get SIGTERM, followed by SIGKILL after the grace period.
+        SIGTERM and SIGINT received while subprocesses run are forwarded to them and their
+        descendants, and the invocation then ends with the subprocess' exit status.
         """
         self.bin = bin
         self.universal_newlines = universal_newlines
         self.cwd = cwd
         self.popen_env = env
+        self.stderr_tail_bytes = stderr_tail_bytes
+        self.stdout_tail_bytes = stdout_tail_bytes
+        self.timeout = timeout
+        self.kill_grace_period = kill_grace_period
+        self.json_passthrough = json_passthrough
 
     def run(
-        self, *args, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        self,
+        *args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        timeout: float | None = None,
     ) -> subprocess.CompletedProcess:
         """Run a subprocess. Simple wrapper around subprocess.run.
 
@@ -58,24 +534,83 @@ class Invoker:
             *args: The arguments to pass to the subprocess.
             stdout: The stdout stream to use. If you do not want to capture stdout, use subprocess.DEVNULL.
             stderr: The stderr stream to use. If you do not want to capture stderr, use subprocess.DEVNULL.
+            timeout: Seconds the subprocess may run, overriding the invoker's default.
 
         Returns:
-            The completed process.
+            The completed process. Its `usage` attribute holds the ResourceUsage of the child.
 
         Raises:
             subprocess.CalledProcessError: If the subprocess failed.
+            subprocess.TimeoutExpired: If the subprocess timed out and was stopped.
         """
-
-        return subprocess.run(
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        with span("subprocess", args=[self.bin, *args[:1]]), subprocess.Popen(
             [self.bin, *args],
             cwd=self.cwd,
             universal_newlines=self.universal_newlines,
             stdout=stdout,
             stderr=stderr,
-            check=True,
+        ) as process, _forwarding_signals(process):
+            # Pipes are drained by threads, so the child can be reaped with wait4() here
+            # rather than by Popen.communicate(), which would discard its rusage.
+            outputs = {}
+            readers = [
+                threading.Thread(
+                    target=lambda name, pipe: outputs.__setitem__(name, pipe.read()),
+                    args=(name, pipe),
+                    daemon=True,
+                )
+                for name, pipe in (
+                    ("stdout", process.stdout),
+                    ("stderr", process.stderr),
+                )
+                if pipe
+            ]
+            for reader in readers:
+                reader.start()
+            reaped = {}
+            reaper = threading.Thread(
+                target=lambda: reaped.__setitem__("usage", _wait4(process, started)),
+                daemon=True,
+            )
+            reaper.start()
+            reaper.join(timeout)
+            timed_out = reaper.is_alive()
+            if timed_out:
+                log.warning(
+                    "subprocess timed out, terminating it",
+                    cmd=process.args,
+                    timeout=timeout,
+                )
+                _signal_tree(process.pid, signal.SIGTERM)
+                reaper.join(self.kill_grace_period)
+                if reaper.is_alive():
+                    _signal_tree(process.pid, signal.SIGKILL)
+                    reaper.join()
+            for reader in readers:
+                # Descendants that outlived the child may still hold the pipes open.
+                reader.join(self.kill_grace_period if timed_out else None)
+
+        usage = reaped["usage"]
+        _record_usage([self.bin, *args], process.returncode, usage)
+        if timed_out:
+            raise subprocess.TimeoutExpired(
+                process.args, timeout, outputs.get("stdout"), outputs.get("stderr")
+            )
+        completed = subprocess.CompletedProcess(
+            process.args,
+            process.returncode,
+            outputs.get("stdout"),
+            outputs.get("stderr"),
         )
+        completed.usage = usage
+        completed.check_returncode()
+        return completed
 
-    def run_and_log(self, sub_command: str | None = None, *args) -> None:
+    def run_and_log(
+        self, sub_command: str | None = None, *args, timeout: float | None = None
+    ) -> InvocationResult:
         """Run a subprocess and stream the output to the logger.
 
         Note that output from stdout and stderr is logged by default. Best used when you want to run a command and
@@ -84,37 +619,193 @@ class Invoker:
         Args:
             sub_command: The subcommand to run.
             *args: The arguments to pass to the subprocess.
+            timeout: Seconds the subprocess may run, overriding the invoker's default.
+
+        Returns:
+            The result of the invocation.
 
         Raises:
-            subprocess.CalledProcessError: If the subprocess failed.
+            subprocess.CalledProcessError: If the subprocess failed. Its `stderr` (and `output`, if
+                stdout_tail_bytes is set) holds the tail of the streamed output, for log_subprocess_error to replay.
+            subprocess.TimeoutExpired: If the subprocess timed out and was stopped.
         """
+        popen_args = []
+        if sub_command:
+            popen_args.append(sub_command)
+        if args:
+            popen_args.extend(*args)
 
-        async def _log_stdio(reader: asyncio.streams.StreamReader):
-            while True:
-                if reader.at_eof():
-                    break
-                data = await reader.readline()
-                log.info(data.decode("utf-8").rstrip())
-                await asyncio.sleep(0)
-
-        async def _exec() -> asyncio.subprocess.Process:
-            popen_args = []
-            if sub_command:
-                popen_args.append(sub_command)
-            if args:
-                popen_args.extend(*args)
-
-            p = await asyncio.create_subprocess_exec(
-                self.bin, *popen_args, stdout=PIPE, stderr=PIPE, env=self.popen_env
+        with span("subprocess", args=[self.bin, *popen_args[:1]]):
+            result = asyncio.run(
+                self._run_and_log_async(
+                    popen_args, subprocess_log, timeout, raw_json=True
+                )
             )
-            asyncio.create_task(_log_stdio(p.stderr))
-            asyncio.create_task(_log_stdio(p.stdout))
+        result.check_returncode()
+        return result
 
-            await p.wait()
-            return p
+    def run_many(
+        self,
+        commands: list[list[str]],
+        max_concurrency: int | None = None,
+        fail_fast: bool = True,
+        timeout: float | None = None,
+    ) -> list[InvocationResult]:
+        """Run several subprocesses concurrently, see `run_many_async`."""
+        return asyncio.run(
+            self.run_many_async(commands, max_concurrency, fail_fast, timeout)
+        )
 
-        result = asyncio.run(_exec())
-        if result.returncode:
-            raise subprocess.CalledProcessError(
-                result.returncode, cmd=self.bin, stderr=None
-            )
+    async def run_many_async(
+        self,
+        commands: list[list[str]],
+        max_concurrency: int | None = None,
+        fail_fast: bool = True,
+        timeout: float | None = None,
+    ) -> list[InvocationResult]:
+        """Run several subprocesses concurrently, streaming their output to the logger.
+
+        Every output line is tagged with a `cmd` field naming the command it came from.
+
+        Args:
+            commands: The arguments of every subprocess to run.
+            max_concurrency: How many subprocesses may run at once. Defaults to all of them.
+            fail_fast: Stop all other subprocesses and raise as soon as one fails. Otherwise wait
+                for all of them and report failures in the returned results.
+            timeout: Seconds each subprocess may run, overriding the invoker's default.
+
+        Returns:
+            The result of every invocation, in the order of `commands`.
+
+        Raises:
+            subprocess.CalledProcessError: If fail_fast is set and a subprocess failed.
+            subprocess.TimeoutExpired: If fail_fast is set and a subprocess timed out.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or max(len(commands), 1))
+
+        async def _run(args: list[str]) -> InvocationResult:
+            async with semaphore:
+                cmd_log = subprocess_log.bind(cmd=" ".join([self.bin, *args]))
+                return await self._run_and_log_async(list(args), cmd_log, timeout)
+
+        tasks = [asyncio.ensure_future(_run(args)) for args in commands]
+        if not fail_fast:
+            results = []
+            for result in await asyncio.gather(*tasks, return_exceptions=True):
+                if isinstance(result, subprocess.TimeoutExpired):
+                    # Timed out commands are reported with no return code.
+                    result = InvocationResult(
+                        args=result.cmd,
+                        returncode=None,
+                        stdout_tail=result.output,
+                        stderr_tail=result.stderr,
+                        timeout=result.timeout,
+                    )
+                elif isinstance(result, BaseException):
+                    raise result
+                results.append(result)
+            return results
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                (await next_done).check_returncode()
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return [task.result() for task in tasks]
+
+    async def _run_and_log_async(
+        self,
+        popen_args: list[str],
+        logger,
+        timeout: float | None = None,
+        raw_json: bool = False,
+    ) -> InvocationResult:
+        timeout = self.timeout if timeout is None else timeout
+        stderr_tail = TailBuffer(self.stderr_tail_bytes)
+        stdout_tail = TailBuffer(self.stdout_tail_bytes)
+
+        # The child is started with Popen and reaped with wait4() in a thread of its own,
+        # instead of asyncio.create_subprocess_exec, so that its rusage can be collected.
+        started = time.monotonic()
+        p = subprocess.Popen(
+            [self.bin, *popen_args],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.cwd,
+            env=self.popen_env,
+        )
+        json_passthrough = self.json_passthrough
+        if json_passthrough is None:
+            json_passthrough = json_passthrough_enabled()
+        with _forwarding_signals(p):
+            reaped = _reap_in_thread(p, started)
+            stderr_reader, stderr_transport = await _stream_reader(p.stderr)
+            stdout_reader, stdout_transport = await _stream_reader(p.stdout)
+            try:
+                # Drain both streams to EOF before returning, so no trailing output is lost.
+                _, _, usage = await asyncio.wait_for(
+                    asyncio.gather(
+                        _log_stream(
+                            stderr_reader,
+                            stderr_tail,
+                            logger,
+                            json_passthrough,
+                            raw_json,
+                        ),
+                        _log_stream(
+                            stdout_reader,
+                            stdout_tail,
+                            logger,
+                            json_passthrough,
+                            raw_json,
+                        ),
+                        asyncio.shield(reaped),
+                    ),
+                    timeout,
+                )
+            except (asyncio.TimeoutError, asyncio.CancelledError) as err:
+                if isinstance(err, asyncio.TimeoutError):
+                    log.warning(
+                        "subprocess timed out, terminating it",
+                        cmd=p.args,
+                        timeout=timeout,
+                    )
+                usage = await self._terminate(p, reaped)
+                _record_usage(p.args, p.returncode, usage)
+                if isinstance(err, asyncio.TimeoutError):
+                    raise subprocess.TimeoutExpired(
+                        p.args,
+                        timeout,
+                        output=stdout_tail.getvalue() or None,
+                        stderr=stderr_tail.getvalue() or None,
+                    ) from None
+                raise
+            finally:
+                stderr_transport.close()
+                stdout_transport.close()
+
+        _record_usage(p.args, p.returncode, usage)
+        return InvocationResult(
+            args=p.args,
+            returncode=p.returncode,
+            stdout_tail=stdout_tail.getvalue() or None,
+            stderr_tail=stderr_tail.getvalue() or None,
+            usage=usage,
+        )
+
+    async def _terminate(
+        self, process: subprocess.Popen, reaped: asyncio.Future
+    ) -> ResourceUsage:
+        """Stop a child and its descendants, escalating from SIGTERM to SIGKILL, and wait for it to be reaped."""
+        if not reaped.done():
+            _signal_tree(process.pid, signal.SIGTERM)
+            try:
+                return await asyncio.wait_for(
+                    asyncio.shield(reaped), self.kill_grace_period
+                )
+            except asyncio.TimeoutError:
+                _signal_tree(process.pid, signal.SIGKILL)
+        return await reaped
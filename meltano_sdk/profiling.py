@@ -0,0 +1,170 @@
+"""Opt-in profiling of extension invocations.
+
+Enabled with `--profile` / `EXTENSION_PROFILE` on the extension CLIs, taking a comma
+separated list of modes:
+
+- spans: time the extension's phases (`initialize`, `pre_invoke`, `invoke`, ...), written
+  as a JSON timeline.
+- cprofile: a cProfile of the whole invocation, written in pstats format.
+- memory: a tracemalloc snapshot taken on exit, loadable with `tracemalloc.Snapshot.load`.
+
+Files are written on exit to `EXTENSION_PROFILE_DIR` (default: the working directory),
+named `<extension>-<pid>.<kind>`.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+import structlog
+import typer
+
+log = structlog.get_logger()
+
+PROFILE_ENV = "EXTENSION_PROFILE"
+PROFILE_DIR_ENV = "EXTENSION_PROFILE_DIR"
+PROFILE_MODES = ("spans", "cprofile", "memory")
+
+_state = {}
+_no_span = nullcontext()
+
+
+def _process_age() -> float | None:
+    """Seconds since this process started, from /proc where available."""
+    try:
+        with open("/proc/self/stat") as stat:
+            # The command name may contain spaces, fields are counted after it.
+            start_ticks = int(stat.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as uptime:
+            uptime_seconds = float(uptime.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return max(0.0, uptime_seconds - start_ticks / os.sysconf("SC_CLK_TCK"))
+
+
+def parse_modes(profile: str | None) -> list[str]:
+    """Parse a `--profile` value, `all` enabling every mode."""
+    if not profile:
+        return []
+    modes = [mode.strip().lower() for mode in profile.split(",") if mode.strip()]
+    if "all" in modes:
+        return list(PROFILE_MODES)
+    unknown = set(modes) - set(PROFILE_MODES)
+    if unknown:
+        raise ValueError(
+            f"unknown profile modes {sorted(unknown)}, expected some of {PROFILE_MODES}"
+        )
+    return modes
+
+
+def enable_profiling(
+    profile: str | None, name: str, output_dir: str | None = None
+) -> None:
+    """Start profiling this invocation, see the module docstring.
+
+    Args:
+        profile: Comma separated profile modes, nothing is enabled if empty.
+        name: The extension name, used in file names.
+        output_dir: Where profiles are written, PROFILE_DIR_ENV or the working directory if None.
+
+    Raises:
+        typer.BadParameter: If profile names an unknown mode.
+    """
+    try:
+        modes = parse_modes(profile)
+    except ValueError as err:
+        raise typer.BadParameter(str(err), param_hint="'--profile'")
+    if not modes or _state:
+        return
+
+    _state.update(
+        name=name,
+        modes=modes,
+        output_dir=output_dir or os.environ.get(PROFILE_DIR_ENV) or os.getcwd(),
+        started=time.perf_counter(),
+        spans=[],
+    )
+    age = _process_age()
+    if age is not None and "spans" in modes:
+        # Interpreter start and imports, up to the point profiling was enabled.
+        age = round(age, 6)
+        _state["spans"].append({"name": "startup", "start": -age, "duration": age})
+    if "memory" in modes:
+        import tracemalloc
+
+        tracemalloc.start()
+    if "cprofile" in modes:
+        import cProfile
+
+        _state["profiler"] = cProfile.Profile()
+        _state["profiler"].enable()
+    atexit.register(_write_profiles)
+
+
+@contextmanager
+def _timed_span(name: str, attrs: dict):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        _state["spans"].append(
+            {
+                "name": name,
+                "start": round(start - _state["started"], 6),
+                "duration": round(end - start, 6),
+                **({"attrs": attrs} if attrs else {}),
+            }
+        )
+
+
+def span(name: str, **attrs):
+    """Context manager timing a phase of the invocation, a no-op unless span profiling is on."""
+    if "spans" not in _state.get("modes", ()):
+        return _no_span
+    return _timed_span(name, attrs)
+
+
+def _write_profiles() -> None:
+    try:
+        written = _dump_profiles(
+            os.path.join(_state["output_dir"], f"{_state['name']}-{os.getpid()}")
+        )
+    except OSError as err:
+        log.warning(
+            "unable to write profiles", output_dir=_state["output_dir"], error=str(err)
+        )
+        return
+    log.info("wrote profiles", files=written)
+
+
+def _dump_profiles(base: str) -> list[str]:
+    written = []
+    if "profiler" in _state:
+        _state["profiler"].disable()
+        _state["profiler"].dump_stats(f"{base}.pstats")
+        written.append(f"{base}.pstats")
+    if "memory" in _state["modes"]:
+        import tracemalloc
+
+        tracemalloc.take_snapshot().dump(f"{base}.tracemalloc")
+        tracemalloc.stop()
+        written.append(f"{base}.tracemalloc")
+    if "spans" in _state["modes"]:
+        with open(f"{base}.spans.json", "w") as spans_file:
+            json.dump(
+                {
+                    "name": _state["name"],
+                    "pid": os.getpid(),
+                    "total": round(time.perf_counter() - _state["started"], 6),
+                    "spans": _state["spans"],
+                },
+                spans_file,
+                indent=2,
+            )
+        written.append(f"{base}.spans.json")
+    return written
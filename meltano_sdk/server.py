@@ -0,0 +1,274 @@
+"""Long-lived extension server on a local unix socket.
+
+`serve` runs an extension's commands on behalf of thin clients, so the work an
+invoke does before its command runs (imports, config, `pre_invoke`) is paid once
+per server rather than once per invoke. `forward` is the client side.
+
+The protocol is one JSON request line, `{"argv": [...], "env": {...}, "cwd": "..."}`
+with the client's environment and working directory, answered by frames of a one
+byte type and a four byte big-endian length: `o` and `e` frames carry stdout and
+stderr output, and a final `x` frame carries the exit code as ASCII. A server that
+cannot run the command as the client would answers with a single `r` frame giving
+the reason instead, and the client runs the command itself.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import selectors
+import socket
+import socketserver
+import struct
+import subprocess
+import threading
+import time
+
+import structlog
+
+from meltano_sdk.process_utils import (
+    Invoker,
+    LineLogger,
+    json_passthrough_enabled,
+    subprocess_log,
+)
+
+log = structlog.get_logger()
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_IDLE_TIMEOUT = 600.0
+READ_CHUNK_SIZE = 64 * 1024
+_FRAME_HEADER = struct.Struct(">cI")
+
+
+class RequestRefused(Exception):
+    """Raised by a `serve` command runner, before any output, to have the client run the command."""
+
+
+def invoker_command(invoker: Invoker):
+    """Return a `serve` command runner running argv with an invoker's binary, in the client's env and cwd."""
+
+    def run_command(
+        argv: list[str], env: dict, cwd: str, out_fd: int, err_fd: int
+    ) -> int:
+        return subprocess.Popen(
+            [invoker.bin, *argv],
+            cwd=cwd,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=out_fd,
+            stderr=err_fd,
+        ).wait()
+
+    return run_command
+
+
+def _send_frame(conn: socket.socket, frame_type: bytes, payload: bytes) -> None:
+    conn.sendall(_FRAME_HEADER.pack(frame_type, len(payload)) + payload)
+
+
+def _recv_exactly(conn: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("extension server closed the connection")
+        data += chunk
+    return data
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, run_command, max_concurrency, idle_timeout):
+        super().__init__(socket_path, _Handler)
+        self.run_command = run_command
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.idle_timeout = idle_timeout
+        self.active = 0
+        self.last_activity = time.monotonic()
+        self.lock = threading.Lock()
+
+    def track(self, delta: int) -> None:
+        with self.lock:
+            self.active += delta
+            self.last_activity = time.monotonic()
+
+    def idle_for(self) -> float:
+        with self.lock:
+            return 0.0 if self.active else time.monotonic() - self.last_activity
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        server.track(1)
+        try:
+            request = self.rfile.readline()
+            if not request:
+                # A connection probe, see forward_available.
+                return
+            request = json.loads(request)
+            with server.slots:
+                log.debug("serving command", argv=request["argv"])
+                result = self._run(request["argv"], request["env"], request["cwd"])
+            if "refused" in result:
+                log.debug(
+                    "refused command", argv=request["argv"], reason=result["refused"]
+                )
+                _send_frame(self.connection, b"r", result["refused"].encode())
+            else:
+                _send_frame(self.connection, b"x", str(result["returncode"]).encode())
+        except (ConnectionError, BrokenPipeError):
+            log.debug("client went away")
+        finally:
+            server.track(-1)
+
+    def _run(self, argv: list[str], env: dict, cwd: str) -> dict:
+        out_read_fd, out_write_fd = os.pipe()
+        err_read_fd, err_write_fd = os.pipe()
+        result = {}
+
+        def _target():
+            try:
+                result["returncode"] = self.server.run_command(
+                    argv, env, cwd, out_write_fd, err_write_fd
+                )
+            except RequestRefused as err:
+                result["refused"] = str(err)
+            except Exception:
+                log.exception("served command failed", argv=argv)
+                result["returncode"] = 1
+            finally:
+                os.close(out_write_fd)
+                os.close(err_write_fd)
+
+        runner = threading.Thread(target=_target, daemon=True)
+        runner.start()
+        # Both pipes are drained as output arrives, so neither can fill up and stall the command.
+        with selectors.DefaultSelector() as selector:
+            selector.register(out_read_fd, selectors.EVENT_READ, b"o")
+            selector.register(err_read_fd, selectors.EVENT_READ, b"e")
+            while selector.get_map():
+                for key, _ in selector.select():
+                    chunk = os.read(key.fd, READ_CHUNK_SIZE)
+                    if chunk:
+                        _send_frame(self.connection, key.data, chunk)
+                    else:
+                        selector.unregister(key.fd)
+                        os.close(key.fd)
+        runner.join()
+        return result
+
+
+def serve(
+    socket_path: str,
+    run_command,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+) -> None:
+    """Serve commands on a unix socket until idle for `idle_timeout` seconds.
+
+    Args:
+        socket_path: The socket to listen on. A stale socket file is replaced.
+        run_command: Called as `run_command(argv, env, cwd, out_fd, err_fd)` per request,
+            with the client's environment and working directory. It runs the command with
+            its stdout and stderr going to `out_fd` and `err_fd` and returns the exit code,
+            or raises RequestRefused before writing any output to have the client run it.
+        max_concurrency: How many commands may run at once, later requests wait.
+        idle_timeout: Seconds without requests after which the server stops, 0 for never.
+    """
+    if os.path.exists(socket_path):
+        if forward_available(socket_path):
+            raise RuntimeError(
+                f"an extension server is already listening on {socket_path}"
+            )
+        os.unlink(socket_path)
+
+    # Created owner-only, rather than chmod-ed after, when others could already connect.
+    umask = os.umask(0o177)
+    try:
+        server = _Server(socket_path, run_command, max_concurrency, idle_timeout)
+    finally:
+        os.umask(umask)
+    server_stopped = threading.Event()
+
+    def _watch_idle():
+        while not server_stopped.wait(min(idle_timeout, 5.0)):
+            if server.idle_for() >= idle_timeout:
+                log.info(
+                    "extension server idle, shutting down", idle_timeout=idle_timeout
+                )
+                server.shutdown()
+                return
+
+    if idle_timeout:
+        threading.Thread(target=_watch_idle, daemon=True).start()
+
+    log.info("extension server listening", socket_path=socket_path)
+    try:
+        server.serve_forever()
+    finally:
+        server_stopped.set()
+        server.server_close()
+        os.unlink(socket_path)
+
+
+def forward_available(socket_path: str) -> bool:
+    """Return True if an extension server accepts connections on socket_path."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(socket_path)
+    except OSError:
+        return False
+    return True
+
+
+def forward(socket_path: str, argv: list[str], logger=subprocess_log) -> int | None:
+    """Run a command on an extension server, logging its output as it arrives.
+
+    The command runs in this process' environment and working directory. Its stdout
+    and stderr are logged line by line, as `Invoker.run_and_log` does for a command
+    run directly.
+
+    Args:
+        socket_path: The server's socket.
+        argv: The command to run.
+        logger: The logger to log output lines to.
+
+    Returns:
+        The command's exit code, or None if no server is listening or it refused the command.
+
+    Raises:
+        ConnectionError: If the server went away while running the command.
+    """
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            conn.connect(socket_path)
+        except OSError:
+            return None
+        request = {"argv": list(argv), "env": dict(os.environ), "cwd": os.getcwd()}
+        conn.sendall(json.dumps(request).encode() + b"\n")
+        json_passthrough = json_passthrough_enabled()
+        line_loggers = {
+            b"o": LineLogger(logger, json_passthrough=json_passthrough, raw_json=True),
+            b"e": LineLogger(logger, json_passthrough=json_passthrough, raw_json=True),
+        }
+        while True:
+            frame_type, size = _FRAME_HEADER.unpack(
+                _recv_exactly(conn, _FRAME_HEADER.size)
+            )
+            payload = _recv_exactly(conn, size)
+            if frame_type == b"r":
+                log.debug(
+                    "extension server refused the command", reason=payload.decode()
+                )
+                return None
+            if frame_type == b"x":
+                for line_logger in line_loggers.values():
+                    line_logger.close()
+                return int(payload)
+            line_loggers[frame_type].feed(payload)
+    finally:
+        conn.close()
@@ -0,0 +1,184 @@
+import importlib.resources
+import os
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from airflow_extension.airflow_ext import DAG_GENERATOR_FILES, Airflow
+from meltano_sdk.config import ConfigSnapshot
+from meltano_sdk.process_utils import Invoker
+from meltano_sdk.server import RequestRefused
+
+
+@pytest.fixture
+def airflow_ext(tmp_path):
+    ext = Airflow()
+    ext.airflow_core_dags_path = tmp_path / "dags"
+    return ext
+
+
+def test_deploy_dag_generator_replaces_stale_files(airflow_ext):
+    dags = airflow_ext.airflow_core_dags_path
+    dags.mkdir()
+    (dags / "meltano_operators.py").write_text("# an older version\n")
+    (dags / "my_dag.py").write_text("# a user's own DAG\n")
+
+    airflow_ext._deploy_dag_generator()
+
+    for source_name, target_name in DAG_GENERATOR_FILES.items():
+        assert (dags / target_name).read_text() == importlib.resources.read_text(
+            "files_airflow_ext.orchestrate", source_name
+        )
+    assert (dags / "my_dag.py").read_text() == "# a user's own DAG\n"
+    assert sorted(p.name for p in dags.iterdir()) == sorted(
+        [*DAG_GENERATOR_FILES.values(), "my_dag.py"]
+    )
+
+
+def test_deploy_dag_generator_leaves_current_files_alone(airflow_ext):
+    airflow_ext._deploy_dag_generator()
+    generator = airflow_ext.airflow_core_dags_path / "meltano_dag_generator.py"
+    os.utime(generator, ns=(0, 0))
+
+    airflow_ext._deploy_dag_generator()
+
+    assert generator.stat().st_mtime_ns == 0
+
+
+def test_sync_pools_without_pool_by_skips_schedules(airflow_ext, monkeypatch):
+    monkeypatch.delenv("MELTANO_DAG_POOL_BY", raising=False)
+    monkeypatch.setattr(airflow_ext, "_schedule_export", pytest.fail)
+
+    assert airflow_ext._sync_pools() is None
+
+
+def test_schedule_export_without_meltano_exits(airflow_ext, tmp_path, monkeypatch):
+    (tmp_path / "meltano.yml").write_text("schedules: []\n")
+    monkeypatch.setenv("MELTANO_PROJECT_ROOT", str(tmp_path))
+    monkeypatch.setenv("PATH", str(tmp_path / "bin"))
+    monkeypatch.delenv("MELTANO_SCHEDULE_SOURCE", raising=False)
+
+    with pytest.raises(SystemExit) as exit_info:
+        airflow_ext._schedule_export()
+    assert exit_info.value.code == 1
+
+
+def test_schedule_export_is_reloaded_when_the_project_changes(
+    airflow_ext, tmp_path, monkeypatch
+):
+    import files_airflow_ext.orchestrate.meltano_schedules as meltano_schedules
+
+    loads = []
+    monkeypatch.setattr(
+        meltano_schedules,
+        "load_schedules",
+        lambda project_root, meltano_bin: loads.append(project_root) or len(loads),
+    )
+    monkeypatch.setenv("MELTANO_PROJECT_ROOT", str(tmp_path))
+    (tmp_path / "meltano.yml").write_text("schedules: []\n")
+
+    assert airflow_ext._schedule_export() == 1
+    assert airflow_ext._schedule_export() == 1
+    (tmp_path / "meltano.yml").write_text("schedules: []\nproject_id: changed\n")
+    assert airflow_ext._schedule_export() == 2
+
+
+def _create_db(path, revision="e07f49787c9d"):
+    with closing(sqlite3.connect(path)) as db:
+        db.execute("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)")
+        db.execute("INSERT INTO alembic_version VALUES (?)", (revision,))
+        db.commit()
+
+
+@pytest.fixture
+def prepared_ext(airflow_ext, tmp_path, monkeypatch):
+    """An Airflow extension whose steps besides the db init are stubbed out."""
+    for var in (
+        "AIRFLOW__DATABASE__SQL_ALCHEMY_CONN",
+        "AIRFLOW__CORE__SQL_ALCHEMY_CONN",
+    ):
+        monkeypatch.delenv(var, raising=False)
+    airflow_ext._env_loaded = True
+    airflow_ext.airflow_home = str(tmp_path)
+    airflow_ext.airflow_cfg_path = tmp_path / "airflow.cfg"
+    airflow_ext.airflow_cfg_path.write_text("[core]\n")
+    airflow_ext.env_config = ConfigSnapshot({})
+    airflow_ext.initdb_calls = 0
+
+    def _initdb():
+        airflow_ext.initdb_calls += 1
+        _create_db(tmp_path / "airflow.db")
+
+    monkeypatch.setattr(airflow_ext, "_initdb", _initdb)
+    monkeypatch.setattr(airflow_ext, "_db_state", lambda: {"airflow_version": "2.7.3"})
+    monkeypatch.setattr(airflow_ext, "_deploy_dags", lambda: None)
+    monkeypatch.setattr(airflow_ext, "_sync_pools", lambda synced_pools: None)
+    return airflow_ext
+
+
+def test_db_revision(prepared_ext, tmp_path):
+    assert prepared_ext._db_revision() is None
+    (tmp_path / "airflow.db").touch()
+    assert prepared_ext._db_revision() is None
+    (tmp_path / "airflow.db").unlink()
+    _create_db(tmp_path / "airflow.db", "405de8318b3a")
+    assert prepared_ext._db_revision() == "405de8318b3a"
+
+
+def test_db_revision_reads_connection_from_cfg(prepared_ext, tmp_path):
+    _create_db(tmp_path / "meta.db")
+    prepared_ext.airflow_cfg_path.write_text(
+        f"[database]\nsql_alchemy_conn = sqlite:///{tmp_path}/meta.db\n"
+    )
+
+    assert prepared_ext._db_revision() == "e07f49787c9d"
+
+
+def test_pre_invoke_initializes_a_removed_db(prepared_ext, tmp_path):
+    prepared_ext.pre_invoke()
+    prepared_ext.pre_invoke()
+    assert prepared_ext.initdb_calls == 1
+
+    (tmp_path / "airflow.db").unlink()
+    prepared_ext.pre_invoke()
+    assert prepared_ext.initdb_calls == 2
+
+
+def test_serve_repeats_pre_invoke_checks_per_request(
+    prepared_ext, tmp_path, monkeypatch
+):
+    import meltano_sdk.server
+
+    served = {}
+    monkeypatch.setattr(
+        meltano_sdk.server,
+        "serve",
+        lambda socket_path, run_command, **kwargs: served.update(
+            run_command=run_command
+        ),
+    )
+    prepared_ext.airflow_invoker = Invoker("true")
+    prepared_ext.serve(str(tmp_path / "ext.sock"), max_concurrency=1, idle_timeout=0)
+    assert prepared_ext.initdb_calls == 1
+
+    with open(os.devnull, "wb") as devnull:
+        fds = (devnull.fileno(), devnull.fileno())
+        env = dict(os.environ)
+        assert served["run_command"](["version"], env, os.getcwd(), *fds) == 0
+        assert prepared_ext.initdb_calls == 1
+
+        (tmp_path / "airflow.db").unlink()
+        assert served["run_command"](["version"], env, os.getcwd(), *fds) == 0
+        assert prepared_ext.initdb_calls == 2
+
+        with pytest.raises(RequestRefused):
+            served["run_command"](
+                ["version"],
+                {**env, "AIRFLOW_HOME": str(tmp_path / "other")},
+                os.getcwd(),
+                *fds,
+            )
+        with pytest.raises(RequestRefused):
+            served["run_command"](["version"], env, str(tmp_path), *fds)
+        assert prepared_ext.initdb_calls == 2
@@ -0,0 +1,174 @@
+import os
+
+import pytest
+
+from meltano_sdk.config import ConfigSnapshot, ExtensionConfig
+
+
+@pytest.fixture
+def clean_env(monkeypatch):
+    """Remove the environment variables the tests' extensions read."""
+    for prefix in ("MYEXT_", "CUSTOM_"):
+        for key in list(os.environ):
+            if key.startswith(prefix):
+                monkeypatch.delenv(key)
+    return monkeypatch
+
+
+def test_snapshot_is_immutable():
+    snapshot = ConfigSnapshot({"KEY": "value"})
+
+    with pytest.raises(AttributeError):
+        snapshot.extra = "value"
+    with pytest.raises(AttributeError):
+        snapshot._values = {}
+    with pytest.raises(TypeError):
+        snapshot["KEY"] = "other"
+    with pytest.raises(TypeError):
+        snapshot._values["KEY"] = "other"
+    assert snapshot["key"] == snapshot.get("Key") == "value"
+    assert "kEy" in snapshot
+    assert 1 not in snapshot
+
+
+def test_snapshot_does_not_follow_its_source():
+    values = {"KEY": "value"}
+    snapshot = ConfigSnapshot(values)
+
+    values["KEY"] = "changed"
+
+    assert snapshot["KEY"] == "value"
+
+
+@pytest.mark.parametrize("value", ["true", "TRUE", "1", "yes", "on"])
+def test_get_bool_true(value):
+    assert ConfigSnapshot({"FLAG": value}).get_bool("FLAG") is True
+
+
+@pytest.mark.parametrize("value", ["false", "False", "0", "no", "off", ""])
+def test_get_bool_false(value):
+    assert ConfigSnapshot({"FLAG": value}).get_bool("FLAG", default=True) is False
+
+
+def test_get_bool_default_and_error():
+    snapshot = ConfigSnapshot({"FLAG": "maybe"})
+
+    assert snapshot.get_bool("MISSING") is False
+    assert snapshot.get_bool("MISSING", default=True) is True
+    with pytest.raises(ValueError, match="setting FLAG must be a boolean, got 'maybe'"):
+        snapshot.get_bool("FLAG")
+
+
+def test_get_int_and_get_float():
+    snapshot = ConfigSnapshot(
+        {"COUNT": "3", "RATIO": "0.5", "EMPTY": "", "BAD": "three"}
+    )
+
+    assert snapshot.get_int("COUNT") == 3
+    assert snapshot.get_float("RATIO") == 0.5
+    assert snapshot.get_float("COUNT") == 3.0
+    assert snapshot.get_int("MISSING") is None
+    assert snapshot.get_int("EMPTY", 7) == 7
+    assert snapshot.get_float("MISSING", 1.5) == 1.5
+    with pytest.raises(ValueError, match="setting BAD must be an integer, got 'three'"):
+        snapshot.get_int("BAD")
+    with pytest.raises(ValueError, match="setting RATIO must be an integer"):
+        snapshot.get_int("RATIO")
+    with pytest.raises(ValueError, match="setting BAD must be a number, got 'three'"):
+        snapshot.get_float("BAD")
+
+
+def test_section():
+    snapshot = ConfigSnapshot(
+        {
+            "CORE__PARALLELISM": "32",
+            "CORE__DAGS_FOLDER": "dags",
+            "PLAIN": "1",
+            "ODD__": "x",
+        }
+    )
+
+    assert dict(snapshot.section("core")) == {
+        "PARALLELISM": "32",
+        "DAGS_FOLDER": "dags",
+    }
+    assert dict(snapshot.section("MISSING")) == {}
+    assert dict(snapshot.section("ODD")) == {}
+    with pytest.raises(TypeError):
+        snapshot.section("CORE")["PARALLELISM"] = "1"
+
+
+def test_load_returns_the_same_snapshot_until_reload(clean_env):
+    clean_env.setenv("MYEXT_SETTING", "one")
+    config = ExtensionConfig("myext")
+
+    snapshot = config.load()
+    assert not config.changed()
+    clean_env.setenv("MYEXT_SETTING", "two")
+
+    assert config.load() is snapshot
+    assert snapshot["SETTING"] == "one"
+    assert config.changed()
+    assert config.reload()["SETTING"] == "two"
+    assert config.load()["SETTING"] == "two"
+    assert not config.changed()
+
+
+def test_changed_before_load(clean_env):
+    assert ExtensionConfig("myext").changed()
+
+
+def test_env_prefix(clean_env):
+    clean_env.setenv("CUSTOM__CORE__PARALLELISM", "8")
+    clean_env.setenv("MYEXT_IGNORED", "1")
+
+    snapshot = ExtensionConfig("myext", "custom_").load()
+
+    assert dict(snapshot) == {"CORE__PARALLELISM": "8"}
+    assert snapshot.section("CORE")["PARALLELISM"] == "8"
+
+
+def test_env_prefix_none_defaults_to_extension_name(clean_env):
+    clean_env.setenv("MYEXT_SETTING", "value")
+
+    config = ExtensionConfig("myext", env_prefix=None)
+
+    assert config.env_prefix == "MYEXT_"
+    assert config.load()["SETTING"] == "value"
+
+
+def test_yaml_layer_under_environment(clean_env, tmp_path):
+    config_file = tmp_path / "myext.yml"
+    config_file.write_text(
+        "setting: from yaml\n"
+        "only-in-yaml: 1\n"
+        "enabled: true\n"
+        "unset:\n"
+        "core:\n"
+        "  parallelism: 4\n"
+        "  dags_folder: dags\n"
+    )
+    clean_env.setenv("MYEXT_SETTING", "from env")
+    clean_env.setenv("MYEXT_CORE__PARALLELISM", "16")
+
+    config = ExtensionConfig("myext", config_file=config_file)
+    snapshot = config.load()
+
+    assert dict(snapshot) == {
+        "SETTING": "from env",
+        "ONLY_IN_YAML": "1",
+        "ENABLED": "true",
+        "CORE__PARALLELISM": "16",
+        "CORE__DAGS_FOLDER": "dags",
+    }
+    assert snapshot.get_bool("ENABLED") is True
+
+    config_file.write_text("setting: from yaml\nonly-in-yaml: 2\n")
+    assert config.changed()
+    assert config.reload().get_int("ONLY_IN_YAML") == 2
+
+
+def test_missing_yaml_file_is_skipped(clean_env, tmp_path):
+    config = ExtensionConfig("myext", config_file=tmp_path / "missing.yml")
+
+    assert dict(config.load()) == {}
@@ -0,0 +1,80 @@
+import ast
+import copy
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from airflow_extension.airflow_ext import Airflow
+from airflow_extension.dag_files import STATIC_DAGS_DIR, materialize_dags
+
+PROJECT = Path(__file__).parent / "fixtures" / "meltano_project"
+DAG_FILES = [
+    "meltano_daily-gitlab-job_gitlab-to-postgres.py",
+    "meltano_gitlab-to-postgres.py",
+    "meltano_hourly-nested_nested-tasks.py",
+    "meltano_weekly-csv.py",
+]
+
+
+@pytest.fixture
+def schedule_export():
+    return json.loads((PROJECT / "schedule_list.json").read_text())
+
+
+def test_materialize_dags_writes_a_file_per_schedule(schedule_export, tmp_path):
+    changes = materialize_dags(schedule_export, tmp_path)
+
+    assert sorted(changes["written"]) == DAG_FILES
+    assert changes["unchanged"] == changes["removed"] == []
+    target_dir = tmp_path / STATIC_DAGS_DIR
+    assert sorted(p.name for p in target_dir.iterdir()) == DAG_FILES
+    source = (target_dir / "meltano_gitlab-to-postgres.py").read_text()
+    assert "from meltano_dag_generator import build_elt_dag" in source
+    schedule_literal = source.split("SCHEDULE = ", 1)[1].split("\n\ndag = ", 1)[0]
+    assert ast.literal_eval(schedule_literal) == schedule_export["schedules"]["elt"][0]
+
+
+def test_materialize_dags_skips_unchanged_files(schedule_export, tmp_path):
+    materialize_dags(schedule_export, tmp_path)
+    target_dir = tmp_path / STATIC_DAGS_DIR
+    for path in target_dir.iterdir():
+        os.utime(path, ns=(0, 0))
+
+    changed_export = copy.deepcopy(schedule_export)
+    changed_export["schedules"]["elt"][0]["interval"] = "0 7 * * *"
+    changes = materialize_dags(changed_export, tmp_path)
+
+    assert changes["written"] == ["meltano_gitlab-to-postgres.py"]
+    assert len(changes["unchanged"]) == 3
+    untouched = [p for p in target_dir.iterdir() if p.stat().st_mtime_ns == 0]
+    assert sorted(p.name for p in untouched) == sorted(changes["unchanged"])
+
+
+def test_materialize_dags_removes_deleted_schedules(schedule_export, tmp_path):
+    materialize_dags(schedule_export, tmp_path)
+
+    del schedule_export["schedules"]["job"][:]
+    changes = materialize_dags(schedule_export, tmp_path)
+
+    assert sorted(changes["removed"]) == [
+        "meltano_daily-gitlab-job_gitlab-to-postgres.py",
+        "meltano_hourly-nested_nested-tasks.py",
+    ]
+    assert sorted(p.name for p in (tmp_path / STATIC_DAGS_DIR).iterdir()) == [
+        "meltano_gitlab-to-postgres.py",
+        "meltano_weekly-csv.py",
+    ]
+
+
+def test_materialize_dags_clean(schedule_export, tmp_path):
+    ext = Airflow()
+    ext._env_loaded = True
+    ext.airflow_core_dags_path = tmp_path
+    materialize_dags(schedule_export, tmp_path)
+    (tmp_path / "my_dag.py").write_text("# a user's own DAG\n")
+
+    ext.materialize_dags(clean=True)
+
+    assert [p.name for p in tmp_path.iterdir()] == ["my_dag.py"]
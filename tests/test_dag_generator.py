@@ -0,0 +1,88 @@
+import importlib.util
+import json
+from pathlib import Path
+
+import pytest
+
+ORCHESTRATE = Path(__file__).parents[1] / "files_airflow_ext" / "orchestrate"
+PROJECT = Path(__file__).parent / "fixtures" / "meltano_project"
+
+
+def _load_generator(name):
+    """Run the DAG generator like the DAG file processor does."""
+    spec = importlib.util.spec_from_file_location(name, ORCHESTRATE / "meltano.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _parse_generator(name):
+    """Run the DAG generator, returning its DAGs by id."""
+    from airflow.models import DAG
+
+    module = _load_generator(name)
+    return {
+        value.dag_id: value for value in vars(module).values() if isinstance(value, DAG)
+    }
+
+
+@pytest.fixture
+def airflow_env(monkeypatch):
+    monkeypatch.setenv("MELTANO_PROJECT_ROOT", str(PROJECT))
+    monkeypatch.setenv("MELTANO_SCHEDULE_SOURCE", "yaml")
+    pytest.importorskip("airflow")
+
+
+def test_generated_dags_identical_across_parses(airflow_env):
+    from airflow.serialization.serialized_objects import SerializedDAG
+
+    first = _parse_generator("meltano_dag_generator_first")
+    second = _parse_generator("meltano_dag_generator_second")
+
+    assert first
+    assert sorted(first) == sorted(second)
+    for dag_id, dag in first.items():
+        serialized = json.dumps(SerializedDAG.to_dict(dag), sort_keys=True)
+        assert serialized == json.dumps(
+            SerializedDAG.to_dict(second[dag_id]), sort_keys=True
+        ), dag_id
+
+
+def test_parallel_layout_dependencies(airflow_env):
+    generator = _load_generator("meltano_dag_generator_parallel")
+    schedule = {
+        "name": "s",
+        "cron_interval": "0 * * * *",
+        "start_date": "2022-01-01",
+        "env": {"MELTANO_DAG_TASK_LAYOUT": "parallel"},
+        "job": {"name": "j", "tasks": ["tap-a target-x", "tap-b target-y", "dbt:run"]},
+    }
+
+    dag = generator.build_job_dag(schedule)
+
+    upstream = {
+        task.task_id.rsplit("_", 1)[1]: sorted(
+            t.rsplit("_", 1)[1] for t in task.upstream_task_ids
+        )
+        for task in dag.tasks
+    }
+    assert upstream == {"task0": [], "task1": [], "task2": ["task0", "task1"]}
+
+
+@pytest.mark.parametrize("pool_by, reads", [(None, 0), ("loader", 1)])
+def test_plugin_types_only_read_when_pooling(airflow_env, monkeypatch, pool_by, reads):
+    import meltano_schedules
+
+    calls = []
+    monkeypatch.setattr(
+        meltano_schedules,
+        "project_plugin_types",
+        lambda project_root: calls.append(project_root) or {},
+    )
+    if pool_by:
+        monkeypatch.setenv("MELTANO_DAG_POOL_BY", pool_by)
+    else:
+        monkeypatch.delenv("MELTANO_DAG_POOL_BY", raising=False)
+
+    assert _parse_generator(f"meltano_dag_generator_pool_by_{pool_by}")
+    assert len(calls) == reads
@@ -0,0 +1,261 @@
+import asyncio
+import json
+import logging
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+import structlog
+
+from meltano_sdk import logging as sdk_logging
+from meltano_sdk.logging import (
+    SUBPROCESS_LOGGER,
+    Lazy,
+    QueueWriterHandler,
+    RateLimiter,
+    default_logging_config,
+)
+from meltano_sdk.process_utils import _log_json_line, _log_stream
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    """A limiter letting 2 events through, and no more until the clock is moved."""
+    clock = SimpleNamespace(now=0.0)
+    monkeypatch.setattr(
+        sdk_logging, "time", SimpleNamespace(monotonic=lambda: clock.now)
+    )
+    limiter = RateLimiter(rate=1, burst=2, logger_names=[SUBPROCESS_LOGGER])
+    limiter.clock = clock
+    monkeypatch.setattr(sdk_logging, "_rate_limiter", limiter)
+    return limiter
+
+
+def test_lazy_values_only_computed_for_logged_events(caplog):
+    default_logging_config(level=logging.INFO)
+    caplog.set_level(logging.INFO)
+    calls = []
+
+    def expensive(name):
+        calls.append(name)
+        return name.upper()
+
+    log = structlog.get_logger("test_lazy")
+    log.debug("disabled", value=Lazy(expensive, "debug"))
+    logging.getLogger("test_lazy").setLevel(logging.WARNING)
+    log.info("filtered by the stdlib logger", value=Lazy(expensive, "info"))
+    log.warning("logged", value=Lazy(expensive, "warning"))
+
+    assert calls == ["warning"]
+    assert [record.getMessage().split() for record in caplog.records] == [
+        ["logged", "value=WARNING"]
+    ]
+
+
+def _collecting_logger(limiter, events):
+    def collect(logger, method_name, event_dict):
+        events.append(event_dict)
+        raise structlog.DropEvent
+
+    return structlog.wrap_logger(
+        logging.getLogger(SUBPROCESS_LOGGER), processors=[limiter, collect]
+    )
+
+
+def test_suppressed_count_reported_at_end_of_stream(limiter):
+    events = []
+
+    async def _log_lines():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"".join(b"line %d\n" % i for i in range(5)))
+        reader.feed_eof()
+        await _log_stream(reader, logger=_collecting_logger(limiter, events))
+
+    asyncio.run(_log_lines())
+
+    assert [e["event"] for e in events[:2]] == ["line 0", "line 1"]
+    assert events[2]["suppressed"] == 3
+    assert len(events) == 3
+    assert limiter.flush(SUBPROCESS_LOGGER) == 0
+
+
+def test_raw_json_lines_are_rate_limited(limiter, monkeypatch, caplog):
+    monkeypatch.setattr(sdk_logging, "_json_format", True)
+    caplog.set_level(logging.INFO, logger=SUBPROCESS_LOGGER)
+
+    for i in range(5):
+        assert _log_json_line(None, json.dumps({"event": f"line {i}"}), raw=True)
+    limiter.clock.now += 1
+    assert _log_json_line(None, json.dumps({"event": "line 5"}), raw=True)
+
+    lines = [json.loads(record.getMessage()) for record in caplog.records]
+    assert lines == [
+        {"event": "line 0"},
+        {"event": "line 1"},
+        {"event": "line 5", "suppressed": 3},
+    ]
+
+
+class RecordingLogger:
+    """Records (level, event, fields) of every call, in place of a structlog logger."""
+
+    def __init__(self):
+        self.events = []
+
+    def __getattr__(self, level):
+        return lambda event, **fields: self.events.append((level, event, fields))
+
+
+@pytest.mark.parametrize(
+    "fields, logged",
+    [
+        ({"event": "hi", "level": "warning"}, ("warning", "hi", {})),
+        ({"event": "hi", "level": "WARN"}, ("warning", "hi", {})),
+        ({"message": "hi", "levelname": "ERROR"}, ("error", "hi", {})),
+        ({"msg": "hi", "level": "debug", "n": 1}, ("debug", "hi", {"n": 1})),
+        ({"event": "hi", "level": "trace"}, ("info", "hi", {})),
+        ({"n": 1}, ("info", "", {"n": 1})),
+    ],
+)
+def test_json_lines_are_reemitted_as_structured_events(fields, logged):
+    logger = RecordingLogger()
+
+    assert _log_json_line(logger, json.dumps(fields), raw=False)
+    assert logger.events == [logged]
+
+
+def test_json_passthrough_logs_other_lines_as_text():
+    logger = RecordingLogger()
+    lines = ['{"event": "structured"}', "plain text", "[1, 2]", '{"broken":', "{}"]
+
+    async def _log_lines():
+        reader = asyncio.StreamReader()
+        reader.feed_data("".join(f"{line}\n" for line in lines).encode())
+        reader.feed_eof()
+        await _log_stream(reader, logger=logger, json_passthrough=True)
+
+    asyncio.run(_log_lines())
+
+    assert logger.events == [
+        ("info", "structured", {}),
+        ("info", "plain text", {}),
+        ("info", "[1, 2]", {}),
+        ("info", '{"broken":', {}),
+        ("info", "", {}),
+    ]
+
+
+class GatedStream:
+    """A stream whose writes wait for `gate`, standing in for a stalled log consumer."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.writing = threading.Event()
+        self.lines = []
+
+    def write(self, text):
+        self.writing.set()
+        assert self.gate.wait(5)
+        self.lines.extend(text.splitlines())
+
+    def flush(self):
+        pass
+
+
+def _stalled_handler(overflow):
+    """A handler with a queue of 2 whose writer is stuck writing line 0."""
+    stream = GatedStream()
+    handler = QueueWriterHandler(stream, max_queue=2, overflow=overflow)
+    _emit(handler, "line 0")
+    assert stream.writing.wait(5)
+    return handler, stream
+
+
+def _emit(handler, message):
+    handler.handle(logging.makeLogRecord({"msg": message, "levelno": logging.INFO}))
+
+
+@pytest.mark.parametrize(
+    "overflow, written",
+    [
+        ("drop_oldest", ["line 3", "line 4"]),
+        ("count", ["line 1", "line 2"]),
+    ],
+)
+def test_queue_writer_drops_lines_when_full(overflow, written):
+    handler, stream = _stalled_handler(overflow)
+    for i in range(1, 5):
+        _emit(handler, f"line {i}")
+
+    assert handler.dropped == 2
+    stream.gate.set()
+    handler.close()
+
+    assert stream.lines == [
+        "line 0",
+        *written,
+        "2 log lines dropped, the log writer could not keep up",
+    ]
+
+
+def test_queue_writer_blocks_when_full():
+    handler, stream = _stalled_handler("block")
+    for i in range(1, 3):
+        _emit(handler, f"line {i}")
+    blocked = threading.Thread(target=_emit, args=(handler, "line 3"))
+    blocked.start()
+
+    blocked.join(0.2)
+    assert blocked.is_alive()
+    stream.gate.set()
+    blocked.join(5)
+    handler.close()
+
+    assert handler.dropped == 0
+    assert stream.lines == [f"line {i}" for i in range(4)]
+
+
+def test_queue_writer_reports_each_drop_once():
+    handler, stream = _stalled_handler("count")
+    for i in range(1, 4):
+        _emit(handler, f"line {i}")
+    stream.gate.set()
+    handler.flush()
+    _emit(handler, "line 4")
+    handler.close()
+
+    assert stream.lines == [
+        "line 0",
+        "line 1",
+        "line 2",
+        "1 log lines dropped, the log writer could not keep up",
+        "line 4",
+    ]
+
+
+@pytest.mark.parametrize("exit_code", [0, 1])
+def test_queue_writer_is_drained_on_exit(exit_code):
+    script = f"""
+import sys
+import structlog
+from meltano_sdk.logging import default_logging_config
+default_logging_config(async_writer=True)
+log = structlog.get_logger()
+for i in range(5000):
+    log.info("line", i=i)
+sys.exit({exit_code})
+"""
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        text=True,
+        timeout=60,
+        cwd=Path(__file__).parents[1],
+    )
+
+    assert result.returncode == exit_code
+    lines = [line.split() for line in result.stderr.splitlines()]
+    assert lines == [["line", f"i={i}"] for i in range(5000)]
@@ -0,0 +1,67 @@
+import logging
+from types import SimpleNamespace
+
+import pytest
+from typer.testing import CliRunner
+
+from airflow_extension import main
+from echo_extension import main as echo_main
+from meltano_sdk import process_utils
+
+
+def test_invoke_with_force_init_does_not_forward(tmp_path, monkeypatch):
+    calls = []
+    plugin = SimpleNamespace(
+        pre_invoke=lambda force_init: calls.append(("pre_invoke", force_init)),
+        invoke=lambda name, args: calls.append(("invoke", name)),
+        post_invoke=lambda: calls.append(("post_invoke",)),
+    )
+    monkeypatch.setattr(main, "get_plugin", lambda: plugin)
+    monkeypatch.setattr(main, "forward", pytest.fail)
+
+    result = CliRunner().invoke(
+        main.app,
+        [
+            "invoke",
+            "--force-init",
+            "--server-socket",
+            str(tmp_path / "ext.sock"),
+            "version",
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert calls == [("pre_invoke", True), ("invoke", "version"), ("post_invoke",)]
+
+
+@pytest.mark.parametrize("passthrough", [False, True])
+def test_log_json_passthrough_option(monkeypatch, caplog, passthrough):
+    monkeypatch.setattr(process_utils, "_json_passthrough_default", False)
+    caplog.set_level(logging.INFO, logger=process_utils.SUBPROCESS_LOGGER)
+    line = '{"event": "from echo", "level": "warning", "answer": 42}'
+    options = ["--log-json-passthrough"] if passthrough else []
+
+    result = CliRunner().invoke(echo_main.app, [*options, "invoke", line])
+
+    assert result.exit_code == 0, result.output
+    [record] = [r for r in caplog.records if r.name == process_utils.SUBPROCESS_LOGGER]
+    if passthrough:
+        assert record.levelname == "WARNING"
+        assert record.getMessage().split() == ["from", "echo", "answer=42"]
+    else:
+        assert record.levelname == "INFO"
+        assert record.getMessage().strip() == line
+
+
+def test_invoke_exits_when_the_server_connection_is_lost(tmp_path, monkeypatch):
+    def lose_connection(socket_path, argv):
+        raise ConnectionError("extension server closed the connection")
+
+    monkeypatch.setattr(main, "forward", lose_connection)
+    monkeypatch.setattr(main, "get_plugin", pytest.fail)
+
+    result = CliRunner().invoke(
+        main.app, ["invoke", "--server-socket", str(tmp_path / "ext.sock"), "version"]
+    )
+
+    assert result.exit_code == 1
@@ -0,0 +1,21 @@
+import pytest
+
+from airflow_extension.airflow_ext import Airflow
+from echo_extension.main import EchoPlugin
+from meltano_sdk.extension_base import DescribeFormat
+from meltano_sdk.manifest import build_manifest, format_manifest, read_manifest
+
+
+@pytest.mark.parametrize(
+    "package, plugin_class",
+    [("airflow_extension", Airflow), ("echo_extension", EchoPlugin)],
+)
+def test_shipped_manifest_matches_description(package, plugin_class):
+    plugin = plugin_class()
+    manifest = read_manifest(package)
+
+    assert manifest == build_manifest(plugin.describe().commands)
+    for output_format in DescribeFormat:
+        assert format_manifest(manifest, output_format) == plugin.describe_formatted(
+            output_format
+        )
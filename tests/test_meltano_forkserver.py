@@ -0,0 +1,181 @@
+import os
+import subprocess
+import sys
+import time
+
+import meltano_forkserver
+import pytest
+
+# A stand-in for the meltano CLI: sleeps, then exits with the given code.
+SLOW_CLI = """
+import sys
+import time
+
+
+def main():
+    time.sleep(float(sys.argv[1]))
+    sys.exit(int(sys.argv[2]))
+"""
+
+
+@pytest.fixture
+def start_server(tmp_path):
+    (tmp_path / "slow_cli.py").write_text(SLOW_CLI)
+    servers = []
+
+    def _start(pool_size, max_runs, idle_timeout=0):
+        socket_path = str(tmp_path / f"forkserver-{len(servers)}.sock")
+        servers.append(
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    meltano_forkserver.__file__,
+                    socket_path,
+                    "slow_cli:main",
+                    str(pool_size),
+                    str(max_runs),
+                    str(idle_timeout),
+                ],
+                env={**os.environ, "PYTHONPATH": str(tmp_path)},
+            )
+        )
+        deadline = time.monotonic() + 10
+        while not meltano_forkserver._can_connect(socket_path):
+            assert time.monotonic() < deadline, "fork-server did not start"
+            time.sleep(0.05)
+        return socket_path
+
+    yield _start
+    for server in servers:
+        server.terminate()
+        server.wait()
+
+
+def _run_all(socket_path, tmp_path, argvs):
+    with open(os.devnull, "wb") as devnull:
+        runs = [
+            meltano_forkserver.start_run(
+                socket_path,
+                ["meltano", *argv],
+                cwd=str(tmp_path),
+                env=dict(os.environ),
+                stdout_fd=devnull.fileno(),
+                stderr_fd=devnull.fileno(),
+            )
+            for argv in argvs
+        ]
+    return [run.wait() for run in runs]
+
+
+def test_runs_are_not_capped_by_pool_size(start_server, tmp_path):
+    socket_path = start_server(pool_size=2, max_runs=100)
+
+    started = time.monotonic()
+    returncodes = _run_all(
+        socket_path, tmp_path, [["1", str(code)] for code in range(4)]
+    )
+
+    assert returncodes == [0, 1, 2, 3]
+    assert time.monotonic() - started < 1.9
+
+
+def test_worker_replaced_after_max_runs(start_server, tmp_path):
+    socket_path = start_server(pool_size=1, max_runs=2)
+
+    returncodes = _run_all(socket_path, tmp_path, [["0.5", "0"]] * 3)
+
+    assert returncodes == [0, 0, 0]
+
+
+def test_worker_replaced_while_its_last_run_goes_on(start_server, tmp_path):
+    socket_path = start_server(pool_size=1, max_runs=1)
+
+    with open(os.devnull, "wb") as devnull:
+        slow_run = meltano_forkserver.start_run(
+            socket_path,
+            ["meltano", "3", "0"],
+            cwd=str(tmp_path),
+            env=dict(os.environ),
+            stdout_fd=devnull.fileno(),
+            stderr_fd=devnull.fileno(),
+        )
+        started = time.monotonic()
+        assert _run_all(socket_path, tmp_path, [["0", "5"]]) == [5]
+        assert time.monotonic() - started < 2
+        assert slow_run.wait() == 0
+
+
+def test_server_stops_when_idle(start_server, tmp_path):
+    socket_path = start_server(pool_size=1, max_runs=100, idle_timeout=1)
+
+    # Runs in progress keep the server up past the idle timeout.
+    assert _run_all(socket_path, tmp_path, [["1.5", "0"]]) == [0]
+    assert os.path.exists(socket_path)
+
+    deadline = time.monotonic() + 5
+    while os.path.exists(socket_path):
+        assert time.monotonic() < deadline, "fork-server did not stop"
+        time.sleep(0.05)
+    assert not meltano_forkserver._can_connect(socket_path)
+
+
+def test_socket_path_changes_with_the_meltano_script(tmp_path):
+    meltano = tmp_path / ".meltano" / "run" / "bin"
+    meltano.parent.mkdir(parents=True)
+    meltano.write_text("#!/usr/bin/python3\n")
+    meltano.chmod(0o755)
+    os.utime(meltano, ns=(0, 0))
+
+    socket_path = meltano_forkserver.socket_path_for(tmp_path, ".meltano/run/bin")
+    assert (
+        meltano_forkserver.socket_path_for(tmp_path, ".meltano/run/bin") == socket_path
+    )
+
+    # Reinstalling or upgrading meltano rewrites the script.
+    os.utime(meltano, ns=(1, 1))
+    assert (
+        meltano_forkserver.socket_path_for(tmp_path, ".meltano/run/bin") != socket_path
+    )
+
+
+# Starts a run, prints its pid and waits for it, like MeltanoOperator.execute.
+CLIENT = """
+import os
+import sys
+
+import meltano_forkserver
+
+run = meltano_forkserver.start_run(
+    sys.argv[1], ["meltano", "30", "0"], os.getcwd(), dict(os.environ), 1, 2
+)
+print(run.pid, flush=True)
+run.wait()
+"""
+
+
+def test_run_stopped_when_its_client_is_killed(start_server, tmp_path):
+    socket_path = start_server(pool_size=1, max_runs=100)
+    client = subprocess.Popen(
+        [sys.executable, "-c", CLIENT, socket_path],
+        env={**os.environ, "PYTHONPATH": os.path.dirname(meltano_forkserver.__file__)},
+        stdout=subprocess.PIPE,
+    )
+    run_pid = int(client.stdout.readline())
+
+    client.kill()
+    client.wait()
+
+    deadline = time.monotonic() + 5
+    while True:
+        try:
+            os.kill(run_pid, 0)
+        except ProcessLookupError:
+            break
+        assert time.monotonic() < deadline, "the run outlived its client"
+        time.sleep(0.05)
+
+
+def test_socket_is_owner_only(start_server):
+    socket_path = start_server(pool_size=1, max_runs=100)
+
+    assert os.stat(socket_path).st_mode & 0o777 == 0o600
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("airflow")
+
+from airflow.exceptions import AirflowException, TaskDeferred  # noqa: E402
+from meltano_operators import (  # noqa: E402
+    DETACHED_WRAPPER,
+    RUN_INFO_FILE,
+    MeltanoOperator,
+    MeltanoRunTrigger,
+    stop_detached_run,
+)
+
+# Stands in for meltano: echoes its arguments, writes to stderr, then exits with $FAKE_EXIT.
+FAKE_MELTANO = """#!/bin/sh
+echo "meltano $*"
+echo "some warning" >&2
+sleep "${FAKE_SLEEP:-0}"
+exit "${FAKE_EXIT:-0}"
+"""
+
+
+@pytest.fixture
+def fake_meltano(tmp_path):
+    path = tmp_path / "meltano"
+    path.write_text(FAKE_MELTANO)
+    path.chmod(0o755)
+    return str(path)
+
+
+@pytest.fixture
+def task_log():
+    """The messages logged by MeltanoOperator, whose task logger does not propagate."""
+    messages = []
+    handler = logging.Handler()
+    handler.emit = lambda record: messages.append(record.getMessage())
+    logger = MeltanoOperator(task_id="t", command=[]).log
+    logger.addHandler(handler)
+    yield messages
+    logger.removeHandler(handler)
+
+
+class FakeTaskInstance(SimpleNamespace):
+    def __init__(self, **kwargs):
+        defaults = {
+            "dag_id": "dag",
+            "task_id": "el",
+            "run_id": "manual__1",
+            "try_number": 1,
+        }
+        super().__init__(**{**defaults, **kwargs}, xcom={})
+
+    def xcom_push(self, key, value):
+        self.xcom[key] = value
+
+
+def _operator(fake_meltano, tmp_path, fake_exit=0, **kwargs):
+    return MeltanoOperator(
+        task_id="el",
+        command=["run", "tap-a", "target-b"],
+        project_root=str(tmp_path),
+        meltano_bin=fake_meltano,
+        env={"FAKE_EXIT": str(fake_exit)},
+        **kwargs,
+    )
+
+
+def _start_detached(run_dir, *command):
+    run_dir.mkdir(parents=True, exist_ok=True)
+    status_path = run_dir / "status"
+    process = subprocess.Popen(
+        ["/bin/sh", "-c", DETACHED_WRAPPER, "meltano-run", str(status_path), *command],
+        start_new_session=True,
+    )
+    (run_dir / RUN_INFO_FILE).write_text(
+        json.dumps({"pid": process.pid, "hostname": socket.gethostname()})
+    )
+    return process, status_path
+
+
+def test_stop_detached_run(tmp_path):
+    process, status_path = _start_detached(tmp_path, "sleep", "30")
+    time.sleep(0.2)
+
+    assert stop_detached_run(process.pid, status_path)
+    # The whole group is signalled, the wrapper shell included.
+    assert process.wait(timeout=5) == -signal.SIGTERM
+    assert not stop_detached_run(process.pid, status_path)
+
+
+def test_stop_detached_run_ignores_other_processes(tmp_path):
+    assert not stop_detached_run(os.getpid(), tmp_path / "status")
+
+
+def test_retry_stops_run_of_earlier_try(tmp_path):
+    operator = MeltanoOperator(
+        task_id="el", command=["run", "tap-a", "target-b"], project_root=str(tmp_path)
+    )
+    ti = SimpleNamespace(dag_id="dag", task_id="el", run_id="manual__1", try_number=1)
+    context = {"ti": ti}
+    process, _ = _start_detached(operator._run_dir(context), "sleep", "30")
+    time.sleep(0.2)
+
+    ti.try_number = 2
+    operator._stop_earlier_tries(context)
+
+    assert process.wait(timeout=5) == -signal.SIGTERM
+
+
+@pytest.mark.parametrize("state, stopped", [("failed", True), ("deferred", False)])
+def test_trigger_cleanup_stops_abandoned_run(tmp_path, state, stopped):
+    process, status_path = _start_detached(tmp_path, "sleep", "30")
+    trigger = MeltanoRunTrigger(
+        status_path=str(status_path),
+        log_path=str(tmp_path / "meltano.log"),
+        started_at="2022-01-01T00:00:00+00:00",
+        pid=process.pid,
+        hostname=socket.gethostname(),
+    )
+    trigger.task_instance = SimpleNamespace(state=state, refresh_from_db=lambda: None)
+    time.sleep(0.2)
+
+    try:
+        asyncio.run(trigger.cleanup())
+        if stopped:
+            assert process.wait(timeout=5) == -signal.SIGTERM
+        else:
+            assert process.poll() is None
+    finally:
+        process.kill()
+        process.wait()
+
+
+def test_execute_logs_output_and_records_run(fake_meltano, tmp_path, task_log):
+    ti = FakeTaskInstance()
+
+    _operator(fake_meltano, tmp_path).execute({"ti": ti})
+
+    assert "meltano run tap-a target-b" in task_log
+    assert "some warning" in task_log
+    run = ti.xcom["meltano_run"]
+    assert run["command"] == [fake_meltano, "run", "tap-a", "target-b"]
+    assert run["returncode"] == 0
+    assert run["duration_seconds"] >= 0
+
+
+def test_execute_fails_on_nonzero_exit(fake_meltano, tmp_path):
+    ti = FakeTaskInstance()
+
+    with pytest.raises(AirflowException, match="exit code 3"):
+        _operator(fake_meltano, tmp_path, fake_exit=3).execute({"ti": ti})
+    assert ti.xcom["meltano_run"]["returncode"] == 3
+
+
+def _defer(operator, context):
+    with pytest.raises(TaskDeferred) as deferred:
+        operator.execute(context)
+    return deferred.value
+
+
+@pytest.mark.parametrize("fake_exit", [0, 4])
+def test_deferred_run(fake_meltano, tmp_path, task_log, fake_exit):
+    operator = _operator(
+        fake_meltano, tmp_path, fake_exit, deferrable=True, poll_interval=0.05
+    )
+    ti = FakeTaskInstance()
+
+    deferred = _defer(operator, {"ti": ti})
+    assert deferred.method_name == "execute_complete"
+    assert isinstance(deferred.trigger, MeltanoRunTrigger)
+
+    async def _first_event():
+        async for event in deferred.trigger.run():
+            return event.payload
+
+    event = asyncio.run(_first_event())
+    assert event["returncode"] == fake_exit
+
+    if fake_exit:
+        with pytest.raises(AirflowException, match="exit code 4"):
+            operator.execute_complete({"ti": ti}, event)
+    else:
+        operator.execute_complete({"ti": ti}, event)
+    assert "meltano run tap-a target-b" in task_log
+    assert ti.xcom["meltano_run"]["returncode"] == fake_exit
+
+
+def test_trigger_reports_lost_run(tmp_path):
+    process = subprocess.Popen(["true"])
+    process.wait()
+    trigger = MeltanoRunTrigger(
+        status_path=str(tmp_path / "status"),
+        log_path=str(tmp_path / "meltano.log"),
+        started_at="2022-01-01T00:00:00+00:00",
+        pid=process.pid,
+        hostname=socket.gethostname(),
+        poll_interval=0.05,
+    )
+
+    async def _first_event():
+        async for event in trigger.run():
+            return event.payload
+
+    event = asyncio.run(_first_event())
+    assert event["returncode"] is None
+
+    operator = MeltanoOperator(
+        task_id="el", command=["run"], project_root=str(tmp_path)
+    )
+    with pytest.raises(AirflowException, match="without recording its exit code"):
+        operator.execute_complete({"ti": FakeTaskInstance()}, event)
+
+
+def test_trigger_serialization_round_trip(tmp_path):
+    trigger = MeltanoRunTrigger(
+        status_path=str(tmp_path / "status"),
+        log_path=str(tmp_path / "meltano.log"),
+        started_at="2022-01-01T00:00:00+00:00",
+        pid=123,
+        hostname="worker-1",
+    )
+
+    classpath, kwargs = trigger.serialize()
+
+    assert classpath == "meltano_operators.MeltanoRunTrigger"
+    assert MeltanoRunTrigger(**kwargs).serialize() == (classpath, kwargs)
+
+
+@pytest.mark.parametrize(
+    "kwargs, timeout",
+    [
+        ({}, None),
+        ({"execution_timeout": timedelta(hours=2)}, timedelta(hours=2)),
+        (
+            {"execution_timeout": timedelta(hours=2), "deferral_timeout": 60},
+            timedelta(minutes=1),
+        ),
+    ],
+)
+def test_deferral_timeout(fake_meltano, tmp_path, kwargs, timeout):
+    operator = _operator(fake_meltano, tmp_path, deferrable=True, **kwargs)
+
+    deferred = _defer(operator, {"ti": FakeTaskInstance()})
+    assert deferred.timeout == timeout
@@ -0,0 +1,147 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from files_airflow_ext.orchestrate.meltano_schedules import (
+    group_run_args,
+    job_task_groups,
+    job_tasks,
+    project_plugin_types,
+    resolve_schedules,
+    schedule_pool_plugins,
+    task_pool_plugin,
+    task_stages,
+)
+
+# meltano.yml and the `meltano schedule list --format=json` output captured from it
+# with meltano 2.20.0.
+PROJECT = Path(__file__).parent / "fixtures" / "meltano_project"
+
+
+@pytest.fixture
+def captured_export():
+    return json.loads((PROJECT / "schedule_list.json").read_text())
+
+
+def test_resolve_schedules_matches_meltano(captured_export):
+    resolved = resolve_schedules(PROJECT)
+
+    for kind in ("elt", "job"):
+        expected = captured_export["schedules"][kind]
+        actual = resolved["schedules"][kind]
+        assert [s["name"] for s in actual] == [s["name"] for s in expected]
+        for resolved_schedule, meltano_schedule in zip(actual, expected):
+            # The resolver only produces the fields the DAG generator reads.
+            assert resolved_schedule == {
+                key: meltano_schedule[key] for key in resolved_schedule
+            }
+
+
+def test_job_tasks_accepts_single_string_task(captured_export):
+    schedules = {s["name"]: s for s in captured_export["schedules"]["job"]}
+
+    assert job_tasks(schedules["adhoc-csv"]) == ["tap-csv target-jsonl"]
+    assert job_tasks(schedules["daily-gitlab-job"]) == [
+        "tap-gitlab hash-emails target-postgres",
+        "dbt-postgres:run",
+    ]
+
+
+def test_pool_plugins_same_for_both_sources(captured_export):
+    resolved = resolve_schedules(PROJECT)
+
+    for pool_by in ("extractor", "loader"):
+        assert schedule_pool_plugins(resolved, pool_by) == schedule_pool_plugins(
+            captured_export, pool_by
+        )
+
+
+@pytest.mark.parametrize(
+    "blocks, pool_by, plugin",
+    [
+        (["tap-a", "target-x"], "extractor", "tap-a"),
+        (["tap-a", "target-x"], "loader", "target-x"),
+        (["tap-a", "map-1", "target-x"], "loader", "target-x"),
+        (["dbt:run", "tap-e", "target-y"], "extractor", "tap-e"),
+        (["dbt:run", "tap-e", "target-y"], "loader", "target-y"),
+        (["dbt:run"], "extractor", None),
+        (["tap-a", "target-x"], None, None),
+    ],
+)
+def test_task_pool_plugin(blocks, pool_by, plugin):
+    assert task_pool_plugin(blocks, pool_by) == plugin
+
+
+def test_task_pool_plugin_uses_plugin_types():
+    plugin_types = {"gitlab": "extractor", "warehouse": "loader"}
+    blocks = ["gitlab", "hash-emails", "warehouse"]
+
+    assert task_pool_plugin(blocks, "extractor", plugin_types) == "gitlab"
+    assert task_pool_plugin(blocks, "loader", plugin_types) == "warehouse"
+
+
+def test_project_plugin_types():
+    assert project_plugin_types(PROJECT) == {
+        "tap-gitlab": "extractor",
+        "tap-csv": "extractor",
+        "target-postgres": "loader",
+        "target-jsonl": "loader",
+    }
+
+
+@pytest.mark.parametrize(
+    "layout, stages",
+    [
+        ("serial", [[0], [1], [2], [3], [4]]),
+        ("parallel", [[0, 1], [2], [3, 4]]),
+    ],
+)
+def test_task_stages(layout, stages):
+    tasks = [
+        "tap-a target-x",
+        ["tap-b map-1 target-y", "tap-c target-y"],
+        "dbt:run",
+        "tap-d target-z",
+        "tap-e target-z",
+    ]
+
+    assert [[idx for idx, _ in stage] for stage in task_stages(tasks, layout)] == stages
+
+
+def test_parallel_layout_from_schedule_env(captured_export):
+    schedules = {s["name"]: s for s in captured_export["schedules"]["job"]}
+    schedule = dict(schedules["hourly-nested"])
+    schedule["job"] = {
+        "name": "nested-tasks",
+        "tasks": [
+            "tap-csv target-jsonl",
+            "tap-gitlab target-jsonl",
+            "dbt-postgres:run",
+        ],
+    }
+
+    # Parallel stages hold several groups, which coalescing leaves alone.
+    for coalesce in ("false", "true"):
+        schedule["env"] = {**schedule["env"], "MELTANO_DAG_COALESCE_TASKS": coalesce}
+        assert [
+            [group_run_args(g) for g in stage] for stage in job_task_groups(schedule)
+        ] == [
+            [["tap-csv", "target-jsonl"], ["tap-gitlab", "target-jsonl"]],
+            [["dbt-postgres:run"]],
+        ]
+
+
+def test_pool_plugins_follow_coalesced_groups(monkeypatch):
+    monkeypatch.setenv("MELTANO_DAG_COALESCE_TASKS", "true")
+    schedule = {
+        "name": "s",
+        "job": {"name": "j", "tasks": ["tap-a target-x", "dbt:run", "tap-e target-y"]},
+    }
+    export = {"schedules": {"job": [schedule], "elt": []}}
+
+    # All three tasks run as a single `meltano run`, in the pool of target-x.
+    assert [
+        group_run_args(g) for stage in job_task_groups(schedule) for g in stage
+    ] == [["tap-a", "target-x", "dbt:run", "tap-e", "target-y"]]
+    assert schedule_pool_plugins(export, "loader") == ["target-x"]
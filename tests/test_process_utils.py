@@ -0,0 +1,304 @@
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from meltano_sdk import process_utils
+from meltano_sdk.process_utils import (
+    Invoker,
+    TailBuffer,
+    _log_stream,
+    log_subprocess_error,
+)
+
+
+def test_run_many_fails_fast_with_busy_default_executor():
+    async def _run_many():
+        # A single default executor thread, as with few CPUs, must not hold back reaping.
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(1))
+        invoker = Invoker("sh")
+        commands = [["-c", "sleep 5"]] * 3 + [["-c", "exit 7"]]
+        return await invoker.run_many_async(commands)
+
+    started = time.monotonic()
+    with pytest.raises(subprocess.CalledProcessError) as err:
+        asyncio.run(_run_many())
+    assert err.value.returncode == 7
+    assert time.monotonic() - started < 3
+
+
+def test_run_and_log_records_usage():
+    result = Invoker(sys.executable).run_and_log("-c", ["print('hello')"])
+
+    assert result.returncode == 0
+    assert result.usage.wall_time > 0
+    assert result.usage.max_rss_bytes > 0
+
+
+# Writes the pids of the stub child and of a sleeping grandchild it forks, then waits.
+FORKING_CHILD = (
+    'echo $$ > "$1/child.pid"; sleep 30 & echo $! > "$1/grandchild.pid"; wait'
+)
+
+
+def _alive(pid):
+    """True unless pid has exited, zombies not reaped by a container's init included."""
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            return stat.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def _read_pids(tmp_path, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return [
+                int((tmp_path / name).read_text())
+                for name in ("child.pid", "grandchild.pid")
+            ]
+        except (OSError, ValueError):
+            time.sleep(0.05)
+    raise TimeoutError("stub child did not start")
+
+
+def _wait_dead(pids, timeout=5):
+    deadline = time.monotonic() + timeout
+    while any(_alive(pid) for pid in pids) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return [pid for pid in pids if _alive(pid)]
+
+
+def test_run_timeout_stops_process_tree(tmp_path):
+    invoker = Invoker("sh", kill_grace_period=2)
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        invoker.run("-c", FORKING_CHILD, "stub", str(tmp_path), timeout=0.5)
+    assert _wait_dead(_read_pids(tmp_path)) == []
+
+
+def test_run_and_log_timeout_stops_process_tree(tmp_path):
+    invoker = Invoker("sh", kill_grace_period=2)
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        invoker.run_and_log("-c", [FORKING_CHILD, "stub", str(tmp_path)], timeout=0.5)
+    assert _wait_dead(_read_pids(tmp_path)) == []
+
+
+def test_timeout_escalates_to_sigkill(tmp_path):
+    invoker = Invoker("sh", kill_grace_period=0.5)
+
+    started = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        invoker.run(
+            "-c", f"trap '' TERM; {FORKING_CHILD}", "stub", str(tmp_path), timeout=0.5
+        )
+    assert time.monotonic() - started < 5
+    assert _wait_dead(_read_pids(tmp_path)) == []
+
+
+def _start_extension(tmp_path, child=FORKING_CHILD):
+    """Run an Invoker in a process of its own, leading its own process group like a CLI would."""
+    code = (
+        "import sys; from meltano_sdk.process_utils import Invoker; "
+        "Invoker('sh').run('-c', sys.argv[1], 'stub', sys.argv[2])"
+    )
+    return subprocess.Popen(
+        [sys.executable, "-c", code, child, str(tmp_path)],
+        start_new_session=True,
+    )
+
+
+def test_killing_process_group_leaves_no_orphans(tmp_path):
+    extension = _start_extension(tmp_path)
+    pids = _read_pids(tmp_path)
+
+    os.killpg(extension.pid, signal.SIGKILL)
+    extension.wait()
+
+    assert _wait_dead(pids) == []
+
+
+def test_sigterm_is_forwarded(tmp_path):
+    extension = _start_extension(tmp_path)
+    child_pid, _ = _read_pids(tmp_path)
+
+    extension.send_signal(signal.SIGTERM)
+
+    assert extension.wait(timeout=5) != 0
+    assert _wait_dead([child_pid]) == []
+
+
+def test_sigint_is_forwarded(tmp_path):
+    # Unlike in FORKING_CHILD, the grandchild runs in the foreground, so it does not ignore SIGINT.
+    child = (
+        'echo $$ > "$1/child.pid"; '
+        'sh -c \'echo $$ > "$1/grandchild.pid"; exec sleep 30\' stub "$1"'
+    )
+    extension = _start_extension(tmp_path, child)
+    pids = _read_pids(tmp_path)
+
+    # Sent to the extension alone, as a supervisor would, not to its process group.
+    extension.send_signal(signal.SIGINT)
+
+    try:
+        assert _wait_dead(pids) == []
+        assert extension.wait(timeout=5) != 0
+    finally:
+        try:
+            os.killpg(extension.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+class RecordingLogger:
+    """Records (level, event, fields) of every call, in place of a structlog logger."""
+
+    def __init__(self):
+        self.events = []
+
+    def __getattr__(self, level):
+        return lambda event, **fields: self.events.append((level, event, fields))
+
+    def lines(self):
+        return [event for _, event, _ in self.events]
+
+
+def _log_chunks(chunks, chunk_size, tail=None, **kwargs):
+    """Log what a child writes in the given chunks, read back chunk_size bytes at a time."""
+    logger = RecordingLogger()
+
+    async def _log():
+        reader = asyncio.StreamReader()
+        for chunk in chunks:
+            reader.feed_data(chunk)
+        reader.feed_eof()
+        await _log_stream(reader, tail, logger, **kwargs)
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(process_utils, "STREAM_CHUNK_SIZE", chunk_size)
+        asyncio.run(_log())
+    return logger.lines()
+
+
+def test_log_stream_splits_oversized_lines(monkeypatch):
+    monkeypatch.setattr(process_utils, "MAX_LINE_LENGTH", 10)
+
+    lines = _log_chunks([b"a" * 25 + b"\nshort\n" + b"b" * 12 + b"\n"], chunk_size=7)
+
+    assert lines == ["a" * 10, "a" * 10, "a" * 5, "short", "b" * 10, "bb"]
+
+
+def test_log_stream_logs_unterminated_last_line():
+    assert _log_chunks([b"one\ntw", b"o\nthree"], chunk_size=4) == [
+        "one",
+        "two",
+        "three",
+    ]
+
+
+def test_log_stream_decodes_characters_split_across_chunks():
+    text = "h\u00e9llo w\u00f6rld \u20ac\U0001f680\nn\u00e4chste\n"
+    data = text.encode()
+
+    # One byte per read splits every multibyte character.
+    assert _log_chunks([data], chunk_size=1) == text.splitlines()
+
+
+def test_tail_buffer_is_bounded():
+    tail = TailBuffer(100)
+    for i in range(10000):
+        tail.append(b"line %d\n" % i)
+
+    assert tail._size < 100 + len(b"line 9999\n")
+    assert tail.getvalue().splitlines()[-1] == "line 9999"
+    # The partial line at the start of the window is left out.
+    assert all(line.startswith("line ") for line in tail.getvalue().splitlines())
+    assert len(tail.getvalue()) <= 100
+
+
+def test_run_and_log_drains_large_output():
+    # A single line far over asyncio's 64 KiB readline limit, and output on both
+    # streams that ends without a newline.
+    code = (
+        "import sys; sys.stdout.write('x' * 300000 + '\\n' + 'y' * 10); "
+        "sys.stderr.write('e' * 100000)"
+    )
+    invoker = Invoker(sys.executable, stdout_tail_bytes=20)
+
+    result = invoker.run_and_log("-c", [code], timeout=30)
+
+    assert result.returncode == 0
+    assert result.stdout_tail.endswith("y" * 10)
+    assert result.stderr_tail == "e" * (64 * 1024)
+
+
+def test_failed_run_and_log_replays_bounded_stderr_tail(monkeypatch):
+    code = (
+        "import sys\n"
+        "for i in range(10000): print('err', i, file=sys.stderr)\n"
+        "sys.exit(2)"
+    )
+    invoker = Invoker(sys.executable, stderr_tail_bytes=1024)
+
+    with pytest.raises(subprocess.CalledProcessError) as err:
+        invoker.run_and_log("-c", [code])
+    assert err.value.returncode == 2
+    assert len(err.value.stderr) <= 1024
+    tail_lines = err.value.stderr.splitlines()
+    assert tail_lines[0].startswith("err ")
+    assert tail_lines[-1] == "err 9999"
+
+    logger = RecordingLogger()
+    monkeypatch.setattr(process_utils, "log", logger)
+    log_subprocess_error("python -c", err.value, "it failed")
+
+    replayed = [event for level, event, _ in logger.events if level == "warning"]
+    assert replayed == tail_lines
+    assert logger.events[-1] == (
+        "error",
+        "error invoking python -c",
+        {"returncode": 2, "error_message": "it failed"},
+    )
+
+
+def test_run_many_collects_all_results():
+    commands = [["-c", "exit 0"], ["-c", "echo out; exit 3"], ["-c", "sleep 5"]]
+
+    started = time.monotonic()
+    results = Invoker("sh").run_many(commands, fail_fast=False, timeout=0.5)
+
+    assert time.monotonic() - started < 4
+    assert [r.returncode for r in results] == [0, 3, None]
+    assert [r.args[1:] for r in results] == commands
+    assert results[2].timeout == 0.5
+    with pytest.raises(subprocess.TimeoutExpired):
+        results[2].check_returncode()
+
+
+def test_run_many_fail_fast_on_timeout():
+    commands = [["-c", "sleep 5"], ["-c", "sleep 0.1"]]
+
+    started = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        Invoker("sh").run_many(commands, timeout=0.5)
+    assert time.monotonic() - started < 4
+
+
+def test_run_many_limits_concurrency(tmp_path):
+    # Every command records how many commands run next to it.
+    script = 'touch "$1/$$"; sleep 0.3; ls "$1" | wc -l >> "$1.counts"; rm "$1/$$"'
+    (tmp_path / "running").mkdir()
+    commands = [["-c", script, "stub", str(tmp_path / "running")]] * 4
+
+    results = Invoker("sh").run_many(commands, max_concurrency=2)
+
+    assert [r.returncode for r in results] == [0, 0, 0, 0]
+    counts = (tmp_path / "running.counts").read_text().split()
+    assert max(int(count) for count in counts) <= 2
@@ -0,0 +1,121 @@
+import json
+import os
+import pstats
+import tracemalloc
+
+import pytest
+import typer
+from typer.testing import CliRunner
+
+from echo_extension import main as echo_main
+from meltano_sdk import profiling
+
+
+@pytest.fixture
+def profile(tmp_path, monkeypatch):
+    """Enable profiling modes for a test, returning the profile file base name."""
+    registered = []
+    monkeypatch.setattr(profiling.atexit, "register", registered.append)
+    monkeypatch.setattr(profiling, "_state", {})
+
+    def enable(modes):
+        profiling.enable_profiling(modes, "ext", str(tmp_path))
+        assert registered == [profiling._write_profiles]
+        return tmp_path / f"ext-{os.getpid()}"
+
+    yield enable
+    if "profiler" in profiling._state:
+        profiling._state["profiler"].disable()
+    tracemalloc.stop()
+
+
+def test_parse_modes():
+    assert profiling.parse_modes(None) == []
+    assert profiling.parse_modes(" Spans, ,memory") == ["spans", "memory"]
+    assert profiling.parse_modes("spans,all") == list(profiling.PROFILE_MODES)
+    with pytest.raises(ValueError, match=r"unknown profile modes \['bogus'\]"):
+        profiling.parse_modes("spans,bogus")
+
+
+def test_unknown_mode_is_a_bad_parameter(profile):
+    with pytest.raises(typer.BadParameter, match="unknown profile modes"):
+        profile("bogus")
+    assert profiling._state == {}
+
+
+def test_cli_rejects_unknown_mode(monkeypatch):
+    monkeypatch.setattr(profiling, "_state", {})
+
+    result = CliRunner().invoke(echo_main.app, ["--profile", "bogus", "describe"])
+
+    assert result.exit_code == 2
+    assert "Invalid value for '--profile'" in result.output
+    assert "unknown profile modes ['bogus']" in result.output
+
+
+def test_span_is_a_noop_without_span_profiling(profile):
+    profile("memory")
+
+    with profiling.span("invoke"):
+        pass
+
+    assert profiling._state["spans"] == []
+
+
+def test_spans_output(profile):
+    base = profile("spans")
+
+    with profiling.span("initialize"):
+        pass
+    with profiling.span("invoke", command="echo"):
+        pass
+    profiling._write_profiles()
+
+    assert not os.path.exists(f"{base}.pstats")
+    assert not os.path.exists(f"{base}.tracemalloc")
+    with open(f"{base}.spans.json") as spans_file:
+        timeline = json.load(spans_file)
+    assert timeline["name"] == "ext"
+    assert timeline["pid"] == os.getpid()
+    spans = [span for span in timeline["spans"] if span["name"] != "startup"]
+    assert [span["name"] for span in spans] == ["initialize", "invoke"]
+    assert "attrs" not in spans[0]
+    assert spans[1]["attrs"] == {"command": "echo"}
+    assert 0 <= spans[0]["start"] <= spans[1]["start"] <= timeline["total"]
+    assert all(span["duration"] >= 0 for span in timeline["spans"])
+
+
+def _profiled_work():
+    return sorted(str(i) for i in range(1000))
+
+
+def test_cprofile_output(profile):
+    base = profile("cprofile")
+
+    _profiled_work()
+    profiling._write_profiles()
+
+    stats = pstats.Stats(f"{base}.pstats")
+    assert any(name == "_profiled_work" for _, _, name in stats.stats)
+    assert not os.path.exists(f"{base}.spans.json")
+
+
+def test_memory_output(profile):
+    base = profile("memory")
+
+    kept = [bytearray(1024) for _ in range(100)]
+    profiling._write_profiles()
+
+    assert not tracemalloc.is_tracing()
+    snapshot = tracemalloc.Snapshot.load(f"{base}.tracemalloc")
+    assert sum(stat.size for stat in snapshot.statistics("filename")) > 100 * 1024
+    assert kept
+
+
+def test_unwritable_output_dir_is_logged(profile, tmp_path):
+    profile("spans")
+    profiling._state["output_dir"] = str(tmp_path / "missing")
+
+    profiling._write_profiles()
+
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,137 @@
+import logging
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from echo_extension import main as echo_main
+from meltano_sdk.server import forward, forward_available
+
+ROOT = Path(__file__).parents[1]
+ECHO_SERVER = [
+    sys.executable,
+    "-c",
+    "from echo_extension.main import app; app()",
+    "serve",
+]
+SH_SERVER = """
+import sys
+from meltano_sdk.process_utils import Invoker
+from meltano_sdk.server import RequestRefused, invoker_command, serve
+
+run_sh = invoker_command(Invoker("/bin/sh"))
+
+def run_command(argv, env, cwd, out_fd, err_fd):
+    if env.get("REFUSE"):
+        raise RequestRefused("asked to")
+    return run_sh(argv, env, cwd, out_fd, err_fd)
+
+serve(sys.argv[1], run_command)
+"""
+
+
+class RecordingLogger:
+    """Records (level, event, fields) of every call, in place of a structlog logger."""
+
+    def __init__(self):
+        self.events = []
+
+    def __getattr__(self, level):
+        return lambda event, **fields: self.events.append((level, event, fields))
+
+    def lines(self):
+        return [event for _, event, _ in self.events]
+
+
+def _start_server(command, socket_path):
+    server = subprocess.Popen(
+        command,
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while not forward_available(str(socket_path)):
+        assert server.poll() is None, "the server exited"
+        assert time.monotonic() < deadline, "the server did not start listening"
+        time.sleep(0.05)
+    return server
+
+
+@pytest.fixture
+def echo_server(tmp_path):
+    socket_path = tmp_path / "echo.sock"
+    server = _start_server([*ECHO_SERVER, "--socket", str(socket_path)], socket_path)
+    yield str(socket_path)
+    server.terminate()
+    server.wait()
+
+
+@pytest.fixture
+def sh_server(tmp_path):
+    socket_path = tmp_path / "sh.sock"
+    server = _start_server(
+        [sys.executable, "-c", SH_SERVER, str(socket_path)], socket_path
+    )
+    yield str(socket_path)
+    server.terminate()
+    server.wait()
+
+
+def test_forward_to_echo_server(echo_server):
+    logger = RecordingLogger()
+
+    assert forward(echo_server, ["hello", "world"], logger) == 0
+    assert logger.lines() == ["hello world"]
+
+
+def test_socket_is_owner_only(echo_server):
+    assert os.stat(echo_server).st_mode & 0o777 == 0o600
+
+
+def test_server_keeps_serving_after_a_probe(echo_server):
+    assert forward_available(echo_server)
+    logger = RecordingLogger()
+
+    assert forward(echo_server, ["again"], logger) == 0
+    assert logger.lines() == ["again"]
+
+
+def test_forward_streams_both_outputs_and_exit_code(sh_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("GREETING", "hi from the client")
+    logger = RecordingLogger()
+    script = 'echo "$GREETING"; pwd; echo oops >&2; printf unterminated; exit 3'
+
+    assert forward(sh_server, ["-c", script], logger) == 3
+    assert sorted(logger.lines()) == sorted(
+        ["hi from the client", str(tmp_path), "oops", "unterminated"]
+    )
+
+
+def test_refused_command_is_not_run(sh_server, tmp_path, monkeypatch):
+    monkeypatch.setenv("REFUSE", "1")
+    marker = tmp_path / "ran"
+
+    assert forward(sh_server, ["-c", f"touch {marker}"], RecordingLogger()) is None
+    assert not marker.exists()
+
+
+def test_forward_without_server(tmp_path):
+    assert forward(str(tmp_path / "missing.sock"), ["hello"], RecordingLogger()) is None
+
+
+def test_echo_invoke_falls_back_without_server(tmp_path, caplog):
+    caplog.set_level(logging.INFO)
+
+    result = CliRunner().invoke(
+        echo_main.app,
+        ["invoke", "--server-socket", str(tmp_path / "missing.sock"), "direct"],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "direct" in [record.getMessage().strip() for record in caplog.records]
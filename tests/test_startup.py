@@ -0,0 +1,35 @@
+import subprocess
+import sys
+
+import pytest
+
+# Cumulative import time allowed for an extension's CLI module. Meltano imports it
+# for every `describe`, typer and structlog take most of it.
+IMPORT_BUDGET_US = 600_000
+# Modules only the commands that need them may import.
+DEFERRED_MODULES = ("yaml", "airflow")
+
+
+def _import_times(module):
+    """Import module in a fresh interpreter, returning the cumulative time of each import in µs."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("module", ["airflow_extension.main", "echo_extension.main"])
+def test_cli_import_time_budget(module):
+    times = _import_times(module)
+
+    assert times[module] < IMPORT_BUDGET_US
+    assert not [name for name in times if name.split(".")[0] in DEFERRED_MODULES]
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from airflow_extension import tuning
+
+CFG = """[core]
+parallelism = 32
+max_active_tasks_per_dag = 16
+
+[database]
+sql_alchemy_pool_size = 5
+sql_alchemy_max_overflow = 10
+"""
+
+
+@pytest.fixture(autouse=True)
+def host(monkeypatch):
+    for name in list(os.environ):
+        if name.startswith("AIRFLOW__"):
+            monkeypatch.delenv(name)
+    monkeypatch.setattr(tuning, "cpu_count", lambda: 8)
+    monkeypatch.setattr(tuning, "memory_bytes", lambda: 64 * 1024**3)
+
+
+def _tuned_options(tmp_path):
+    cfg_path = tmp_path / "airflow.cfg"
+    cfg_path.write_text(CFG)
+    tuning.tune_config(cfg_path)
+    return {
+        line.split(" = ")[0]: line.split(" = ")[1]
+        for line in cfg_path.read_text().splitlines()
+        if " = " in line
+    }
+
+
+def test_derived_settings_follow_recommended_values(tmp_path):
+    options = _tuned_options(tmp_path)
+
+    assert options["parallelism"] == "32"
+    assert options["sql_alchemy_pool_size"] == "16"
+    assert options["sql_alchemy_max_overflow"] == "32"
+
+
+def test_derived_settings_follow_env_overrides(tmp_path, monkeypatch):
+    monkeypatch.setenv("AIRFLOW__DATABASE__SQL_ALCHEMY_POOL_SIZE", "3")
+    monkeypatch.setenv("AIRFLOW__CORE__PARALLELISM", "4")
+
+    options = _tuned_options(tmp_path)
+
+    # The overridden settings are left alone, the settings derived from them follow them.
+    assert options["parallelism"] == "32"
+    assert options["sql_alchemy_pool_size"] == "5"
+    assert options["max_active_tasks_per_dag"] == "4"
+    assert options["sql_alchemy_max_overflow"] == "6"
+
+
+def test_env_overrides_under_older_names(monkeypatch):
+    monkeypatch.setenv("AIRFLOW__CORE__SQL_ALCHEMY_POOL_SIZE", "7")
+
+    settings = tuning.recommended_settings(8, None, tuning.env_overrides())
+
+    assert settings["sql_alchemy_pool_size"] == "7"
+    assert settings["sql_alchemy_max_overflow"] == "14"